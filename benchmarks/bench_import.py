@@ -0,0 +1,57 @@
+"""
+Measures how long importing the package takes, for the whole package and for
+single services, each in fresh interpreters. Also lists which heavy optional
+dependencies every scenario ends up importing.
+
+Run from the repository root with the package installed (`pip install -e .`):
+
+    python benchmarks/bench_import.py
+    python -X importtime -c "from postalservice import KindalService"  # per module
+"""
+
+import json
+import subprocess
+import sys
+
+ROUNDS = 10
+HEAVY_MODULES = ("playwright", "bs4", "lxml", "cryptography")
+
+SCENARIOS = {
+    "import postalservice": "import postalservice",
+    "KindalService": "from postalservice import KindalService",
+    "MercariService": "from postalservice import MercariService",
+    "FrilService": "from postalservice import FrilService",
+    "SecondStreetService": "from postalservice import SecondStreetService",
+    "all services": "from postalservice.federated import SERVICES; dict(SERVICES)",
+}
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def run_once(statement: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", SCRIPT.format(statement=statement, heavy=HEAVY_MODULES)],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output)
+
+
+def main():
+    print(f"{'scenario':<22} {'median ms':>10} {'min ms':>8}  heavy imports")
+    for name, statement in SCENARIOS.items():
+        runs = [run_once(statement) for _ in range(ROUNDS)]
+        times = sorted(run["elapsed"] * 1000 for run in runs)
+        heavy = ", ".join(runs[-1]["heavy"]) or "-"
+        print(f"{name:<22} {times[len(times) // 2]:>10.1f} {times[0]:>8.1f}  {heavy}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Compares the lxml fast-path parsers with the BeautifulSoup parsers on the
+golden Fril pages.
+
+Run from the repository root with the package installed (`pip install -e .`):
+
+    python benchmarks/bench_parsers.py
+"""
+
+import time
+import httpx
+from postalservice import FrilService
+from postalservice.utils.html_utils import configure_html_parser
+
+ROUNDS = 20
+
+with open("tests/golden/fril-search.txt", encoding="utf-8") as f:
+    SEARCH_PAGE = f.read()
+
+with open("tests/golden/fril-item.txt", encoding="utf-8") as f:
+    ITEM_PAGE = f.read()
+
+
+def best_time(func, rounds: int = ROUNDS) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    response = httpx.Response(200, text=SEARCH_PAGE)
+    cases = {
+        "search page": lambda: FrilService.parse_base_items(response, item_count=100),
+        "item page": lambda: FrilService.parse_item_details(ITEM_PAGE),
+    }
+
+    print(f"{'page':<12} {'bs4 ms':>9} {'lxml ms':>9} {'speedup':>8}")
+    for name, parse in cases.items():
+        configure_html_parser(fast_path=False)
+        soup_result, soup_time = parse(), best_time(parse)
+        configure_html_parser(fast_path=True)
+        lxml_result, lxml_time = parse(), best_time(parse)
+        assert lxml_result == soup_result, f"{name}: parsers disagree"
+        print(
+            f"{name:<12} {soup_time * 1000:>9.2f} {lxml_time * 1000:>9.2f} "
+            f"{soup_time / lxml_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
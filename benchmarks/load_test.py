@@ -0,0 +1,94 @@
+"""
+Load test of `get_search_results_async` against recorded traffic.
+
+Record an archive once with the network:
+
+    python benchmarks/load_test.py record traffic.jsonl.gz --service fril --keyword junya
+
+and replay it as often as needed, without the network:
+
+    python benchmarks/load_test.py replay traffic.jsonl.gz --service fril --keyword junya \\
+        --searches 5000 --concurrency 200 --latency 0.05
+
+Replayed searches must use the same parameters as the recording, since
+requests are matched by URL and body (without per-request ids, see `request_url_key`).
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from postalservice.federated import SERVICES
+from postalservice.utils.browser_utils import close_browser_pool_async, configure_browser_pool
+from postalservice.utils.network_utils import configure_pool
+from postalservice.utils.query_utils import percentile
+from postalservice.utils.replay_utils import RecordingTransport, ReplayTransport
+
+
+async def record(service, params: dict, path: str) -> None:
+    recorder = RecordingTransport(path)
+    pool = configure_pool(transport=recorder)
+    # 2nd Street loads its pages in the browser pool
+    configure_browser_pool(route_handler=recorder)
+    try:
+        results = await service.get_search_results_async(dict(params))
+    finally:
+        await pool.aclose()
+        await close_browser_pool_async()
+        await recorder.aclose()
+    recorder.save()
+    print(f"recorded {len(recorder.entries)} responses ({len(results)} items) to {path}")
+
+
+async def replay(service, params: dict, path: str, searches: int, concurrency: int, latency: float) -> None:
+    replayer = ReplayTransport(path, latency=latency)
+    pool = configure_pool(transport=replayer)
+    configure_browser_pool(route_handler=replayer)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def search():
+        async with semaphore:
+            start = time.perf_counter()
+            await service.get_search_results_async(dict(params))
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*[search() for _ in range(searches)])
+    finally:
+        await pool.aclose()
+        await close_browser_pool_async()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"{searches} searches in {elapsed:.2f}s: {searches / elapsed:.0f} searches/s")
+    for q in (50, 90, 99):
+        print(f"p{q}: {percentile(latencies, q) * 1000:.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("archive")
+    parser.add_argument("--service", default="fril", choices=sorted(SERVICES))
+    parser.add_argument("--keyword", default="junya")
+    parser.add_argument("--item-count", type=int, default=10)
+    parser.add_argument("--searches", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every replayed response")
+    args = parser.parse_args(argv)
+
+    service = SERVICES[args.service]
+    params = {"keyword": args.keyword, "item_count": args.item_count}
+    if args.mode == "record":
+        asyncio.run(record(service, params, args.archive))
+    else:
+        asyncio.run(
+            replay(service, params, args.archive, args.searches, args.concurrency, args.latency)
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
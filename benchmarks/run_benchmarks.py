@@ -0,0 +1,238 @@
+"""
+Offline benchmarks driven by the golden fixtures in tests/golden.
+
+Every service with recorded fixtures is run through its parsers and through
+the full `get_search_results`/`get_search_results_async` pipeline, with HTTP
+requests answered from the fixtures by a mock transport in the client pool. For each scenario
+the throughput, latency percentiles and peak traced memory are reported.
+
+Run from the repository root with the package installed (`pip install -e .`):
+
+    python benchmarks/run_benchmarks.py --save before.json
+    # ...change something...
+    python benchmarks/run_benchmarks.py --compare before.json
+
+With --compare the exit status is 1 if a scenario's median latency got worse
+than the threshold, so it can run in CI.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+import httpx
+from postalservice import FrilService
+from postalservice.utils.network_utils import configure_pool
+from postalservice.utils.query_utils import percentile
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+GOLDEN_DIR = os.path.join(BENCHMARK_DIR, "..", "tests", "golden")
+# Recorded pages are sent in chunks of this size, like a real response body
+CHUNK_SIZE = 16384
+
+# Services with recorded fixtures. To benchmark another service, record its
+# search and item pages into tests/golden and add an entry here.
+FIXTURES = {
+    "fril": {
+        "service": FrilService,
+        "search": "fril-search.txt",
+        "item": "fril-item.txt",
+        "is_item_url": lambda url: url.host == "item.fril.jp",
+        "params": {"keyword": "junya", "item_count": 36},
+    },
+}
+
+
+class ChunkedStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """
+    Response body that arrives in chunks, for both sync and async clients.
+    """
+
+    def __init__(self, body: bytes):
+        self.body = body
+
+    def __iter__(self):
+        for start in range(0, len(self.body), CHUNK_SIZE):
+            yield self.body[start : start + CHUNK_SIZE]
+
+    async def __aiter__(self):
+        for chunk in self:
+            yield chunk
+
+
+def fixture_transport(search_page: str, item_page: str, is_item_url) -> httpx.MockTransport:
+    """
+    Returns a transport that answers every request with a recorded page.
+    """
+    search_body = search_page.encode("utf-8")
+    item_body = item_page.encode("utf-8")
+
+    def handler(request):
+        body = item_body if is_item_url(request.url) else search_body
+        return httpx.Response(
+            200,
+            headers={"content-type": "text/html; charset=utf-8"},
+            stream=ChunkedStream(body),
+        )
+
+    return httpx.MockTransport(handler)
+
+
+def read_fixture(name: str) -> str:
+    with open(os.path.join(GOLDEN_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def measure(run, iterations: int) -> dict:
+    """
+    Calls `run` (which returns the number of items it produced) repeatedly
+    and summarises its latency, throughput and peak memory.
+    """
+    run()  # warm up caches and connections
+    latencies = []
+    items = 0
+    for _ in range(iterations):
+        start = time.perf_counter()
+        items += run()
+        latencies.append(time.perf_counter() - start)
+
+    # Traced separately, tracemalloc slows everything down
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "iterations": iterations,
+        "items_per_sec": items / sum(latencies),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p90_ms": percentile(latencies, 90) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "peak_mb": peak / 1e6,
+    }
+
+
+def run_fixture(name: str, fixture: dict, iterations: int) -> dict:
+    service = fixture["service"]
+    params = fixture["params"]
+    search_page = read_fixture(fixture["search"])
+    item_page = read_fixture(fixture["item"])
+    search_response = httpx.Response(200, text=search_page)
+
+    results = {}
+    results[f"{name}.parse_base_items"] = measure(
+        lambda: len(service.parse_base_items(search_response, **params)), iterations
+    )
+    results[f"{name}.parse_item_details"] = measure(
+        lambda: len([service.parse_item_details(item_page)]), iterations
+    )
+
+    pool = configure_pool(
+        transport=fixture_transport(search_page, item_page, fixture["is_item_url"])
+    )
+    loop = asyncio.new_event_loop()
+    try:
+        results[f"{name}.get_search_results"] = measure(
+            lambda: len(service.get_search_results(dict(params))), iterations
+        )
+        results[f"{name}.get_search_results_async"] = measure(
+            lambda: len(loop.run_until_complete(service.get_search_results_async(dict(params)))),
+            iterations,
+        )
+        loop.run_until_complete(pool.aclose())
+        loop.run_until_complete(loop.shutdown_asyncgens())
+    finally:
+        loop.close()
+        configure_pool()
+    return results
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=BENCHMARK_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(iterations: int = 20, services=None) -> dict:
+    results = {}
+    for name, fixture in FIXTURES.items():
+        if services and name not in services:
+            continue
+        results.update(run_fixture(name, fixture, iterations))
+    return {"commit": current_commit(), "results": results}
+
+
+def print_report(report: dict) -> None:
+    print(f"commit {report['commit']}")
+    print(
+        f"{'scenario':<34} {'items/s':>10} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'peak MB':>8}"
+    )
+    for name, result in report["results"].items():
+        print(
+            f"{name:<34} {result['items_per_sec']:>10.0f} {result['p50_ms']:>9.2f} "
+            f"{result['p90_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['peak_mb']:>8.2f}"
+        )
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list:
+    """
+    Prints the change in median latency per scenario against a saved report
+    and returns the scenarios that regressed by more than the threshold.
+    """
+    print(f"\ncompared with commit {baseline.get('commit')}")
+    regressions = []
+    for name, result in report["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{name:<34} new")
+            continue
+        change = result["p50_ms"] / before["p50_ms"] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<34} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--service", action="append", help="Only run this service, repeatable")
+    parser.add_argument("--save", help="Write the report as JSON to this path")
+    parser.add_argument("--compare", help="Compare with a report saved by --save")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.10,
+        help="Median latency increase counted as a regression (default 0.10)",
+    )
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.iterations, args.service)
+    print_report(report)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
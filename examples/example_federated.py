@@ -0,0 +1,21 @@
+import asyncio
+from postalservice import federated_search
+
+
+async def main():
+    params = {"keyword": "junya", "item_count": 3}
+
+    # Results arrive per service as soon as each one finishes
+    async for result in federated_search(
+        params, ["kindal", "mercari", "fril", "secondstreet"], timeouts={"secondstreet": 90}
+    ):
+        if result["error"] is not None:
+            print(f"{result['service']} failed: {result['error']!r}")
+            continue
+        print(f"{result['service']}: {len(result['results'])} items in {result['elapsed']:.1f}s")
+        for res in result["results"]:
+            print("\t", res["title"], res["price"], res["url"])
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,9 +1,49 @@
-from .services.mercari import MercariService
-from .services.fril import FrilService
-from .services.yjp import YJPService
-from .services.secondstreet import SecondStreetService
-from .services.kindal import KindalService
-from .services.ragtag import RagtagService
-from .services.okoku import OkokuService
-from .services.trefac import TrefacService
-from .services.baseservice import BaseService
+import importlib
+from typing import TYPE_CHECKING
+
+# Public names and the modules defining them. Each module is imported on first
+# access (PEP 562), so e.g. a worker using only KindalService never imports
+# Playwright or BeautifulSoup.
+_LAZY_ATTRIBUTES = {
+    "MercariService": ".services.mercari",
+    "FrilService": ".services.fril",
+    "YJPService": ".services.yjp",
+    "SecondStreetService": ".services.secondstreet",
+    "KindalService": ".services.kindal",
+    "RagtagService": ".services.ragtag",
+    "OkokuService": ".services.okoku",
+    "TrefacService": ".services.trefac",
+    "BaseService": ".services.baseservice",
+    "federated_search": ".federated",
+    "federated_search_all": ".federated",
+    "SearchWatcher": ".watcher",
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+if TYPE_CHECKING:
+    from .services.mercari import MercariService
+    from .services.fril import FrilService
+    from .services.yjp import YJPService
+    from .services.secondstreet import SecondStreetService
+    from .services.kindal import KindalService
+    from .services.ragtag import RagtagService
+    from .services.okoku import OkokuService
+    from .services.trefac import TrefacService
+    from .services.baseservice import BaseService
+    from .federated import federated_search, federated_search_all
+    from .watcher import SearchWatcher
+
+
+def __getattr__(name):
+    module = _LAZY_ATTRIBUTES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    # Cached so later lookups don't come through here
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,143 @@
+import asyncio
+import importlib
+import time
+from collections.abc import Mapping
+
+
+class ServiceRegistry(Mapping):
+    """
+    Read-only {name: service class} mapping that imports each service module
+    the first time its class is looked up, so selecting a few services
+    doesn't import the dependencies of the others.
+    """
+
+    def __init__(self, paths: dict):
+        self._paths = paths
+        self._classes = {}
+
+    def __getitem__(self, name: str):
+        service = self._classes.get(name)
+        if service is None:
+            module, class_name = self._paths[name]
+            service = getattr(importlib.import_module(module, __package__), class_name)
+            self._classes[name] = service
+        return service
+
+    def __contains__(self, name) -> bool:
+        return name in self._paths
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+
+SERVICES = ServiceRegistry(
+    {
+        "mercari": (".services.mercari", "MercariService"),
+        "fril": (".services.fril", "FrilService"),
+        "yjp": (".services.yjp", "YJPService"),
+        "secondstreet": (".services.secondstreet", "SecondStreetService"),
+        "kindal": (".services.kindal", "KindalService"),
+        "ragtag": (".services.ragtag", "RagtagService"),
+        "okoku": (".services.okoku", "OkokuService"),
+        "trefac": (".services.trefac", "TrefacService"),
+    }
+)
+
+DEFAULT_TIMEOUT = 60
+
+
+def resolve_services(services=None) -> dict:
+    """
+    Turns a selection of services into a {name: service class} dict.
+
+    Args:
+        services: None for all services, a list of names (e.g. "mercari") and/or
+            service classes, or a dict of name to service class.
+
+    Returns:
+        dict: The selected services by name.
+    """
+    if services is None:
+        return dict(SERVICES)
+    if isinstance(services, dict):
+        return dict(services)
+
+    resolved = {}
+    for service in services:
+        if isinstance(service, str):
+            name = service.lower()
+            if name not in SERVICES:
+                raise ValueError(f"Service {service} is not supported")
+            resolved[name] = SERVICES[name]
+        else:
+            resolved[service.__name__.lower().replace("service", "")] = service
+    return resolved
+
+
+async def federated_search(
+    params: dict, services=None, timeout: float = DEFAULT_TIMEOUT, timeouts: dict = None
+):
+    """
+    Runs the same search on several services concurrently and yields each
+    service's results as soon as that service finishes.
+
+    Each yielded value is a dict with the keys:
+    - 'service': The service name.
+    - 'results': The list of items, empty if the service failed.
+    - 'error': The exception raised by the service, or None. A timeout is an `asyncio.TimeoutError`.
+    - 'elapsed': Seconds the service took.
+
+    Args:
+        params (dict): The search parameters, passed to every service.
+        services: The services to search, see `resolve_services`. Defaults to all of them.
+        timeout (float): Seconds after which a service is abandoned.
+        timeouts (dict): Per-service timeouts by name, overriding `timeout`.
+
+    Yields:
+        dict: One result per service, in order of completion.
+    """
+    timeouts = timeouts or {}
+
+    async def run(name, service):
+        start = time.perf_counter()
+        try:
+            results = await asyncio.wait_for(
+                service.get_search_results_async(dict(params)),
+                timeouts.get(name, timeout),
+            )
+            error = None
+        except Exception as e:
+            results, error = [], e
+        return {
+            "service": name,
+            "results": results,
+            "error": error,
+            "elapsed": time.perf_counter() - start,
+        }
+
+    tasks = [
+        asyncio.ensure_future(run(name, service))
+        for name, service in resolve_services(services).items()
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # The caller may stop iterating early, don't leave searches running
+        for task in tasks:
+            task.cancel()
+
+
+async def federated_search_all(
+    params: dict, services=None, timeout: float = DEFAULT_TIMEOUT, timeouts: dict = None
+) -> dict:
+    """
+    Collects `federated_search` into a {service name: result dict} dict.
+    """
+    collected = {}
+    async for result in federated_search(params, services, timeout, timeouts):
+        collected[result["service"]] = result
+    return collected
@@ -1,11 +1,152 @@
 from abc import ABC, abstractmethod
 import asyncio
+import copy
 import json
+import math
+from collections import deque
 import httpx
 from postalservice.utils.search_utils import SearchResults
+from postalservice.utils.network_utils import ClientPool, configure_pool
+from postalservice.utils.concurrency_utils import ConcurrencyLimiter, configure_limiter, get_limiter
+from postalservice.utils.cache_utils import apply_cached_details, configure_detail_cache, store_details
+from postalservice.utils.parse_utils import configure_parsing, parse_many_async, parse_page_async
+from postalservice.utils.metrics_utils import MetricsRegistry, configure_instrumentation, span
+from postalservice.utils.retry_utils import RetryPolicy, configure_retries
+from postalservice.utils.ratelimit_utils import RateLimiter, configure_rate_limiter
+from postalservice.utils.coalesce_utils import (
+    SingleFlight,
+    coalesce,
+    coalesce_async,
+    coalesce_page_async,
+    configure_coalescing,
+    is_success,
+    normalize_params,
+)
 
 
 class BaseService(ABC):
+    # Value of the 'page' param that selects the first page of results
+    FIRST_PAGE = 1
+    # Whether the 'page' param selects further pages at all
+    PAGINATED = True
+    # At least the number of listings on one search page, for services whose
+    # 'item_count' param only cuts a parsed page short. None for services that
+    # send 'item_count' with the request as the page size.
+    MAX_PAGE_SIZE = None
+
+    @staticmethod
+    def configure_http(**options) -> ClientPool:
+        """
+        Configures the HTTP client pool shared by all services.
+
+        Args:
+            **options: `ClientPool` options, e.g. timeout, http2, max_connections_per_host.
+
+        Returns:
+            ClientPool: The new shared pool. Use `configure_host` on it for per-host settings.
+        """
+        return configure_pool(**options)
+
+    @staticmethod
+    def configure_concurrency(**options) -> ConcurrencyLimiter:
+        """
+        Configures the limiter used when fetching item detail pages concurrently.
+
+        Args:
+            **options: `ConcurrencyLimiter` options, max_concurrency and max_per_host.
+
+        Returns:
+            ConcurrencyLimiter: The new shared limiter. Its `metrics()` reports queueing per host.
+        """
+        return configure_limiter(**options)
+
+    @staticmethod
+    def configure_retries(**options) -> RetryPolicy:
+        """
+        Configures how failed requests of all services are retried and when a
+        marketplace's circuit breaker opens.
+
+        Args:
+            **options: `RetryPolicy` options, e.g. max_attempts, base_delay, failure_threshold.
+
+        Returns:
+            RetryPolicy: The new shared policy. Its `breaker(url)` shows a host's circuit state.
+        """
+        return configure_retries(**options)
+
+    @staticmethod
+    def configure_rate_limits(enabled: bool = True, **options) -> RateLimiter:
+        """
+        Paces the HTTP requests of all services with a token bucket per host
+        that slows down on 429 responses and speeds up again while requests
+        succeed. Off by default.
+
+        Args:
+            enabled (bool): Turn rate limiting on or off.
+            **options: `RateLimiter` options: state_dir to share the buckets
+                with other processes through files, and `AdaptiveTokenBucket`
+                options such as rate, burst and max_rate.
+
+        Returns:
+            RateLimiter: The new shared limiter, use `configure_host` on it for per-host rates.
+        """
+        return configure_rate_limiter(enabled, **options)
+
+    @staticmethod
+    def configure_coalescing(enabled: bool = True, **options) -> SingleFlight:
+        """
+        Shares identical searches and item page fetches that run at the same
+        time: concurrent callers wait for one request instead of each sending
+        their own, and the result is reused for `ttl` seconds. Searches are
+        keyed by service and params, item pages by URL. Off by default.
+
+        Args:
+            enabled (bool): Turn coalescing on or off.
+            **options: `SingleFlight` options, ttl, max_entries and max_pages.
+
+        Returns:
+            SingleFlight: The new shared instance, its `metrics()` counts the requests saved.
+        """
+        return configure_coalescing(enabled, **options)
+
+    @staticmethod
+    def configure_detail_cache(cache) -> None:
+        """
+        Sets the cache consulted before fetching item detail pages, keyed by
+        (service, item id). Disabled by default.
+
+        Args:
+            cache: A `MemoryDetailCache`, `SQLiteDetailCache` or None to disable caching.
+        """
+        configure_detail_cache(cache)
+
+    @staticmethod
+    def configure_parsing(**options) -> None:
+        """
+        Configures where search and item pages are parsed. By default parsing
+        runs in the calling thread, which blocks the event loop in async code.
+
+        Args:
+            **options: executor (None, "thread", "process" or an Executor), max_workers and batch_size.
+        """
+        configure_parsing(**options)
+
+    @staticmethod
+    def configure_instrumentation(enabled: bool = True, registry: MetricsRegistry = None) -> MetricsRegistry:
+        """
+        Turns per-stage timing of searches on or off. Stages are recorded in the
+        'stage_seconds' histogram by service and stage, HTTP requests in
+        'http_request_seconds' by host. Disabled by default.
+
+        Args:
+            enabled (bool): Record timings.
+            registry (MetricsRegistry): Registry to record into, defaults to the shared one.
+
+        Returns:
+            MetricsRegistry: The registry in use, e.g. for `slowest_stages()`.
+        """
+        return configure_instrumentation(enabled, registry)
+
     @staticmethod
     @abstractmethod
     def fetch_data(params: dict) -> httpx.Response:
@@ -26,16 +167,242 @@ class BaseService(ABC):
     async def parse_response_async(response: httpx.Response, **kwargs) -> str:
         pass
 
+    @classmethod
+    def parse_items(cls, response, **kwargs) -> list:
+        """
+        Parses the response into a list of item dictionaries. Services override
+        this so that results don't go through the JSON string of `parse_response`.
+        """
+        return json.loads(cls.parse_response(response, **kwargs))
+
+    @classmethod
+    async def parse_items_async(cls, response, **kwargs) -> list:
+        return json.loads(await cls.parse_response_async(response, **kwargs))
+
+    @classmethod
+    def page_params(cls, params: dict, page_index: int) -> dict:
+        """
+        Returns the params of the page `page_index` pages after the one the
+        params select. Without a 'page' param they select the first page.
+        """
+        if page_index == 0:
+            return dict(params)
+        start = params.get("page")
+        if start is None:
+            start = cls.FIRST_PAGE
+        return {**params, "page": start + page_index}
+
+    @classmethod
+    def untruncated_params(cls, params: dict) -> dict:
+        """
+        Returns the params with 'item_count' raised to `MAX_PAGE_SIZE`, so a
+        parsed page keeps all its listings. Paging through results needs whole
+        pages: listings cut off a page would never be seen.
+        """
+        if cls.MAX_PAGE_SIZE is None:
+            return dict(params)
+        return {**params, "item_count": max(params.get("item_count") or 0, cls.MAX_PAGE_SIZE)}
+
+    @classmethod
+    async def fetch_base_page_async(cls, params: dict) -> list:
+        """
+        Fetches one search page and returns its items without detail page
+        enrichment, for services that have a separate details step.
+        """
+
+        fetched = []
+
+        async def fetch_base_page():
+            with span(cls, "fetch"):
+                res = await cls.fetch_data_async(params)
+            fetched.append(res)
+            parse_base_items = getattr(cls, "parse_base_items", None)
+            if parse_base_items is None:
+                with span(cls, "parse"):
+                    return await cls.parse_items_async(res, **params)
+            with span(cls, "parse_base"):
+                return await parse_page_async(parse_base_items, res, **params)
+
+        key = ("base_page", cls.__name__, normalize_params(params))
+        # A failed page isn't kept, the next caller fetches it again
+        return await coalesce_async(
+            key, fetch_base_page, copy=copy.deepcopy, cacheable=lambda items: is_success(fetched[0])
+        )
+
+    @classmethod
+    async def search_all(cls, params: dict, max_items: int = 500, prefetch: int = 4):
+        """
+        Yields up to `max_items` items of a search across as many pages as it
+        takes, newest first. While one page is being enriched and yielded the
+        following pages are already being fetched, up to `prefetch` at a time.
+
+        Items already yielded from an earlier page are skipped, as listings
+        move down a page when new ones are posted during the search. Paging
+        stops at a page shorter than the first one, or one without new items.
+        Pages that were fetched ahead but aren't needed are cancelled.
+
+        Pages are parsed whole, see `untruncated_params`. For services that
+        send 'item_count' with the request it sets the page size.
+        Set 'enrich_photos' to False in the params to skip the details step.
+
+        Args:
+            params (dict): The search parameters. A 'page' param selects the first page fetched.
+            max_items (int): Maximum number of items yielded.
+            prefetch (int): Maximum pages fetched concurrently.
+
+        Yields:
+            dict: The items, validated like those of `get_search_results_async`.
+        """
+        enrich = hasattr(cls, "add_details_async") and hasattr(cls, "parse_base_items")
+        enrich = enrich and params.get("enrich_photos", True)
+        params = cls.untruncated_params(params)
+        seen = set()
+        yielded = 0
+        page_size = None
+        next_index = 0
+        pending = deque()
+
+        try:
+            while yielded < max_items:
+                # The first page alone tells the page size, then up to `prefetch`
+                # pages, but no more than the remaining items can fill, are in flight
+                if page_size is None:
+                    wanted = 1
+                else:
+                    wanted = min(prefetch, math.ceil((max_items - yielded) / page_size))
+                while len(pending) < wanted and (cls.PAGINATED or next_index == 0):
+                    page_params = cls.page_params(params, next_index)
+                    pending.append(asyncio.ensure_future(cls.fetch_base_page_async(page_params)))
+                    next_index += 1
+                if not pending:
+                    break
+
+                items = await pending.popleft()
+                if page_size is None:
+                    page_size = len(items)
+                fresh = []
+                for item in items:
+                    if item["id"] not in seen:
+                        seen.add(item["id"])
+                        fresh.append(item)
+                last_page = not fresh or len(items) < page_size or not cls.PAGINATED
+                fresh = fresh[: max_items - yielded]
+                if fresh and enrich:
+                    fresh = await cls.add_details_async(fresh)
+                with span(cls, "validate"):
+                    fresh = SearchResults(fresh).to_list()
+                for item in fresh:
+                    yield item
+                yielded += len(fresh)
+
+                if last_page:
+                    break
+        finally:
+            # The caller may stop iterating early, don't leave pages downloading
+            for task in pending:
+                task.cancel()
+
     @classmethod
     async def get_search_results_async(cls, params: dict):
-        res = await cls.fetch_data_async(params)
-        items = await cls.parse_response_async(res, **params)
-        searchresults = SearchResults(items)
-        return searchresults.to_list()
+        fetched = []
+
+        async def search():
+            with span(cls, "fetch"):
+                res = await cls.fetch_data_async(params)
+            fetched.append(res)
+            with span(cls, "parse"):
+                items = await cls.parse_items_async(res, **params)
+            with span(cls, "validate"):
+                searchresults = SearchResults(items)
+            return searchresults.to_list()
+
+        # Every caller gets its own copy of a shared result
+        key = ("search", cls.__name__, normalize_params(params))
+        return await coalesce_async(
+            key, search, copy=copy.deepcopy, cacheable=lambda items: is_success(fetched[0])
+        )
 
     @classmethod
     def get_search_results(cls, params: dict):
-        res = cls.fetch_data(params)
-        items = cls.parse_response(res, **params)
-        searchresults = SearchResults(items)
-        return searchresults.to_list()
+        fetched = []
+
+        def search():
+            with span(cls, "fetch"):
+                res = cls.fetch_data(params)
+            fetched.append(res)
+            with span(cls, "parse"):
+                items = cls.parse_items(res, **params)
+            with span(cls, "validate"):
+                searchresults = SearchResults(items)
+            return searchresults.to_list()
+
+        key = ("search", cls.__name__, normalize_params(params))
+        return coalesce(key, search, copy=copy.deepcopy, cacheable=lambda items: is_success(fetched[0]))
+
+    @classmethod
+    async def stream_search_results_async(cls, params: dict):
+        """
+        Yields the search results in two phases, so they can be shown before
+        every item page has been fetched.
+
+        First a {'type': 'base', 'items': [...]} event with the items as found on
+        the search page, placeholders included. For services that enrich items
+        from their detail pages, one event per item follows as each page resolves:
+        - {'type': 'details', 'index': i, 'id': ..., 'details': {...}, 'item': {...}}
+          where 'item' is the base item updated with the details.
+        - {'type': 'error', 'index': i, 'id': ..., 'error': exception} if the page failed.
+
+        Services without detail pages yield only the 'base' event with complete items.
+
+        Args:
+            params (dict): The search parameters.
+        """
+        with span(cls, "fetch"):
+            res = await cls.fetch_data_async(params)
+        parse_base_items = getattr(cls, "parse_base_items", None)
+        if parse_base_items is None or not hasattr(cls, "parse_item_details"):
+            items = await cls.parse_items_async(res, **params)
+            yield {"type": "base", "items": SearchResults(items).to_list()}
+            return
+
+        with span(cls, "parse_base"):
+            items = SearchResults(await parse_page_async(parse_base_items, res, **params)).to_list()
+        # Items with cached details are complete in the base event already
+        missing = apply_cached_details(cls, items)
+        yield {"type": "base", "items": list(items)}
+
+        limiter = get_limiter()
+
+        async def fetch_details(index):
+            url = items[index]["url"]
+
+            async def fetch_item_page():
+                async with limiter.limit(url):
+                    return await cls.fetch_item_page_async(url)
+
+            try:
+                response = await coalesce_page_async(url, fetch_item_page)
+                details = (await parse_many_async(cls.parse_item_details, [response.text]))[0]
+                store_details(cls, items[index]["id"], details)
+                return index, details, None
+            except Exception as e:
+                return index, None, e
+
+        tasks = [asyncio.ensure_future(fetch_details(i)) for i in missing]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, details, error = await next_done
+                if error is not None:
+                    yield {"type": "error", "index": index, "id": items[index]["id"], "error": error}
+                    continue
+                items[index] = {**items[index], **details}
+                yield {
+                    "type": "details",
+                    "index": index,
+                    "id": items[index]["id"],
+                    "details": details,
+                    "item": items[index],
+                }
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -1,12 +1,24 @@
 import json
-import random
 import string
 import httpx
-import bs4
+from lxml import etree
 from .baseservice import BaseService
-from ..utils.network_utils import fetch_async
+from ..utils.network_utils import fetch, fetch_async, fetch_until_async
+from ..utils.concurrency_utils import drop_failed, fetch_each, gather_limited
+from ..utils.cache_utils import apply_cached_details, store_details
+from ..utils.parse_utils import ResponseText, parse_many, parse_many_async, parse_page_async
+from ..utils.metrics_utils import span
+from ..utils.taxonomy_utils import get_taxonomy
+from ..utils.html_utils import (
+    FAST_PATH_ERRORS,
+    IncrementalPage,
+    has_class,
+    parse_document,
+    soup_text,
+    use_fast_path,
+    use_partial_pages,
+)
 import re
-import asyncio
 
 
 CHARACTERS = string.ascii_lowercase + string.digits
@@ -40,8 +52,23 @@ BRANDS_MAP = {
     "takahiro miyashita the soloist": "8964",
 }
 
+# Searches are scoped to men's clothing sizes and categories
+MENS_SIZE_GROUP_ID = 3
+MENS_CATEGORY_ID = 10005
+
+# Compiled once, used by the lxml fast-path parsers
+ITEM_XPATH = etree.XPath(f"//*[{has_class('item')}]")
+ITEM_LINK_XPATH = etree.XPath(f".//*[{has_class('link_search_image')}]")
+ITEM_PRICE_XPATH = etree.XPath(f".//*[{has_class('item-box__item-price')}]")
+TABLE_ROW_XPATH = etree.XPath("//tr")
+ROW_CELL_XPATH = etree.XPath(".//td")
+SLIDE_IMAGE_XPATH = etree.XPath(f"(//div[{has_class('sp-slide')}])[1]/descendant::img[1]/@src")
+FIRST_ROWS_XPATH = etree.XPath("(//tr)[position() <= 3]")
+
 
 class FrilService(BaseService):
+    # A search page lists 40 items
+    MAX_PAGE_SIZE = 40
 
     @staticmethod
     async def fetch_data_async(params: dict) -> httpx.Response:
@@ -54,28 +81,73 @@ class FrilService(BaseService):
     def fetch_data(params: dict) -> httpx.Response:
         item_count = params.get("item_count", 36)
         url = FrilService.get_search_params(params)
-        res = httpx.get(url)
+        res = fetch(url)
         return res
 
     @staticmethod
     async def parse_response_async(response: httpx.Response, **kwargs) -> str:
-        soup = bs4.BeautifulSoup(response.text, "lxml")
-        results = soup.select(".item")
-        item_count = kwargs.get("item_count", 36)
-        cleaned_items_list = FrilService.get_base_details(results, item_count)
-        cleaned_items_list_with_details = await FrilService.add_details_async(
-            cleaned_items_list
-        )
-        return json.dumps(cleaned_items_list_with_details)
+        items = await FrilService.parse_items_async(response, **kwargs)
+        return json.dumps(items)
 
     @staticmethod
     def parse_response(response: httpx.Response, **kwargs) -> str:
+        return json.dumps(FrilService.parse_items(response, **kwargs))
+
+    @staticmethod
+    async def parse_items_async(response: httpx.Response, **kwargs) -> list:
+        with span(FrilService, "parse_base"):
+            cleaned_items_list = await parse_page_async(
+                FrilService.parse_base_items, response, **kwargs
+            )
+        with span(FrilService, "details"):
+            cleaned_items_list_with_details = await FrilService.add_details_async(
+                cleaned_items_list
+            )
+        return cleaned_items_list_with_details
+
+    @staticmethod
+    def parse_items(response: httpx.Response, **kwargs) -> list:
+        with span(FrilService, "parse_base"):
+            cleaned_items_list = FrilService.parse_base_items(response, **kwargs)
+        with span(FrilService, "details"):
+            cleaned_items_list_with_details = FrilService.add_details(cleaned_items_list)
+        return cleaned_items_list_with_details
+
+    @staticmethod
+    def parse_base_items(response: httpx.Response, **kwargs) -> list:
+        item_count = kwargs.get("item_count", 36)
+        if use_fast_path():
+            try:
+                return FrilService.parse_base_items_lxml(response.text, item_count)
+            except FAST_PATH_ERRORS:
+                pass
+        # Imported here as only the fallback needs it, bs4 takes ~50 ms to import
+        import bs4
         soup = bs4.BeautifulSoup(response.text, "lxml")
         results = soup.select(".item")
-        item_count = kwargs.get("item_count", 36)
-        cleaned_items_list = FrilService.get_base_details(results, item_count)
-        cleaned_items_list_with_details = FrilService.add_details(cleaned_items_list)
-        return json.dumps(cleaned_items_list_with_details)
+        return FrilService.get_base_details(results, item_count)
+
+    @staticmethod
+    def parse_base_items_lxml(response_text: str, item_count: int) -> list:
+        """
+        Same as `get_base_details` on the search page, with lxml and compiled XPath.
+        """
+        cleaned_items_list = []
+        for item in ITEM_XPATH(parse_document(response_text))[:item_count]:
+            link = ITEM_LINK_XPATH(item)[0]
+            price_string = soup_text(ITEM_PRICE_XPATH(item)[0])
+            cleaned_items_list.append(
+                {
+                    "id": link.attrib["href"].split("/")[-1],
+                    "title": link.attrib["title"],
+                    "price": float(re.sub(r"\D", "", price_string)),
+                    "url": link.attrib["href"],
+                    "img": ["IMG PLACEHOLDER"],
+                    "size": "SIZE PLACEHOLDER",
+                    "brand": "BRAND PLACEHOLDER",
+                }
+            )
+        return cleaned_items_list
 
     @staticmethod
     def get_base_details(results, item_count) -> list:
@@ -96,40 +168,69 @@ class FrilService(BaseService):
 
     @staticmethod
     async def add_details_async(items: list) -> list:
-        tasks = []
-        for item in items:
-            url = item["url"]
-            task = asyncio.create_task(FrilService.fetch_item_page_async(url))
-            tasks.append(task)
-        responses = await asyncio.gather(*tasks)
-        item_details = [response.text for response in responses]
+        missing = apply_cached_details(FrilService, items)
+        urls = [items[i]["url"] for i in missing]
+        responses = await gather_limited(
+            urls, FrilService.fetch_item_page_async, return_exceptions=True
+        )
+        fetched, responses = drop_failed(missing, urls, responses)
+        item_details = await parse_many_async(
+            FrilService.parse_item_details, [response.text for response in responses]
+        )
 
-        for i, details in enumerate(item_details):
-            items[i] = {**items[i], **FrilService.parse_item_details(details)}
+        for i, details in zip(fetched, item_details):
+            store_details(FrilService, items[i]["id"], details)
+            items[i] = {**items[i], **details}
 
         return items
 
     @staticmethod
     def add_details(items: list) -> list:
-        for i, item in enumerate(items):
-            url = item["url"]
-            response = FrilService.fetch_item_page(url)
-            details = FrilService.parse_item_details(response.text)
+        missing = apply_cached_details(FrilService, items)
+        urls = [items[i]["url"] for i in missing]
+        responses = fetch_each(urls, FrilService.fetch_item_page)
+        fetched, responses = drop_failed(missing, urls, responses)
+        item_details = parse_many(
+            FrilService.parse_item_details, [response.text for response in responses]
+        )
+        for i, details in zip(fetched, item_details):
+            store_details(FrilService, items[i]["id"], details)
             items[i] = {**items[i], **details}
         return items
 
     @staticmethod
     async def fetch_item_page_async(url):
-        response = await fetch_async(url)
-        return response
+        if not use_partial_pages():
+            return await fetch_async(url)
+        # Only the start of the page is parsed, see item_page_complete
+        page = IncrementalPage(FrilService.item_page_complete, tags=("tr",))
+        await fetch_until_async(url, page.feed)
+        return ResponseText(page.text)
+
+    @staticmethod
+    def item_page_complete(page: IncrementalPage) -> bool:
+        """
+        Returns True once the part of an item page read by `parse_item_details`
+        has been parsed: the first three table rows and the first slide image.
+        """
+        rows = FIRST_ROWS_XPATH(page.root)
+        if len(rows) < 3 or not all(page.is_closed(row) for row in rows):
+            return False
+        return len(SLIDE_IMAGE_XPATH(page.root)) > 0
 
     @staticmethod
     def fetch_item_page(url):
-        response = httpx.get(url)
+        response = fetch(url)
         return response
 
     @staticmethod
     def parse_item_details(response_text: str):
+        if use_fast_path():
+            try:
+                return FrilService.parse_item_details_lxml(response_text)
+            except FAST_PATH_ERRORS:
+                pass
+        import bs4
         soup = bs4.BeautifulSoup(response_text, "lxml")
         details = {}
         tr_rows = soup.find_all("tr")
@@ -142,6 +243,23 @@ class FrilService(BaseService):
             details["img"] = [sp_slides[0].img["src"]]
         return details
 
+    @staticmethod
+    def parse_item_details_lxml(response_text: str) -> dict:
+        """
+        Same as the BeautifulSoup part of `parse_item_details`, with lxml and compiled XPath.
+        """
+        document = parse_document(response_text)
+        details = {}
+        tr_rows = TABLE_ROW_XPATH(document)
+        if len(tr_rows) > 1:
+            details["size"] = soup_text(ROW_CELL_XPATH(tr_rows[1])[0])
+            details["brand"] = soup_text(ROW_CELL_XPATH(tr_rows[2])[0]).replace("\n", "")
+
+        slide_images = SLIDE_IMAGE_XPATH(document)
+        if slide_images:
+            details["img"] = [str(slide_images[0])]
+        return details
+
     @staticmethod
     def get_search_params(params: dict) -> str:
 
@@ -155,10 +273,15 @@ class FrilService(BaseService):
 
         size = params.get("size")
         if "size" in params and size is not None:
-            if size not in SIZE_MAP:
-                raise ValueError(f"Size {size} is not supported")
-            size_id = SIZE_MAP[size]
-            url += f"&size_group_id=3&size_id={size_id}"
+            if size in SIZE_MAP:
+                size_id = SIZE_MAP[size]
+            else:
+                taxonomy = get_taxonomy()
+                entry = taxonomy.resolve(size, kind="size", under=MENS_SIZE_GROUP_ID)
+                if entry is None:
+                    raise taxonomy.unsupported(size, "size", MENS_SIZE_GROUP_ID)
+                size_id = entry["id"]
+            url += f"&size_group_id={MENS_SIZE_GROUP_ID}&size_id={size_id}"
 
         page = params.get("page")
         if "page" in params and page is not None:
@@ -171,4 +294,12 @@ class FrilService(BaseService):
             brand_id = BRANDS_MAP[brands[0]]
             url += f"&brand_id={brand_id}"
 
+        categories = params.get("category")
+        if "category" in params and categories is not None and len(categories) > 0:
+            taxonomy = get_taxonomy()
+            entry = taxonomy.resolve(categories[0], kind="category", under=MENS_CATEGORY_ID)
+            if entry is None:
+                raise taxonomy.unsupported(categories[0], "category", MENS_CATEGORY_ID)
+            url += f"&category_id={entry['id']}"
+
         return url
@@ -3,6 +3,7 @@ import time
 import uuid
 import httpx
 from .baseservice import BaseService
+from ..utils.network_utils import fetch, fetch_async
 
 
 class KindalService(BaseService):
@@ -87,9 +88,8 @@ class KindalService(BaseService):
         """
         url, url_params, headers = KindalService.generate_url_and_headers(params)
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, params=url_params, headers=headers)
-            return response
+        response = await fetch_async(url, params=url_params, headers=headers)
+        return response
 
     @staticmethod
     def fetch_data(params: dict) -> httpx.Response:
@@ -108,14 +108,28 @@ class KindalService(BaseService):
         """
         url, url_params, headers = KindalService.generate_url_and_headers(params)
 
-        with httpx.Client() as client:
-            response = client.get(url, params=url_params, headers=headers)
-            return response
+        response = fetch(url, params=url_params, headers=headers)
+        return response
 
     @staticmethod
     def parse_response(response: httpx.Response, **kwargs) -> str:
         """
         Parses the response from the Kindal API and returns a JSON string of cleaned items.
+        See `parse_items` for the item fields.
+
+        Args:
+            response (httpx.Response): The response from the API.
+
+        Returns:
+            str: A JSON string of cleaned items.
+        """
+        item_json = json.dumps(KindalService.parse_items(response, **kwargs))
+        return item_json
+
+    @staticmethod
+    def parse_items(response: httpx.Response, **kwargs) -> list:
+        """
+        Parses the response from the Kindal API into a list of cleaned items.
 
         Each item is a dictionary with the following keys:
         - 'id': The item's ID.
@@ -130,7 +144,7 @@ class KindalService(BaseService):
             response (httpx.Response): The response from the API.
 
         Returns:
-            str: A JSON string of cleaned items.
+            list: The cleaned items.
         """
         data = json.loads(response.text)
         products = data.get("products", [])
@@ -173,9 +187,12 @@ class KindalService(BaseService):
 
             cleaned_items_list.append(temp)
 
-        item_json = json.dumps(cleaned_items_list)
-        return item_json
+        return cleaned_items_list
 
     @staticmethod
     async def parse_response_async(response: httpx.Response, **kwargs) -> str:
         return KindalService.parse_response(response)
+
+    @staticmethod
+    async def parse_items_async(response: httpx.Response, **kwargs) -> list:
+        return KindalService.parse_items(response)
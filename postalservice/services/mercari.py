@@ -4,7 +4,9 @@ import random
 import string
 import httpx
 from .baseservice import BaseService
-from ..utils.network_utils import get_pop_jwt
+from ..utils.network_utils import fetch, fetch_async, get_pop_jwt, request, request_async
+from ..utils.concurrency_utils import gather_limited
+from ..utils.metrics_utils import span
 
 CHARACTERS = string.ascii_lowercase + string.digits
 
@@ -65,7 +67,6 @@ class MercariService(BaseService):
         else:
             brands = [BREANS_MAP.get(brand) for brand in brands]
 
-        url = "https://api.mercari.jp/v2/entities:search"
         searchSessionId = "".join(random.choice(CHARACTERS) for i in range(32))
         payload = {
             "userId": "",
@@ -103,13 +104,25 @@ class MercariService(BaseService):
             "withItemSize": True,
         }
         headers = {
-            "dpop": get_pop_jwt(url, "POST"),
             "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36",
             "x-platform": "web",
         }
 
         return payload, headers
 
+    @staticmethod
+    def dpop_headers(url: str, method: str):
+        """
+        Returns the `attempt_headers` of a request to the Mercari API: a new
+        DPoP proof for every attempt, since a retry can't reuse a proof.
+        """
+
+        def headers():
+            with span(MercariService, "sign"):
+                return {"dpop": get_pop_jwt(url, method)}
+
+        return headers
+
     @staticmethod
     async def fetch_data_async(params: dict) -> httpx.Response:
         """
@@ -129,9 +142,14 @@ class MercariService(BaseService):
         url = "https://api.mercari.jp/v2/entities:search"
         payload, headers = MercariService.generate_payload_and_headers(params)
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=payload, headers=headers)
-            return response
+        response = await request_async(
+            "POST",
+            url,
+            json=payload,
+            headers=headers,
+            attempt_headers=MercariService.dpop_headers(url, "POST"),
+        )
+        return response
 
     @staticmethod
     def fetch_data(params: dict) -> httpx.Response:
@@ -152,14 +170,40 @@ class MercariService(BaseService):
         url = "https://api.mercari.jp/v2/entities:search"
         payload, headers = MercariService.generate_payload_and_headers(params)
 
-        with httpx.Client() as client:
-            response = client.post(url, json=payload, headers=headers)
-            return response
+        response = request(
+            "POST",
+            url,
+            json=payload,
+            headers=headers,
+            attempt_headers=MercariService.dpop_headers(url, "POST"),
+        )
+        return response
 
     @staticmethod
     def parse_response(response: httpx.Response, **kwargs) -> str:
         """
         Parses the response from the Mercari API and returns a JSON string of cleaned items.
+        See `parse_items` for the item fields.
+
+        Args:
+            response (httpx.Response): The response from the API.
+
+        Returns:
+            str: A JSON string of cleaned items.
+        """
+
+        item_json = json.dumps(MercariService.parse_items(response, **kwargs))
+        return item_json
+
+    @staticmethod
+    async def parse_response_async(response: httpx.Response, **kwargs) -> str:
+        item_json = json.dumps(await MercariService.parse_items_async(response, **kwargs))
+        return item_json
+
+    @staticmethod
+    def parse_items(response: httpx.Response, **kwargs) -> list:
+        """
+        Parses the response from the Mercari API into a list of cleaned items.
 
         Each item is a dictionary with the following keys:
         - 'id': The item's ID.
@@ -167,13 +211,44 @@ class MercariService(BaseService):
         - 'price': The item's price.
         - 'size': The item's size, or None if not available.
         - 'url': The URL of the item.
-        - 'img': A list of the item's thumbnails.
+        - 'img': A list of the item's photos, or thumbnails if the photo lookup fails.
 
         Args:
             response (httpx.Response): The response from the API.
+            **kwargs: Search parameters. Set 'enrich_photos' to False to keep the
+                thumbnails and skip the per-item photo lookups.
 
         Returns:
-            str: A JSON string of cleaned items.
+            list: The cleaned items.
+        """
+
+        with span(MercariService, "parse_base"):
+            cleaned_items_list = MercariService.parse_base_items(response, **kwargs)
+        if kwargs.get("enrich_photos", True):
+            with span(MercariService, "details"):
+                cleaned_items_list = MercariService.add_details(cleaned_items_list)
+        return cleaned_items_list
+
+    @staticmethod
+    async def parse_items_async(response: httpx.Response, **kwargs) -> list:
+        """
+        Asynchronous version of `parse_items`. The photo lookups for all items
+        run concurrently instead of one after another.
+        """
+
+        with span(MercariService, "parse_base"):
+            cleaned_items_list = MercariService.parse_base_items(response, **kwargs)
+        if kwargs.get("enrich_photos", True):
+            with span(MercariService, "details"):
+                cleaned_items_list = await MercariService.add_details_async(
+                    cleaned_items_list
+                )
+        return cleaned_items_list
+
+    @staticmethod
+    def parse_base_items(response: httpx.Response, **kwargs) -> list:
+        """
+        Builds the cleaned items from the search response, using the thumbnails as images.
         """
 
         items = json.loads(response.text)["items"]
@@ -200,19 +275,78 @@ class MercariService(BaseService):
                 temp["img"].append(
                     img.replace("c!/w=240,f=webp/thumb", "item/detail/orig")
                 )
-            try:
-                temp["img"] = MercariService.get_listing_photos(item["id"])
-            except Exception as e:
-                print(f"Error fetching listing photos for item {item['id']}: {e}")
-                print("Used thumbnail")
             if item.get("itemBrand") is not None:
                 temp["brand"] = item.get("itemBrand").get("subName")
             else:
                 temp["brand"] = "--"
             cleaned_items_list.append(temp)
 
-        item_json = json.dumps(cleaned_items_list)
-        return item_json
+        return cleaned_items_list
+
+    @staticmethod
+    def add_details(items: list) -> list:
+        """
+        Replaces the thumbnails of the items with their full listing photos.
+        Items whose lookup fails keep their thumbnails.
+        """
+
+        for item in items:
+            try:
+                item["img"] = MercariService.get_listing_photos(item["id"])
+            except Exception as e:
+                print(f"Error fetching listing photos for item {item['id']}: {e}")
+                print("Used thumbnail")
+        return items
+
+    @staticmethod
+    async def add_details_async(items: list) -> list:
+        """
+        Replaces the thumbnails of the items with their full listing photos.
+        The lookups run concurrently under the shared concurrency limiter, and
+        items whose lookup fails keep their thumbnails.
+        """
+
+        urls = [MercariService.get_listing_photos_url(item["id"]) for item in items]
+        responses = await gather_limited(
+            urls, MercariService.fetch_listing_photos_async, return_exceptions=True
+        )
+        for item, response in zip(items, responses):
+            if isinstance(response, Exception):
+                print(f"Error fetching listing photos for item {item['id']}: {response}")
+                print("Used thumbnail")
+                continue
+            item["img"] = MercariService.parse_listing_photos(response.text, item["id"])
+        return items
+
+    @staticmethod
+    def get_listing_photos_url(item_id: str) -> str:
+        # Hack to check the listing type, if it is a normal listing or a shop listing
+        if len(item_id) < 13:
+            return f"https://api.mercari.jp/items/get?id={item_id}&include_item_attributes=true&include_product_page_component=true&include_non_ui_item_attributes=true&include_donation=true&include_item_attributes_sections=true&include_auction=true"
+        return f"https://api.mercari.jp/v1/marketplaces/shops/products/{item_id}?view=FULL&imageType=JPEG"
+
+    @staticmethod
+    def get_listing_photos_headers(url: str) -> dict:
+        return {
+            "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36",
+            "x-platform": "web",
+        }
+
+    @staticmethod
+    def parse_listing_photos(response_text: str, item_id: str) -> list:
+        """
+        Extracts the photo URLs from an `items/get` or `shops/products` response.
+        """
+        key = "data" if len(item_id) < 13 else "productDetail"
+        try:
+            data = json.loads(response_text)[key]
+            return [
+                img.replace("c!/w=240,f=webp/thumb", "item/detail/orig")
+                for img in data.get("photos", [])
+            ]
+        except (KeyError, json.JSONDecodeError) as e:
+            print(f"Error fetching listing photos: {e}")
+            return []
 
     @staticmethod
     def get_listing_photos(item_id: str) -> list:
@@ -226,47 +360,15 @@ class MercariService(BaseService):
             list: A list of URLs for the item's photos.
         """
 
+        url = MercariService.get_listing_photos_url(item_id)
+        headers = MercariService.get_listing_photos_headers(url)
+        response = fetch(url, headers=headers, attempt_headers=MercariService.dpop_headers(url, "GET"))
+        return MercariService.parse_listing_photos(response.text, item_id)
 
-        # Hack to check the listing type, if it is a normal listing or a shop listing
-        if len(item_id) < 13:
-            url = f"https://api.mercari.jp/items/get?id={item_id}&include_item_attributes=true&include_product_page_component=true&include_non_ui_item_attributes=true&include_donation=true&include_item_attributes_sections=true&include_auction=true"
-            headers = {
-                "dpop": get_pop_jwt(url, "GET"),
-                "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36",
-                "x-platform": "web",
-            }
-
-            with httpx.Client() as client:
-                response = client.get(url, headers=headers)
-                try:
-                    data = json.loads(response.text)["data"]
-                    return [
-                        img.replace("c!/w=240,f=webp/thumb", "item/detail/orig")
-                        for img in data.get("photos", [])
-                    ]
-                except (KeyError, json.JSONDecodeError) as e:
-                    print(f"Error fetching listing photos: {e}")
-                    return []
-        else:
-            url = f"https://api.mercari.jp/v1/marketplaces/shops/products/{item_id}?view=FULL&imageType=JPEG"
-            headers = {
-                "dpop": get_pop_jwt(url, "GET"),
-                "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36",
-                "x-platform": "web",
-            }
-
-            with httpx.Client() as client:
-                response = client.get(url, headers=headers)
-                try:
-                    data = json.loads(response.text)["productDetail"]
-                    return [
-                        img.replace("c!/w=240,f=webp/thumb", "item/detail/orig")
-                        for img in data.get("photos", [])
-                    ]
-                except (KeyError, json.JSONDecodeError) as e:
-                    print(f"Error fetching listing photos: {e}")
-                    return []
-                
     @staticmethod
-    async def parse_response_async(response: httpx.Response, **kwargs) -> str:
-        return MercariService.parse_response(response)
+    async def fetch_listing_photos_async(url: str) -> httpx.Response:
+        headers = MercariService.get_listing_photos_headers(url)
+        response = await fetch_async(
+            url, headers=headers, attempt_headers=MercariService.dpop_headers(url, "GET")
+        )
+        return response
@@ -1,10 +1,12 @@
 import json
 import httpx
-import bs4
 from .baseservice import BaseService
-from ..utils.network_utils import fetch_async
+from ..utils.network_utils import fetch, fetch_async
+from ..utils.concurrency_utils import drop_failed, fetch_each, gather_limited
+from ..utils.cache_utils import apply_cached_details, store_details
+from ..utils.parse_utils import parse_many, parse_many_async, parse_page_async
+from ..utils.metrics_utils import span
 import re
-import asyncio
 
 
 BRAND_MAP = {}
@@ -15,6 +17,10 @@ CATEGORY_MAP = {}
 
 
 class RagtagService(BaseService):
+    # The search URL has no page parameter
+    PAGINATED = False
+    # More than a search page ever lists
+    MAX_PAGE_SIZE = 100
 
     @staticmethod
     async def fetch_data_async(params: dict) -> httpx.Response:
@@ -25,28 +31,45 @@ class RagtagService(BaseService):
     @staticmethod
     def fetch_data(params: dict) -> httpx.Response:
         url = RagtagService.get_search_url(params)
-        res = httpx.get(url)
+        res = fetch(url)
         return res
 
     @staticmethod
     async def parse_response_async(response: httpx.Response, **kwargs) -> str:
-        soup = bs4.BeautifulSoup(response.text, "lxml")
-        results = soup.select(".search-result__item")
-        item_count = kwargs.get("item_count", 36)
-        cleaned_items_list = RagtagService.get_base_details(results, item_count)
-        cleaned_items_list_with_details = await RagtagService.add_details_async(
-            cleaned_items_list
-        )
-        return json.dumps(cleaned_items_list_with_details)
+        items = await RagtagService.parse_items_async(response, **kwargs)
+        return json.dumps(items)
 
     @staticmethod
     def parse_response(response: httpx.Response, **kwargs) -> str:
+        return json.dumps(RagtagService.parse_items(response, **kwargs))
+
+    @staticmethod
+    async def parse_items_async(response: httpx.Response, **kwargs) -> list:
+        with span(RagtagService, "parse_base"):
+            cleaned_items_list = await parse_page_async(
+                RagtagService.parse_base_items, response, **kwargs
+            )
+        with span(RagtagService, "details"):
+            cleaned_items_list_with_details = await RagtagService.add_details_async(
+                cleaned_items_list
+            )
+        return cleaned_items_list_with_details
+
+    @staticmethod
+    def parse_items(response: httpx.Response, **kwargs) -> list:
+        with span(RagtagService, "parse_base"):
+            cleaned_items_list = RagtagService.parse_base_items(response, **kwargs)
+        with span(RagtagService, "details"):
+            cleaned_items_list_with_details = RagtagService.add_details(cleaned_items_list)
+        return cleaned_items_list_with_details
+
+    @staticmethod
+    def parse_base_items(response: httpx.Response, **kwargs) -> list:
+        import bs4
         soup = bs4.BeautifulSoup(response.text, "lxml")
         results = soup.select(".search-result__item")
         item_count = kwargs.get("item_count", 36)
-        cleaned_items_list = RagtagService.get_base_details(results, item_count)
-        cleaned_items_list_with_details = RagtagService.add_details(cleaned_items_list)
-        return json.dumps(cleaned_items_list_with_details)
+        return RagtagService.get_base_details(results, item_count)
 
     @staticmethod
     def get_base_details(results, item_count) -> list:
@@ -121,25 +144,33 @@ class RagtagService(BaseService):
 
     @staticmethod
     async def add_details_async(items: list) -> list:
-        tasks = []
-        for item in items:
-            url = item["url"]
-            task = asyncio.create_task(RagtagService.fetch_item_page_async(url))
-            tasks.append(task)
-        responses = await asyncio.gather(*tasks)
-        item_details = [response.text for response in responses]
+        missing = apply_cached_details(RagtagService, items)
+        urls = [items[i]["url"] for i in missing]
+        responses = await gather_limited(
+            urls, RagtagService.fetch_item_page_async, return_exceptions=True
+        )
+        fetched, responses = drop_failed(missing, urls, responses)
+        item_details = await parse_many_async(
+            RagtagService.parse_item_details, [response.text for response in responses]
+        )
 
-        for i, details in enumerate(item_details):
-            items[i] = {**items[i], **RagtagService.parse_item_details(details)}
+        for i, details in zip(fetched, item_details):
+            store_details(RagtagService, items[i]["id"], details)
+            items[i] = {**items[i], **details}
 
         return items
 
     @staticmethod
     def add_details(items: list) -> list:
-        for i, item in enumerate(items):
-            url = item["url"]
-            response = RagtagService.fetch_item_page(url)
-            details = RagtagService.parse_item_details(response.text)
+        missing = apply_cached_details(RagtagService, items)
+        urls = [items[i]["url"] for i in missing]
+        responses = fetch_each(urls, RagtagService.fetch_item_page)
+        fetched, responses = drop_failed(missing, urls, responses)
+        item_details = parse_many(
+            RagtagService.parse_item_details, [response.text for response in responses]
+        )
+        for i, details in zip(fetched, item_details):
+            store_details(RagtagService, items[i]["id"], details)
             items[i] = {**items[i], **details}
         return items
 
@@ -150,11 +181,12 @@ class RagtagService(BaseService):
 
     @staticmethod
     def fetch_item_page(url):
-        response = httpx.get(url)
+        response = fetch(url)
         return response
 
     @staticmethod
     def parse_item_details(response_text: str):
+        import bs4
         soup = bs4.BeautifulSoup(response_text, "lxml")
         details = {}
 
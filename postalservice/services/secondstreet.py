@@ -3,17 +3,51 @@ import json
 import random
 import re
 import string
-import bs4
+from typing import TYPE_CHECKING
 import httpx
-from playwright.async_api import async_playwright
-from playwright.sync_api import sync_playwright
 from .baseservice import BaseService
-from ..utils.network_utils import fetch_async
+from ..utils.browser_utils import get_async_browser_pool, get_browser_pool
+from ..utils.retry_utils import (
+    RETRY_STATUSES,
+    RetryableStatusError,
+    call_with_retries,
+    call_with_retries_async,
+)
+
+if TYPE_CHECKING:
+    # bs4 is imported when a page is parsed, see parse_items
+    import bs4
 
 CHARACTERS = string.ascii_lowercase + string.digits
 
+ITEM_LIST_SELECTOR = ".itemCardList.-wrap"
+# Milliseconds to wait for the item list after the DOM is ready
+ITEM_LIST_TIMEOUT = 10000
+
+HEADERS = {
+    "Accept": "*/*",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Priority": "u=3, i",
+    "Referer": "https://www.2ndstreet.jp/",
+    "Sec-Fetch-Dest": "empty",
+    "Sec-Fetch-Mode": "no-cors",
+    "Sec-Fetch-Site": "same-site",
+}
+
+
+def check_status(response) -> None:
+    """
+    Raises `RetryableStatusError` if a Playwright navigation got a 429/5xx response.
+    """
+    if response is not None and response.status in RETRY_STATUSES:
+        raise RetryableStatusError(response.status, response.headers.get("retry-after"))
+
 
 class SecondStreetService(BaseService):
+    FIRST_PAGE = 0
+    # More than a search page ever lists
+    MAX_PAGE_SIZE = 100
+
     def __init__(self):
         super().__init__()
 
@@ -21,6 +55,8 @@ class SecondStreetService(BaseService):
     def fetch_data(params: dict) -> str:
         """
         Fetches data from the 2nd Street website using Playwright for JavaScript rendering.
+        The page is borrowed from the thread's shared browser pool. Failed page
+        loads are retried like HTTP requests, see `retry_utils.RetryPolicy`.
 
         Args:
             params (dict): The search parameters.
@@ -28,62 +64,42 @@ class SecondStreetService(BaseService):
         Returns:
             str: The HTML content after JavaScript execution.
         """
-        try:
-            # Build the URL with search parameters
-            url = SecondStreetService.get_search_params(params)
-
-            with sync_playwright() as p:
-                # Launch browser with container-friendly options
-                browser = p.firefox.launch(
-                    headless=True,
-                    args=[
-                        "--no-sandbox",
-                        "--disable-dev-shm-usage",
-                        "--disable-gpu",
-                        "--disable-web-security",
-                        "--disable-features=VizDisplayCompositor",
-                    ],
-                )
-                context = browser.new_context(
-                    user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/18.6 Safari/605.1.15"
-                )
-
-                # Create a new page
-                page = context.new_page()
-
-                # Set additional headers
-                page.set_extra_http_headers(
-                    {
-                        "Accept": "*/*",
-                        "Accept-Language": "en-US,en;q=0.9",
-                        "Priority": "u=3, i",
-                        "Referer": "https://www.2ndstreet.jp/",
-                        "Sec-Fetch-Dest": "empty",
-                        "Sec-Fetch-Mode": "no-cors",
-                        "Sec-Fetch-Site": "same-site",
-                    }
-                )
+        # Playwright is imported with the browser pool, on first use
+        from playwright.sync_api import Error as PlaywrightError
 
-                # Navigate to the URL
-                page.goto(url)
+        url = SecondStreetService.get_search_params(params)
+        return call_with_retries(
+            url, lambda: SecondStreetService.load_search_page(url), retry_errors=(PlaywrightError,)
+        )
 
-                # Add a small delay to ensure all JavaScript has executed
-                page.wait_for_timeout(1000)
+    @staticmethod
+    def load_search_page(url: str) -> str:
+        from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
 
-                # Get the page content
-                content = page.content()
+        with get_browser_pool().page() as page:
+            page.set_extra_http_headers(HEADERS)
 
-                browser.close()
-                return content
+            # Navigate to the URL, the item list is in the DOM long before the load event
+            response = page.goto(url, wait_until="domcontentloaded", timeout=30000)
+            check_status(response)
 
-        except Exception as e:
-            print(f"Error fetching data from SecondStreet with Playwright: {e}")
-            return ""
+            # Return only the item list once it is there
+            try:
+                page.wait_for_selector(
+                    ITEM_LIST_SELECTOR, state="attached", timeout=ITEM_LIST_TIMEOUT
+                )
+                return page.eval_on_selector(
+                    ITEM_LIST_SELECTOR, "element => element.outerHTML"
+                )
+            except PlaywrightTimeoutError:
+                # No item list (e.g. no hits), keep the whole page for its embedded data
+                return page.content()
 
     @staticmethod
     async def fetch_data_async(params: dict) -> str:
         """
         Asynchronously fetches data from the 2nd Street website using Playwright.
+        The page is borrowed from the event loop's shared browser pool.
 
         Args:
             params (dict): The search parameters.
@@ -91,70 +107,57 @@ class SecondStreetService(BaseService):
         Returns:
             str: The HTML content after JavaScript execution.
         """
-        try:
-            url = SecondStreetService.get_search_params(params)
-
-            print("fetching 2ndstreet async...")
-            async with async_playwright() as p:
-                # Launch browser with container-friendly options
-                print("launching browser...")
-                browser = await p.firefox.launch(
-                    headless=True,
-                    args=[
-                        "--no-sandbox",
-                        "--disable-dev-shm-usage",
-                        "--disable-gpu",
-                        "--disable-web-security",
-                        "--disable-features=VizDisplayCompositor",
-                    ],
-                )
-                print("browser launched")
-                context = await browser.new_context(
-                    user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/18.6 Safari/605.1.15"
-                )
+        from playwright.async_api import Error as PlaywrightError
 
-                # Create a new page
-                print("creating new page...")
-                page = await context.new_page()
-
-                # Set additional headers
-                print("setting extra HTTP headers...")
-                await page.set_extra_http_headers(
-                    {
-                        "Accept": "*/*",
-                        "Accept-Language": "en-US,en;q=0.9",
-                        "Priority": "u=3, i",
-                        "Referer": "https://www.2ndstreet.jp/",
-                        "Sec-Fetch-Dest": "empty",
-                        "Sec-Fetch-Mode": "no-cors",
-                        "Sec-Fetch-Site": "same-site",
-                    }
-                )
+        url = SecondStreetService.get_search_params(params)
+        return await call_with_retries_async(
+            url,
+            lambda: SecondStreetService.load_search_page_async(url),
+            retry_errors=(PlaywrightError,),
+        )
 
-                # Navigate to the URL (match the sync version more closely)
-                print("navigating to URL...")
-                await page.goto(url, timeout=30000)
+    @staticmethod
+    async def load_search_page_async(url: str) -> str:
+        from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 
-                # Add a small delay to ensure all JavaScript has executed
-                print("waiting for timeout...")
-                await page.wait_for_timeout(1000)
+        async with get_async_browser_pool().page() as page:
+            await page.set_extra_http_headers(HEADERS)
 
-                # Get the page content
-                print("getting page content...")
-                content = await page.content()
-                print("closing browser...")
-                await browser.close()
-                return content
+            # Navigate to the URL, the item list is in the DOM long before the load event
+            response = await page.goto(url, wait_until="domcontentloaded", timeout=30000)
+            check_status(response)
 
-        except Exception as e:
-            print(f"Error fetching data from SecondStreet with Playwright: {e}")
-            return ""
+            # Return only the item list once it is there
+            try:
+                await page.wait_for_selector(
+                    ITEM_LIST_SELECTOR, state="attached", timeout=ITEM_LIST_TIMEOUT
+                )
+                return await page.eval_on_selector(
+                    ITEM_LIST_SELECTOR, "element => element.outerHTML"
+                )
+            except PlaywrightTimeoutError:
+                # No item list (e.g. no hits), keep the whole page for its embedded data
+                return await page.content()
 
     @staticmethod
-    def parse_response(response_text: str, **kwargs) -> list:
+    def parse_response(response_text: str, **kwargs) -> str:
         """
         Parses the response from the 2nd Street API.
 
+        Args:
+            response_text (str): The response text from the API.
+            **kwargs: Additional parameters including item_count.
+
+        Returns:
+            str: A JSON string of the items.
+        """
+        return json.dumps(SecondStreetService.parse_items(response_text, **kwargs))
+
+    @staticmethod
+    def parse_items(response_text: str, **kwargs) -> list:
+        """
+        Parses the response from the 2nd Street API into a list of items.
+
         Args:
             response_text (str): The response text from the API.
             **kwargs: Additional parameters including item_count.
@@ -163,6 +166,7 @@ class SecondStreetService(BaseService):
             list: A list of dictionaries containing item information.
         """
         try:
+            import bs4
             soup = bs4.BeautifulSoup(response_text, "lxml")
             items = []
 
@@ -172,6 +176,10 @@ class SecondStreetService(BaseService):
             # Get the item count limit from kwargs, default to a reasonable number if not specified
             item_count = kwargs.get("item_count", 36)
 
+            # Without the card markup, fall back to the listings embedded as JSON-LD
+            if not item_cards:
+                return SecondStreetService.parse_embedded_json(soup, item_count)
+
             # Limit the number of items to process
             for card in item_cards[:item_count]:
                 try:
@@ -281,14 +289,76 @@ class SecondStreetService(BaseService):
                     print(f"Error parsing individual item: {e}")
                     continue
 
-            return json.dumps(items)
+            return items
 
         except Exception as e:
             print(f"Error parsing SecondStreet response: {e}")
             return []
 
     @staticmethod
-    async def parse_response_async(response_text: str, **kwargs) -> list:
+    def parse_embedded_json(soup: "bs4.BeautifulSoup", item_count: int) -> list:
+        """
+        Reads listings from the schema.org ItemList JSON-LD embedded in the page.
+        It carries no size or condition, so the card markup is preferred when present.
+
+        Args:
+            soup (bs4.BeautifulSoup): The parsed page.
+            item_count (int): Maximum number of items to return.
+
+        Returns:
+            list: A list of dictionaries containing item information.
+        """
+        items = []
+        for script in soup.select('script[type="application/ld+json"]'):
+            try:
+                data = json.loads(script.string or "")
+            except json.JSONDecodeError:
+                continue
+            entries = data if isinstance(data, list) else [data]
+            for entry in entries:
+                if not isinstance(entry, dict) or entry.get("@type") != "ItemList":
+                    continue
+                for element in entry.get("itemListElement", []):
+                    product = element.get("item", element)
+                    url = product.get("url")
+                    if not url:
+                        continue
+                    if url.startswith("/"):
+                        url = f"https://www.2ndstreet.jp{url}"
+                    url_match = re.search(r"/goodsId/(\d+)", url)
+
+                    images = product.get("image") or []
+                    if isinstance(images, str):
+                        images = [images]
+
+                    brand = product.get("brand") or ""
+                    if isinstance(brand, dict):
+                        brand = brand.get("name", "")
+
+                    offers = product.get("offers") or {}
+                    if isinstance(offers, list):
+                        offers = offers[0] if offers else {}
+                    try:
+                        price = float(offers.get("price", 0))
+                    except (TypeError, ValueError):
+                        price = 0.0
+
+                    items.append(
+                        {
+                            "url": url,
+                            "id": url_match.group(1) if url_match else url.rstrip("/").split("/")[-1],
+                            "brand": brand,
+                            "title": product.get("name", ""),
+                            "price": price,
+                            "img": images,
+                            "condition": "",
+                            "size": "",
+                        }
+                    )
+        return items[:item_count]
+
+    @staticmethod
+    async def parse_response_async(response_text: str, **kwargs) -> str:
         """
         Asynchronously parses the response from the 2nd Street API.
 
@@ -297,10 +367,14 @@ class SecondStreetService(BaseService):
             **kwargs: Additional parameters including item_count.
 
         Returns:
-            list: A list of dictionaries containing item information.
+            str: A JSON string of the items.
         """
         return SecondStreetService.parse_response(response_text, **kwargs)
 
+    @staticmethod
+    async def parse_items_async(response_text: str, **kwargs) -> list:
+        return SecondStreetService.parse_items(response_text, **kwargs)
+
     @staticmethod
     def get_base_details() -> dict:
         """
@@ -369,96 +443,35 @@ class SecondStreetService(BaseService):
         """
         Asynchronously fetch individual item page using Playwright.
         """
-        try:
-            async with async_playwright() as p:
-                # Launch browser with container-friendly options
-                browser = await p.firefox.launch(
-                    headless=True,
-                    args=[
-                        "--no-sandbox",
-                        "--disable-dev-shm-usage",
-                        "--disable-gpu",
-                        "--disable-web-security",
-                        "--disable-features=VizDisplayCompositor",
-                    ],
-                )
-                context = browser.new_context(
-                    user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/18.6 Safari/605.1.15"
-                )
+        from playwright.async_api import Error as PlaywrightError
 
-                # Create a new page
-                page = await context.new_page()
-
-                # Set additional headers
-                await page.set_extra_http_headers(
-                    {
-                        "Accept": "*/*",
-                        "Accept-Language": "en-US,en;q=0.9",
-                        "Priority": "u=3, i",
-                        "Referer": "https://www.2ndstreet.jp/",
-                        "Sec-Fetch-Dest": "empty",
-                        "Sec-Fetch-Mode": "no-cors",
-                        "Sec-Fetch-Site": "same-site",
-                    }
-                )
+        async def load():
+            async with get_async_browser_pool().page() as page:
+                await page.set_extra_http_headers(HEADERS)
+                check_status(await page.goto(url, wait_until="domcontentloaded", timeout=30000))
+                return await page.content()
 
-                await page.goto(url, timeout=30000)
-                content = await page.content()
-                await browser.close()
-                return content
-        except Exception as e:
-            print(f"Error fetching item page: {e}")
-            return ""
+        return await call_with_retries_async(url, load, retry_errors=(PlaywrightError,))
 
     @staticmethod
     def fetch_item_page(url: str) -> str:
         """
         Fetch individual item page using Playwright.
         """
-        try:
-            with sync_playwright() as p:
-                # Launch browser with container-friendly options
-                browser = p.firefox.launch(
-                    headless=True,
-                    args=[
-                        "--no-sandbox",
-                        "--disable-dev-shm-usage",
-                        "--disable-gpu",
-                        "--disable-web-security",
-                        "--disable-features=VizDisplayCompositor",
-                    ],
-                )
-                context = browser.new_context(
-                    user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/18.6 Safari/605.1.15"
-                )
+        from playwright.sync_api import Error as PlaywrightError
 
-                # Create a new page
-                page = context.new_page()
-
-                # Set additional headers
-                page.set_extra_http_headers(
-                    {
-                        "Accept": "*/*",
-                        "Accept-Language": "en-US,en;q=0.9",
-                        "Priority": "u=3, i",
-                        "Referer": "https://www.2ndstreet.jp/",
-                        "Sec-Fetch-Dest": "empty",
-                        "Sec-Fetch-Mode": "no-cors",
-                        "Sec-Fetch-Site": "same-site",
-                    }
-                )
+        def load():
+            with get_browser_pool().page() as page:
+                page.set_extra_http_headers(HEADERS)
+                check_status(page.goto(url, wait_until="domcontentloaded", timeout=30000))
+                return page.content()
 
-                page.goto(url, wait_until="networkidle", timeout=30000)
-                content = page.content()
-                browser.close()
-                return content
-        except Exception as e:
-            print(f"Error fetching item page: {e}")
-            return ""
+        return call_with_retries(url, load, retry_errors=(PlaywrightError,))
 
     @staticmethod
     def parse_item_details(response_text: str):
         # Placeholder implementation - will be implemented when you provide item detail page structure
+        import bs4
         soup = bs4.BeautifulSoup(response_text, "lxml")
         details = {}
 
@@ -1,17 +1,21 @@
-import asyncio
 import json
 import random
 import re
 import string
-import bs4
 import httpx
 from .baseservice import BaseService
-from ..utils.network_utils import fetch_async
+from ..utils.network_utils import fetch, fetch_async
+from ..utils.concurrency_utils import drop_failed, fetch_each, gather_limited
+from ..utils.cache_utils import apply_cached_details, store_details
+from ..utils.parse_utils import parse_many, parse_many_async, parse_page_async
+from ..utils.metrics_utils import span
 
 CHARACTERS = string.ascii_lowercase + string.digits
 
 
 class TrefacService(BaseService):
+    # More than a search page ever lists
+    MAX_PAGE_SIZE = 100
 
     @staticmethod
     async def fetch_data_async(params: dict) -> httpx.Response:
@@ -24,28 +28,45 @@ class TrefacService(BaseService):
     def fetch_data(params: dict) -> httpx.Response:
         item_count = params.get("item_count", 50)
         url = TrefacService.get_search_params(params)
-        res = httpx.get(url)
+        res = fetch(url)
         return res
 
     @staticmethod
     async def parse_response_async(response: httpx.Response, **kwargs) -> str:
-        soup = bs4.BeautifulSoup(response.text, "lxml")
-        results = soup.select(".p-itemlist.is-col5 .p-itemlist_item")
-        item_count = kwargs.get("item_count", 50)
-        cleaned_items_list = TrefacService.get_base_details(results, item_count)
-        cleaned_items_list_with_details = await TrefacService.add_details_async(
-            cleaned_items_list
-        )
-        return json.dumps(cleaned_items_list_with_details)
+        items = await TrefacService.parse_items_async(response, **kwargs)
+        return json.dumps(items)
 
     @staticmethod
     def parse_response(response: httpx.Response, **kwargs) -> str:
+        return json.dumps(TrefacService.parse_items(response, **kwargs))
+
+    @staticmethod
+    async def parse_items_async(response: httpx.Response, **kwargs) -> list:
+        with span(TrefacService, "parse_base"):
+            cleaned_items_list = await parse_page_async(
+                TrefacService.parse_base_items, response, **kwargs
+            )
+        with span(TrefacService, "details"):
+            cleaned_items_list_with_details = await TrefacService.add_details_async(
+                cleaned_items_list
+            )
+        return cleaned_items_list_with_details
+
+    @staticmethod
+    def parse_items(response: httpx.Response, **kwargs) -> list:
+        with span(TrefacService, "parse_base"):
+            cleaned_items_list = TrefacService.parse_base_items(response, **kwargs)
+        with span(TrefacService, "details"):
+            cleaned_items_list_with_details = TrefacService.add_details(cleaned_items_list)
+        return cleaned_items_list_with_details
+
+    @staticmethod
+    def parse_base_items(response: httpx.Response, **kwargs) -> list:
+        import bs4
         soup = bs4.BeautifulSoup(response.text, "lxml")
         results = soup.select(".p-itemlist.is-col5 .p-itemlist_item")
         item_count = kwargs.get("item_count", 50)
-        cleaned_items_list = TrefacService.get_base_details(results, item_count)
-        cleaned_items_list_with_details = TrefacService.add_details(cleaned_items_list)
-        return json.dumps(cleaned_items_list_with_details)
+        return TrefacService.get_base_details(results, item_count)
 
     @staticmethod
     def get_base_details(results, item_count) -> list:
@@ -116,25 +137,33 @@ class TrefacService(BaseService):
 
     @staticmethod
     async def add_details_async(items: list) -> list:
-        tasks = []
-        for item in items:
-            url = item["url"]
-            task = asyncio.create_task(TrefacService.fetch_item_page_async(url))
-            tasks.append(task)
-        responses = await asyncio.gather(*tasks)
-        item_details = [response.text for response in responses]
+        missing = apply_cached_details(TrefacService, items)
+        urls = [items[i]["url"] for i in missing]
+        responses = await gather_limited(
+            urls, TrefacService.fetch_item_page_async, return_exceptions=True
+        )
+        fetched, responses = drop_failed(missing, urls, responses)
+        item_details = await parse_many_async(
+            TrefacService.parse_item_details, [response.text for response in responses]
+        )
 
-        for i, details in enumerate(item_details):
-            items[i] = {**items[i], **TrefacService.parse_item_details(details)}
+        for i, details in zip(fetched, item_details):
+            store_details(TrefacService, items[i]["id"], details)
+            items[i] = {**items[i], **details}
 
         return items
 
     @staticmethod
     def add_details(items: list) -> list:
-        for i, item in enumerate(items):
-            url = item["url"]
-            response = TrefacService.fetch_item_page(url)
-            details = TrefacService.parse_item_details(response.text)
+        missing = apply_cached_details(TrefacService, items)
+        urls = [items[i]["url"] for i in missing]
+        responses = fetch_each(urls, TrefacService.fetch_item_page)
+        fetched, responses = drop_failed(missing, urls, responses)
+        item_details = parse_many(
+            TrefacService.parse_item_details, [response.text for response in responses]
+        )
+        for i, details in zip(fetched, item_details):
+            store_details(TrefacService, items[i]["id"], details)
             items[i] = {**items[i], **details}
         return items
 
@@ -145,11 +174,12 @@ class TrefacService(BaseService):
 
     @staticmethod
     def fetch_item_page(url):
-        response = httpx.get(url)
+        response = fetch(url)
         return response
 
     @staticmethod
     def parse_item_details(response_text: str):
+        import bs4
         soup = bs4.BeautifulSoup(response_text, "lxml")
         details = {}
 
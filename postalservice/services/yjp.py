@@ -1,12 +1,14 @@
-import asyncio
 import json
 import random
 import re
 import string
-import bs4
 import httpx
 from .baseservice import BaseService
-from ..utils.network_utils import fetch_async
+from ..utils.network_utils import fetch, fetch_async
+from ..utils.concurrency_utils import drop_failed, fetch_each, gather_limited
+from ..utils.cache_utils import apply_cached_details, store_details
+from ..utils.parse_utils import parse_many, parse_many_async, parse_page_async
+from ..utils.metrics_utils import span
 
 CHARACTERS = string.ascii_lowercase + string.digits
 
@@ -53,6 +55,9 @@ CATEGORIES_MAP = {
 
 
 class YJPService(BaseService):
+    FIRST_PAGE = 0
+    # More than a search page ever lists
+    MAX_PAGE_SIZE = 100
 
     @staticmethod
     async def fetch_data_async(params: dict) -> httpx.Response:
@@ -65,28 +70,45 @@ class YJPService(BaseService):
     def fetch_data(params: dict) -> httpx.Response:
         item_count = params.get("item_count", 50)
         url = YJPService.get_search_params(params)
-        res = httpx.get(url)
+        res = fetch(url)
         return res
 
     @staticmethod
     async def parse_response_async(response: httpx.Response, **kwargs) -> str:
-        soup = bs4.BeautifulSoup(response.text, "lxml")
-        results = soup.select(".Product")
-        item_count = kwargs.get("item_count", 50)
-        cleaned_items_list = YJPService.get_base_details(results, item_count)
-        cleaned_items_list_with_details = await YJPService.add_details_async(
-            cleaned_items_list
-        )
-        return json.dumps(cleaned_items_list_with_details)
+        items = await YJPService.parse_items_async(response, **kwargs)
+        return json.dumps(items)
 
     @staticmethod
     def parse_response(response: httpx.Response, **kwargs) -> str:
+        return json.dumps(YJPService.parse_items(response, **kwargs))
+
+    @staticmethod
+    async def parse_items_async(response: httpx.Response, **kwargs) -> list:
+        with span(YJPService, "parse_base"):
+            cleaned_items_list = await parse_page_async(
+                YJPService.parse_base_items, response, **kwargs
+            )
+        with span(YJPService, "details"):
+            cleaned_items_list_with_details = await YJPService.add_details_async(
+                cleaned_items_list
+            )
+        return cleaned_items_list_with_details
+
+    @staticmethod
+    def parse_items(response: httpx.Response, **kwargs) -> list:
+        with span(YJPService, "parse_base"):
+            cleaned_items_list = YJPService.parse_base_items(response, **kwargs)
+        with span(YJPService, "details"):
+            cleaned_items_list_with_details = YJPService.add_details(cleaned_items_list)
+        return cleaned_items_list_with_details
+
+    @staticmethod
+    def parse_base_items(response: httpx.Response, **kwargs) -> list:
+        import bs4
         soup = bs4.BeautifulSoup(response.text, "lxml")
         results = soup.select(".Product")
         item_count = kwargs.get("item_count", 50)
-        cleaned_items_list = YJPService.get_base_details(results, item_count)
-        cleaned_items_list_with_details = YJPService.add_details(cleaned_items_list)
-        return json.dumps(cleaned_items_list_with_details)
+        return YJPService.get_base_details(results, item_count)
 
     @staticmethod
     def get_base_details(results, item_count) -> list:
@@ -106,25 +128,33 @@ class YJPService(BaseService):
 
     @staticmethod
     async def add_details_async(items: list) -> list:
-        tasks = []
-        for item in items:
-            url = item["url"]
-            task = asyncio.create_task(YJPService.fetch_item_page_async(url))
-            tasks.append(task)
-        responses = await asyncio.gather(*tasks)
-        item_details = [response.text for response in responses]
+        missing = apply_cached_details(YJPService, items)
+        urls = [items[i]["url"] for i in missing]
+        responses = await gather_limited(
+            urls, YJPService.fetch_item_page_async, return_exceptions=True
+        )
+        fetched, responses = drop_failed(missing, urls, responses)
+        item_details = await parse_many_async(
+            YJPService.parse_item_details, [response.text for response in responses]
+        )
 
-        for i, details in enumerate(item_details):
-            items[i] = {**items[i], **YJPService.parse_item_details(details)}
+        for i, details in zip(fetched, item_details):
+            store_details(YJPService, items[i]["id"], details)
+            items[i] = {**items[i], **details}
 
         return items
 
     @staticmethod
     def add_details(items: list) -> list:
-        for i, item in enumerate(items):
-            url = item["url"]
-            response = YJPService.fetch_item_page(url)
-            details = YJPService.parse_item_details(response.text)
+        missing = apply_cached_details(YJPService, items)
+        urls = [items[i]["url"] for i in missing]
+        responses = fetch_each(urls, YJPService.fetch_item_page)
+        fetched, responses = drop_failed(missing, urls, responses)
+        item_details = parse_many(
+            YJPService.parse_item_details, [response.text for response in responses]
+        )
+        for i, details in zip(fetched, item_details):
+            store_details(YJPService, items[i]["id"], details)
             items[i] = {**items[i], **details}
         return items
 
@@ -135,11 +165,12 @@ class YJPService(BaseService):
 
     @staticmethod
     def fetch_item_page(url):
-        response = httpx.get(url)
+        response = fetch(url)
         return response
 
     @staticmethod
     def parse_item_details(response_text: str):
+        import bs4
         soup = bs4.BeautifulSoup(response_text, "lxml")
         details = {}
 
@@ -1 +1 @@
-from .search_utils import SearchResults
\ No newline at end of file
+from .search_utils import SearchResults, Listing, ColumnarSearchResults
@@ -0,0 +1,381 @@
+import asyncio
+import atexit
+import threading
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+
+# Container-friendly launch options
+LAUNCH_ARGS = [
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--disable-web-security",
+    "--disable-features=VizDisplayCompositor",
+]
+
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/18.6 Safari/605.1.15"
+
+# Requests the scrapers never need: they only read the DOM, not what it renders
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font"}
+BLOCKED_URL_PARTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googleadservices.com",
+    "googlesyndication.com",
+    "doubleclick.net",
+    "facebook.net",
+    "facebook.com/tr",
+    "criteo.",
+    "clarity.ms",
+    "ads-twitter.com",
+    "analytics.tiktok.com",
+    "karte.io",
+    "yjtag.yahoo.co.jp",
+)
+
+
+# Playwright takes ~100 ms to import, so it is imported when a pool first starts
+def async_playwright():
+    from playwright.async_api import async_playwright
+
+    return async_playwright()
+
+
+def sync_playwright():
+    from playwright.sync_api import sync_playwright
+
+    return sync_playwright()
+
+DEFAULT_OPTIONS = {
+    "max_pages": 4,
+    "recycle_after": 100,
+    "headless": True,
+    "extra_http_headers": None,
+    "block_resources": True,
+    "route_handler": None,
+}
+
+
+def should_block(request) -> bool:
+    """
+    Returns True for image, media and font requests and for known analytics and ad trackers.
+    """
+    if request.resource_type in BLOCKED_RESOURCE_TYPES:
+        return True
+    return any(part in request.url for part in BLOCKED_URL_PARTS)
+
+
+def _make_route_async(block_resources: bool, route_handler):
+    async def route_async(route):
+        if block_resources and should_block(route.request):
+            await route.abort()
+        elif route_handler is not None:
+            await route_handler.route_async(route)
+        else:
+            await route.continue_()
+
+    return route_async
+
+
+def _make_route(block_resources: bool, route_handler):
+    def route_sync(route):
+        if block_resources and should_block(route.request):
+            route.abort()
+        elif route_handler is not None:
+            route_handler.route(route)
+        else:
+            route.continue_()
+
+    return route_sync
+
+
+class AsyncBrowserPool:
+    """
+    A long-lived Firefox instance with one browser context whose pages are
+    reused between requests. Use `page()` to borrow a page.
+
+    The browser isn't closed at exit: unlike `BrowserPool` it can only be
+    closed on its event loop. Close it with `await pool.aclose()`, or use the
+    pool as an async context manager, and the shared pool of a loop with
+    `close_browser_pool_async()` before the loop ends.
+
+    Args:
+        max_pages (int): Maximum pages open at once, further callers wait for a free one.
+        recycle_after (int): Page uses after which the browser is relaunched once it is idle.
+        headless (bool): Run the browser headless.
+        extra_http_headers (dict): Headers sent with every request of the context.
+        block_resources (bool): Abort image, media, font and tracker requests, see `should_block`.
+        route_handler: Handles the requests that aren't blocked instead of the
+            network, e.g. a `RecordingTransport` or `ReplayTransport`. Needs
+            `route_async(route)` for this pool and `route(route)` for `BrowserPool`.
+    """
+
+    def __init__(
+        self,
+        max_pages: int = 4,
+        recycle_after: int = 100,
+        headless: bool = True,
+        extra_http_headers: dict = None,
+        block_resources: bool = True,
+        route_handler=None,
+    ):
+        self.max_pages = max_pages
+        self.recycle_after = recycle_after
+        self.headless = headless
+        self.extra_http_headers = extra_http_headers or {}
+        self.block_resources = block_resources
+        self.route_handler = route_handler
+        self._playwright = None
+        self._browser = None
+        self._context = None
+        self._idle_pages = []
+        self._pages_out = 0
+        self._uses = 0
+        self._semaphore = asyncio.Semaphore(max_pages)
+        self._lock = asyncio.Lock()
+
+    async def _get_context(self):
+        async with self._lock:
+            if self._browser is not None and not self._browser.is_connected():
+                await self._close_browser()
+            elif self._uses >= self.recycle_after and self._pages_out == 0:
+                await self._close_browser()
+
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            if self._browser is None:
+                self._browser = await self._playwright.firefox.launch(
+                    headless=self.headless, args=LAUNCH_ARGS
+                )
+                self._context = await self._browser.new_context(
+                    user_agent=USER_AGENT, extra_http_headers=self.extra_http_headers
+                )
+                if self.block_resources or self.route_handler is not None:
+                    await self._context.route(
+                        "**/*", _make_route_async(self.block_resources, self.route_handler)
+                    )
+                self._uses = 0
+            return self._context
+
+    async def _close_browser(self):
+        self._idle_pages = []
+        browser, self._browser, self._context = self._browser, None, None
+        if browser is not None:
+            try:
+                await browser.close()
+            except Exception as e:
+                print(f"Error closing browser: {e}")
+
+    @asynccontextmanager
+    async def page(self):
+        """
+        Async context manager that lends out a page of the pooled browser.
+        Pages are returned to the pool afterwards, unless the block raised, in
+        which case the page is closed so a half-loaded page is never reused.
+        """
+        async with self._semaphore:
+            context = await self._get_context()
+            # Counted before the next await, so no other caller recycles the
+            # browser while this one is still opening its page
+            self._pages_out += 1
+            self._uses += 1
+            page = None
+            healthy = False
+            try:
+                while self._idle_pages:
+                    candidate = self._idle_pages.pop()
+                    if not candidate.is_closed():
+                        page = candidate
+                        break
+                if page is None:
+                    page = await context.new_page()
+                yield page
+                healthy = True
+            finally:
+                self._pages_out -= 1
+                if page is not None:
+                    if healthy and not page.is_closed() and context is self._context:
+                        self._idle_pages.append(page)
+                    else:
+                        try:
+                            await page.close()
+                        except Exception:
+                            pass
+
+    async def aclose(self) -> None:
+        """
+        Closes the browser and stops Playwright. The pool starts a new browser if it is used again.
+        """
+        async with self._lock:
+            await self._close_browser()
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
+
+
+    async def __aenter__(self) -> "AsyncBrowserPool":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+
+class BrowserPool:
+    """
+    Synchronous counterpart of `AsyncBrowserPool`. The Playwright sync API is
+    bound to the thread that started it, so each thread gets its own pool from
+    `get_browser_pool()`.
+    """
+
+    def __init__(
+        self,
+        max_pages: int = 4,
+        recycle_after: int = 100,
+        headless: bool = True,
+        extra_http_headers: dict = None,
+        block_resources: bool = True,
+        route_handler=None,
+    ):
+        self.max_pages = max_pages
+        self.recycle_after = recycle_after
+        self.headless = headless
+        self.extra_http_headers = extra_http_headers or {}
+        self.block_resources = block_resources
+        self.route_handler = route_handler
+        self._playwright = None
+        self._browser = None
+        self._context = None
+        self._idle_pages = []
+        self._pages_out = 0
+        self._uses = 0
+
+    def _get_context(self):
+        if self._browser is not None and not self._browser.is_connected():
+            self._close_browser()
+        elif self._uses >= self.recycle_after and self._pages_out == 0:
+            self._close_browser()
+
+        if self._playwright is None:
+            self._playwright = sync_playwright().start()
+        if self._browser is None:
+            self._browser = self._playwright.firefox.launch(
+                headless=self.headless, args=LAUNCH_ARGS
+            )
+            self._context = self._browser.new_context(
+                user_agent=USER_AGENT, extra_http_headers=self.extra_http_headers
+            )
+            if self.block_resources or self.route_handler is not None:
+                self._context.route("**/*", _make_route(self.block_resources, self.route_handler))
+            self._uses = 0
+        return self._context
+
+    def _close_browser(self):
+        self._idle_pages = []
+        browser, self._browser, self._context = self._browser, None, None
+        if browser is not None:
+            try:
+                browser.close()
+            except Exception as e:
+                print(f"Error closing browser: {e}")
+
+    @contextmanager
+    def page(self):
+        """
+        Context manager that lends out a page of the pooled browser.
+        """
+        if self._pages_out >= self.max_pages:
+            raise RuntimeError(f"All {self.max_pages} pages of the browser pool are in use")
+        context = self._get_context()
+        page = None
+        while self._idle_pages:
+            candidate = self._idle_pages.pop()
+            if not candidate.is_closed():
+                page = candidate
+                break
+        if page is None:
+            page = context.new_page()
+
+        self._pages_out += 1
+        self._uses += 1
+        healthy = False
+        try:
+            yield page
+            healthy = True
+        finally:
+            self._pages_out -= 1
+            if healthy and not page.is_closed() and context is self._context:
+                self._idle_pages.append(page)
+            else:
+                try:
+                    page.close()
+                except Exception:
+                    pass
+
+    def close(self) -> None:
+        self._close_browser()
+        if self._playwright is not None:
+            self._playwright.stop()
+            self._playwright = None
+
+
+_options = dict(DEFAULT_OPTIONS)
+_async_pools = weakref.WeakKeyDictionary()
+_local = threading.local()
+
+
+def configure_browser_pool(**options) -> None:
+    """
+    Sets the options used for browser pools created from now on. Call
+    `close_browser_pool`/`close_browser_pool_async` first to apply them to a running pool.
+    """
+    unknown = set(options) - set(DEFAULT_OPTIONS)
+    if unknown:
+        raise ValueError(f"Unknown browser pool options: {sorted(unknown)}")
+    _options.update(options)
+
+
+def get_async_browser_pool() -> AsyncBrowserPool:
+    """
+    Returns the browser pool of the running event loop, creating it if needed.
+    """
+    loop = asyncio.get_running_loop()
+    pool = _async_pools.get(loop)
+    if pool is None:
+        pool = AsyncBrowserPool(**_options)
+        _async_pools[loop] = pool
+    return pool
+
+
+def get_browser_pool() -> BrowserPool:
+    """
+    Returns the browser pool of the current thread, creating it if needed.
+    """
+    pool = getattr(_local, "pool", None)
+    if pool is None:
+        pool = BrowserPool(**_options)
+        _local.pool = pool
+    return pool
+
+
+async def close_browser_pool_async() -> None:
+    """
+    Closes the browser pool of the running event loop. Call it before the
+    loop ends, async pools aren't closed at exit.
+    """
+    pool = _async_pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        await pool.aclose()
+
+
+def close_browser_pool() -> None:
+    """
+    Closes the browser pool of the current thread.
+    """
+    pool = getattr(_local, "pool", None)
+    if pool is not None:
+        _local.pool = None
+        pool.close()
+
+
+# Only the current thread's sync pool, async pools need their event loop to close
+atexit.register(close_browser_pool)
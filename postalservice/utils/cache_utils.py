@@ -0,0 +1,194 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def _copy_details(details: dict) -> dict:
+    # Details hold strings and lists of image URLs, copying the lists is enough
+    return {key: list(value) if isinstance(value, list) else value for key, value in details.items()}
+
+
+class MemoryDetailCache:
+    """
+    In-memory LRU cache of item details keyed by (service, item id). Details
+    are copied in and out, so callers changing their items don't change the cache.
+
+    Args:
+        ttl (float): Seconds an entry stays valid, None to never expire.
+        max_entries (int): Entries kept before the least recently used are evicted.
+    """
+
+    def __init__(self, ttl: float = 3600, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, service: str, item_id: str):
+        """
+        Returns the cached details, or None if missing or expired.
+        """
+        key = (service, item_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, details = entry
+            if self.ttl is not None and time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return _copy_details(details)
+
+    def set(self, service: str, item_id: str, details: dict) -> None:
+        key = (service, item_id)
+        with self._lock:
+            self._entries[key] = (time.time(), _copy_details(details))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteDetailCache:
+    """
+    Item detail cache stored in an SQLite database, so it survives restarts
+    and can be shared by processes on the same machine.
+
+    Args:
+        path (str): Path of the database file.
+        ttl (float): Seconds an entry stays valid, None to never expire.
+        max_entries (int): Entries kept before the least recently used are evicted.
+    """
+
+    def __init__(self, path: str, ttl: float = 86400, max_entries: int = 100000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS details (
+                    service TEXT NOT NULL,
+                    item_id TEXT NOT NULL,
+                    details TEXT NOT NULL,
+                    stored_at REAL NOT NULL,
+                    used_at REAL NOT NULL,
+                    PRIMARY KEY (service, item_id)
+                )
+                """
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS details_used_at ON details (used_at)"
+            )
+
+    def get(self, service: str, item_id: str):
+        """
+        Returns the cached details, or None if missing or expired.
+        """
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT details, stored_at FROM details WHERE service = ? AND item_id = ?",
+                (service, item_id),
+            ).fetchone()
+            if row is None:
+                return None
+            details, stored_at = row
+            if self.ttl is not None and now - stored_at > self.ttl:
+                self._connection.execute(
+                    "DELETE FROM details WHERE service = ? AND item_id = ?",
+                    (service, item_id),
+                )
+                return None
+            self._connection.execute(
+                "UPDATE details SET used_at = ? WHERE service = ? AND item_id = ?",
+                (now, service, item_id),
+            )
+        return json.loads(details)
+
+    def set(self, service: str, item_id: str, details: dict) -> None:
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO details VALUES (?, ?, ?, ?, ?)",
+                (service, item_id, json.dumps(details), now, now),
+            )
+            count = self._connection.execute("SELECT COUNT(*) FROM details").fetchone()[0]
+            if count > self.max_entries:
+                self._connection.execute(
+                    "DELETE FROM details WHERE rowid IN "
+                    "(SELECT rowid FROM details ORDER BY used_at LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+    def clear(self) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM details")
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM details").fetchone()[0]
+
+
+# Disabled until configured
+_detail_cache = None
+
+
+def get_detail_cache():
+    return _detail_cache
+
+
+def configure_detail_cache(cache) -> None:
+    """
+    Sets the detail cache used by the services, e.g. `MemoryDetailCache()` or
+    `SQLiteDetailCache("details.db")`. Pass None to disable caching.
+    Any object with `get(service, item_id)` and `set(service, item_id, details)` works.
+    """
+    global _detail_cache
+    _detail_cache = cache
+
+
+def apply_cached_details(service, items: list) -> list:
+    """
+    Merges cached details into the items in place.
+
+    Args:
+        service: The service class the items come from.
+        items (list): The items from the search page.
+
+    Returns:
+        list: Indices of the items that had no cached details and still need their page fetched.
+    """
+    cache = _detail_cache
+    if cache is None:
+        return list(range(len(items)))
+
+    missing = []
+    for i, item in enumerate(items):
+        details = cache.get(service.__name__, item["id"])
+        if details is None:
+            missing.append(i)
+        else:
+            items[i] = {**item, **details}
+    return missing
+
+
+def store_details(service, item_id: str, details: dict) -> None:
+    cache = _detail_cache
+    if cache is not None:
+        cache.set(service.__name__, item_id, details)
@@ -0,0 +1,318 @@
+import asyncio
+import threading
+import time
+import weakref
+from collections import OrderedDict
+import httpx
+from .metrics_utils import get_registry, instrumentation_enabled
+from .parse_utils import ResponseText
+
+
+def _normalize_value(value):
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize_value(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(_normalize_value(v) for v in value))
+    if isinstance(value, dict):
+        return normalize_params(value)
+    return value
+
+
+def normalize_params(params: dict) -> tuple:
+    """
+    Returns a hashable key for search params. Params that differ only in key
+    order, in surrounding or repeated whitespace, or in keys set to None make
+    the same key.
+    """
+    return tuple(
+        sorted((key, _normalize_value(value)) for key, value in params.items() if value is not None)
+    )
+
+
+def is_success(result) -> bool:
+    """
+    Returns False for a response with a status other than 2xx, True for
+    anything else.
+    """
+    status = getattr(result, "status_code", None)
+    return status is None or 200 <= status < 300
+
+
+class _Flight:
+    """
+    An in-flight async call and the number of callers waiting for it.
+    """
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class _Call:
+    """
+    An in-flight sync call, the other threads wait for `done`.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time: callers asking for a key that is
+    already being fetched wait for that call and share its result instead of
+    sending the same request again. Successful results are kept for `ttl`
+    seconds and returned to later callers. Errors, and results that aren't
+    `cacheable` like a 404 or 5xx response, are only shared with the callers
+    already waiting, so a failed fetch is tried again by the next caller. Expired
+    results are dropped whenever a result is stored, and past the bounds the
+    oldest results are evicted.
+
+    Async calls run in their own task, so a caller that is cancelled doesn't
+    cancel the call for the others. The call is only cancelled once every
+    caller waiting for it has been.
+
+    Args:
+        ttl (float): Seconds a result is reused, 0 to only share in-flight calls.
+        max_entries (int): Search results kept.
+        max_pages (int): Item pages kept, i.e. results of the "page" kind, which are much larger.
+    """
+
+    def __init__(self, ttl: float = 5.0, max_entries: int = 1000, max_pages: int = 100):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_pages = max_pages
+        # Per kind of request, oldest first
+        self._results = {}
+        # Tasks are bound to the loop they run on
+        self._flights = weakref.WeakKeyDictionary()
+        self._calls = {}
+        self._counts = {"calls": 0, "shared": 0, "cached": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, outcome: str, key: tuple) -> None:
+        self._counts[outcome] += 1
+        if instrumentation_enabled():
+            get_registry().inc("coalesced_requests", kind=key[0], outcome=outcome)
+
+    def _lookup(self, key: tuple) -> tuple:
+        # Called with the lock held
+        results = self._results.get(key[0])
+        entry = results.get(key) if results is not None else None
+        if entry is None:
+            return False, None
+        stored_at, result = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del results[key]
+            return False, None
+        self._count("cached", key)
+        return True, result
+
+    def _store(self, key: tuple, result) -> None:
+        if self.ttl <= 0:
+            return
+        now = time.monotonic()
+        bound = self.max_pages if key[0] == "page" else self.max_entries
+        with self._lock:
+            results = self._results.setdefault(key[0], OrderedDict())
+            results.pop(key, None)
+            results[key] = (now, result)
+            while len(results) > bound:
+                results.popitem(last=False)
+            # Stored in time order, so the expired results are at the front
+            for results in self._results.values():
+                while results and now - next(iter(results.values()))[0] > self.ttl:
+                    results.popitem(last=False)
+
+    def _land(self, flights: dict, key: tuple, flight: _Flight, cacheable) -> None:
+        if flights.get(key) is flight:
+            del flights[key]
+        if not flight.task.cancelled() and flight.task.exception() is None:
+            result = flight.task.result()
+            if cacheable(result):
+                self._store(key, result)
+
+    async def run_async(self, key: tuple, func, cacheable=None):
+        """
+        Returns the result of `await func()`, shared with the concurrent
+        callers of the same key and reused within the TTL.
+
+        Args:
+            key (tuple): What is fetched, its first element names the kind of request.
+            func: Coroutine function making the call.
+            cacheable: Called with the result, returns whether it is kept for
+                later callers. Defaults to `is_success`.
+        """
+        cacheable = cacheable or is_success
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            hit, result = self._lookup(key)
+            if hit:
+                return result
+            flights = self._flights.setdefault(loop, {})
+            flight = flights.get(key)
+            if flight is None:
+                flight = flights[key] = _Flight(asyncio.ensure_future(func()))
+                flight.task.add_done_callback(
+                    lambda task: self._land(flights, key, flight, cacheable)
+                )
+                self._count("calls", key)
+            else:
+                self._count("shared", key)
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Every caller gave up, e.g. search_all cancelling pages it fetched ahead
+                flight.task.cancel()
+
+    def run(self, key: tuple, func, cacheable=None):
+        """
+        Sync version of `run_async` for callers on several threads, `func` is
+        a regular function.
+        """
+        cacheable = cacheable or is_success
+        with self._lock:
+            hit, result = self._lookup(key)
+            if hit:
+                return result
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._count("calls", key)
+            else:
+                self._count("shared", key)
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        else:
+            if cacheable(call.result):
+                self._store(key, call.result)
+            return call.result
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def metrics(self) -> dict:
+        """
+        Returns how many calls were made ('calls'), joined a call in flight
+        ('shared') and were answered from the TTL cache ('cached').
+        """
+        return dict(self._counts)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._results.clear()
+
+    def __contains__(self, key: tuple) -> bool:
+        with self._lock:
+            entry = self._results.get(key[0], {}).get(key)
+        return entry is not None and time.monotonic() - entry[0] <= self.ttl
+
+    def __len__(self) -> int:
+        return sum(len(results) for results in list(self._results.values()))
+
+
+# Disabled until configured
+_single_flight = None
+
+
+def get_single_flight() -> SingleFlight:
+    return _single_flight
+
+
+def configure_coalescing(enabled: bool = True, **options) -> SingleFlight:
+    """
+    Turns coalescing of identical searches and item page fetches on or off. Off by default.
+
+    Args:
+        enabled (bool): Share calls through a new `SingleFlight`, or stop sharing.
+        **options: `SingleFlight` options, ttl, max_entries and max_pages.
+
+    Returns:
+        SingleFlight: The new shared instance, None if disabled.
+    """
+    global _single_flight
+    _single_flight = SingleFlight(**options) if enabled else None
+    return _single_flight
+
+
+async def coalesce_async(key: tuple, func, copy=None, cacheable=None):
+    """
+    Awaits `func()` through the shared `SingleFlight`, or directly if
+    coalescing is off.
+
+    Args:
+        key (tuple): What is fetched, see `SingleFlight.run_async`.
+        func: Coroutine function making the call.
+        copy: Applied to a shared result before it is returned, for results
+            the caller may modify, e.g. `copy.deepcopy`.
+        cacheable: Whether a result is kept, see `SingleFlight.run_async`.
+    """
+    flight = _single_flight
+    if flight is None:
+        return await func()
+    result = await flight.run_async(key, func, cacheable)
+    return copy(result) if copy is not None else result
+
+
+def _text_only(result):
+    # A response holds its connection state and headers, only the text and
+    # status are shared
+    if isinstance(result, httpx.Response):
+        return ResponseText(result.text, result.status_code)
+    return result
+
+
+async def coalesce_page_async(url: str, func):
+    """
+    Fetches an item page with `await func()` through the shared `SingleFlight`,
+    keyed by URL. An `httpx.Response` is shared and kept as a `ResponseText`
+    carrying only its text and status. Only 2xx pages are kept.
+    """
+    flight = _single_flight
+    if flight is None:
+        return await func()
+
+    async def fetch_text():
+        return _text_only(await func())
+
+    return await flight.run_async(("page", url), fetch_text)
+
+
+def coalesce_page(url: str, func):
+    """
+    Sync version of `coalesce_page_async`.
+    """
+    flight = _single_flight
+    if flight is None:
+        return func()
+    return flight.run(("page", url), lambda: _text_only(func()))
+
+
+def coalesce(key: tuple, func, copy=None, cacheable=None):
+    """
+    Sync version of `coalesce_async`.
+    """
+    flight = _single_flight
+    if flight is None:
+        return func()
+    result = flight.run(key, func, cacheable)
+    return copy(result) if copy is not None else result
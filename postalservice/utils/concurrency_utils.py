@@ -0,0 +1,192 @@
+import asyncio
+import time
+import weakref
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+from .coalesce_utils import coalesce_page, coalesce_page_async
+
+
+class ConcurrencyLimiter:
+    """
+    Caps how many requests run at once, both overall and per host, and keeps
+    queueing metrics per host.
+
+    A request first waits for a slot on its host and only then for a global
+    slot, so a burst against one marketplace can't starve the others.
+
+    Args:
+        max_concurrency (int): Maximum requests in flight across all hosts.
+        max_per_host (int): Default maximum requests in flight to a single host.
+    """
+
+    def __init__(self, max_concurrency: int = 32, max_per_host: int = 8):
+        self.max_concurrency = max_concurrency
+        self.max_per_host = max_per_host
+        self.host_limits = {}
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._stats = {}
+
+    def set_host_limit(self, host: str, limit: int) -> None:
+        """
+        Overrides the per-host limit for one host. Applies to event loops that
+        haven't sent a request to the host yet.
+        """
+        self.host_limits[host] = limit
+
+    def _get_semaphores(self, host: str):
+        # Semaphores are bound to the loop they are first used on
+        loop = asyncio.get_running_loop()
+        semaphores = self._semaphores.get(loop)
+        if semaphores is None:
+            semaphores = {None: asyncio.Semaphore(self.max_concurrency)}
+            self._semaphores[loop] = semaphores
+        if host not in semaphores:
+            limit = self.host_limits.get(host, self.max_per_host)
+            semaphores[host] = asyncio.Semaphore(limit)
+        return semaphores[None], semaphores[host]
+
+    def _get_stats(self, host: str) -> dict:
+        stats = self._stats.get(host)
+        if stats is None:
+            stats = {
+                "waiting": 0,
+                "active": 0,
+                "completed": 0,
+                "max_waiting": 0,
+                "total_wait": 0.0,
+                "max_wait": 0.0,
+            }
+            self._stats[host] = stats
+        return stats
+
+    @asynccontextmanager
+    async def limit(self, url: str):
+        """
+        Async context manager that holds a global and a per-host slot for the given URL.
+        """
+        host = urlsplit(url).netloc
+        global_semaphore, host_semaphore = self._get_semaphores(host)
+        stats = self._get_stats(host)
+
+        stats["waiting"] += 1
+        stats["max_waiting"] = max(stats["max_waiting"], stats["waiting"])
+        start = time.perf_counter()
+        acquired = False
+        try:
+            async with host_semaphore:
+                async with global_semaphore:
+                    waited = time.perf_counter() - start
+                    stats["waiting"] -= 1
+                    stats["total_wait"] += waited
+                    stats["max_wait"] = max(stats["max_wait"], waited)
+                    stats["active"] += 1
+                    acquired = True
+                    try:
+                        yield
+                    finally:
+                        stats["active"] -= 1
+                        stats["completed"] += 1
+        finally:
+            if not acquired:
+                stats["waiting"] -= 1
+
+    def metrics(self) -> dict:
+        """
+        Returns queueing metrics per host.
+
+        Each entry has the keys 'waiting', 'active', 'completed', 'max_waiting',
+        'total_wait', 'max_wait' and 'avg_wait' (wait times in seconds).
+        """
+        metrics = {}
+        for host, stats in self._stats.items():
+            completed = stats["completed"]
+            metrics[host] = {
+                **stats,
+                "avg_wait": stats["total_wait"] / completed if completed else 0.0,
+            }
+        return metrics
+
+    def reset_metrics(self) -> None:
+        self._stats = {}
+
+
+_limiter = ConcurrencyLimiter()
+
+
+def get_limiter() -> ConcurrencyLimiter:
+    return _limiter
+
+
+def configure_limiter(**options) -> ConcurrencyLimiter:
+    """
+    Replaces the shared limiter with one built from the given `ConcurrencyLimiter` options.
+    """
+    global _limiter
+    _limiter = ConcurrencyLimiter(**options)
+    return _limiter
+
+
+async def gather_limited(
+    urls: list,
+    fetch_func,
+    limiter: ConcurrencyLimiter = None,
+    return_exceptions: bool = False,
+) -> list:
+    """
+    Runs `fetch_func(url)` for every URL under the concurrency limiter and
+    returns the results in the same order as the URLs. If coalescing is on,
+    a URL that is already being fetched elsewhere shares that fetch.
+
+    Args:
+        urls (list): The URLs to fetch.
+        fetch_func: Coroutine function taking a URL.
+        limiter (ConcurrencyLimiter): Limiter to use, defaults to the shared one.
+        return_exceptions (bool): Return exceptions in place of results instead of raising the first one.
+
+    Returns:
+        list: The results of `fetch_func`.
+    """
+    limiter = limiter or _limiter
+
+    async def run(url):
+        async def limited():
+            async with limiter.limit(url):
+                return await fetch_func(url)
+
+        # Callers sharing a fetch don't take a slot of their own
+        return await coalesce_page_async(url, limited)
+
+    return await asyncio.gather(
+        *(run(url) for url in urls), return_exceptions=return_exceptions
+    )
+
+
+def fetch_each(urls: list, fetch_func) -> list:
+    """
+    Synchronous counterpart of `gather_limited(..., return_exceptions=True)`:
+    fetches the URLs one by one and returns exceptions in place of results.
+    """
+    results = []
+    for url in urls:
+        try:
+            results.append(coalesce_page(url, lambda: fetch_func(url)))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def drop_failed(indices: list, urls: list, results: list) -> tuple:
+    """
+    Prints the failed fetches among results returned with exceptions in place,
+    and returns the (indices, results) of the successful ones, so one broken
+    item page doesn't fail the whole search. Its item keeps its placeholders.
+    """
+    kept_indices = []
+    kept_results = []
+    for index, url, result in zip(indices, urls, results):
+        if isinstance(result, Exception):
+            print(f"Error fetching item page {url}: {result}")
+            continue
+        kept_indices.append(index)
+        kept_results.append(result)
+    return kept_indices, kept_results
@@ -0,0 +1,139 @@
+from lxml import etree, html
+
+# Raised by a fast-path parser when a page doesn't look as expected. The
+# BeautifulSoup parser is used for the page instead.
+FAST_PATH_ERRORS = (
+    AttributeError,
+    IndexError,
+    KeyError,
+    TypeError,
+    ValueError,
+    etree.LxmlError,
+)
+
+ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+WHITESPACE_PRESERVING_TAGS = {"pre", "textarea"}
+TEXT_XPATH = etree.XPath(".//text()")
+
+_options = {"fast_path": True, "partial_pages": True}
+
+
+def configure_html_parser(fast_path: bool = True, partial_pages: bool = True) -> None:
+    """
+    Turns the lxml fast-path parsers and partial page downloads on or off.
+
+    Args:
+        fast_path (bool): Parse with lxml where a service supports it. When
+            off, every page is parsed with BeautifulSoup as before.
+        partial_pages (bool): Stop downloading item pages once everything the
+            service reads from them has arrived, see `IncrementalPage`.
+    """
+    _options["fast_path"] = fast_path
+    _options["partial_pages"] = partial_pages
+
+
+def html_parser_options() -> dict:
+    """
+    Returns the current `configure_html_parser` arguments, e.g. to apply them
+    in a worker process.
+    """
+    return dict(_options)
+
+
+def use_fast_path() -> bool:
+    return _options["fast_path"]
+
+
+def use_partial_pages() -> bool:
+    return _options["partial_pages"]
+
+
+def parse_document(text: str):
+    """
+    Parses an HTML page into an lxml element tree.
+    """
+    return html.document_fromstring(text)
+
+
+def has_class(name: str) -> str:
+    """
+    Returns an XPath predicate matching elements with the CSS class, like the `.name` selector.
+    """
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def _preserves_whitespace(element) -> bool:
+    while element is not None:
+        if element.tag in WHITESPACE_PRESERVING_TAGS:
+            return True
+        element = element.getparent()
+    return False
+
+
+def soup_text(element) -> str:
+    """
+    Returns the text of an element exactly as BeautifulSoup's `.text` would:
+    whitespace-only strings collapse to a newline (or a space if they contain
+    none), except inside <pre> and <textarea>, and script and style contents
+    are left out.
+    """
+    parts = []
+    for text in TEXT_XPATH(element):
+        container = text.getparent()
+        if text.is_tail:
+            container = container.getparent()
+        if container is not None and container.tag in ("script", "style"):
+            continue
+        if not text.strip(ASCII_SPACES) and not _preserves_whitespace(container):
+            text = "\n" if "\n" in text else " "
+        parts.append(text)
+    return "".join(parts)
+
+
+class IncrementalPage:
+    """
+    Builds the element tree of an HTML page while it downloads, so the
+    download can stop once the needed part of the page has arrived.
+
+    Args:
+        is_complete: Called with the page after each chunk, returns True once
+            the parsed part contains everything needed. It can use `root`
+            and `is_closed`.
+        tags (tuple): Tags whose end `is_closed` can report. Only these are
+            tracked, which keeps feeding cheap.
+    """
+
+    def __init__(self, is_complete, tags: tuple = ()):
+        self.is_complete = is_complete
+        self.root = None
+        # The start of <html> provides the root before any tracked tag closes
+        self._parser = etree.HTMLPullParser(events=("start", "end"), tag=("html",) + tuple(tags))
+        self._closed = set()
+        self._chunks = []
+
+    def feed(self, chunk: str) -> bool:
+        """
+        Adds a chunk of the page and returns True once the page is complete.
+        """
+        self._chunks.append(chunk)
+        self._parser.feed(chunk)
+        for event, element in self._parser.read_events():
+            if event == "end":
+                self._closed.add(element)
+            elif self.root is None:
+                self.root = element.getroottree().getroot()
+        return self.root is not None and self.is_complete(self)
+
+    def is_closed(self, element) -> bool:
+        """
+        Returns True if the end of the element has been parsed, so that its
+        content won't change with later chunks. Only for elements of the tracked tags.
+        """
+        return element in self._closed
+
+    @property
+    def text(self) -> str:
+        """
+        The part of the page fed so far.
+        """
+        return "".join(self._chunks)
@@ -0,0 +1,260 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import nullcontext
+from urllib.parse import urlsplit
+
+# Upper bounds in seconds of the histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """
+    Count, sum, min, max and bucket counts of observed values.
+    """
+
+    __slots__ = ("buckets", "bucket_counts", "count", "sum", "min", "max")
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # The last bucket counts values above every bound
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float) -> None:
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "buckets": dict(zip(self.buckets + (float("inf"),), self.bucket_counts)),
+        }
+
+
+class MetricsRegistry:
+    """
+    In-process counters and histograms, each identified by a name and labels,
+    e.g. `registry.observe("stage_seconds", 0.12, service="FrilService", stage="fetch")`.
+    """
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def counter(self, name: str, **labels) -> float:
+        return self._counters.get(self._key(name, labels), 0)
+
+    def histogram(self, name: str, **labels) -> dict:
+        histogram = self._histograms.get(self._key(name, labels))
+        return histogram.to_dict() if histogram is not None else None
+
+    def snapshot(self) -> dict:
+        """
+        Returns all metrics as {'counters': [...], 'histograms': [...]}, each
+        entry a dict with 'name', 'labels' and the values.
+        """
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in self._counters.items()
+            ]
+            histograms = [
+                {"name": name, "labels": dict(labels), **histogram.to_dict()}
+                for (name, labels), histogram in self._histograms.items()
+            ]
+        return {"counters": counters, "histograms": histograms}
+
+    def slowest_stages(self) -> list:
+        """
+        Returns the (service, stage, total seconds, calls) of every stage, slowest first.
+
+        The seconds are self time, without the time of stages nested in the
+        stage, e.g. "details" inside "parse", so no time is counted twice.
+        """
+        stages = [
+            (entry["labels"]["service"], entry["labels"]["stage"], entry["sum"], entry["count"])
+            for entry in self.snapshot()["histograms"]
+            if entry["name"] == "stage_self_seconds"
+        ]
+        return sorted(stages, key=lambda stage: stage[2], reverse=True)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+_enabled = False
+_registry = MetricsRegistry()
+_hooks = []
+_NOOP_SPAN = nullcontext()
+# The innermost open span of the current thread or task
+_current_span = contextvars.ContextVar("postalservice_span", default=None)
+
+
+def configure_instrumentation(enabled: bool = True, registry: MetricsRegistry = None) -> MetricsRegistry:
+    """
+    Turns stage timing on or off. While off, spans cost a single flag check.
+
+    Args:
+        enabled (bool): Record spans into the registry and call the hooks.
+        registry (MetricsRegistry): Registry to record into, defaults to the shared one.
+
+    Returns:
+        MetricsRegistry: The registry in use.
+    """
+    global _enabled, _registry
+    _enabled = enabled
+    if registry is not None:
+        _registry = registry
+    return _registry
+
+
+def instrumentation_enabled() -> bool:
+    return _enabled
+
+
+def get_registry() -> MetricsRegistry:
+    return _registry
+
+
+def add_hook(hook) -> None:
+    """
+    Registers a function called with an event dict after every span while
+    instrumentation is enabled. Events have the keys 'service', 'stage',
+    'start' (perf_counter value), 'elapsed' (seconds) and 'error' (the
+    exception or None). Use it to forward spans to e.g. OpenTelemetry or logs.
+    """
+    _hooks.append(hook)
+
+
+def remove_hook(hook) -> None:
+    _hooks.remove(hook)
+
+
+class Span:
+    """
+    Times one stage of a search, see `span`.
+    """
+
+    __slots__ = ("service", "stage", "start", "child_seconds", "parent", "token")
+
+    def __init__(self, service: str, stage: str):
+        self.service = service
+        self.stage = stage
+        self.start = None
+        self.child_seconds = 0.0
+        self.parent = None
+        self.token = None
+
+    def __enter__(self):
+        self.parent = _current_span.get()
+        self.token = _current_span.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        elapsed = time.perf_counter() - self.start
+        _current_span.reset(self.token)
+        if self.parent is not None:
+            self.parent.child_seconds += elapsed
+        # Children running concurrently can add up to more than the span itself
+        self_elapsed = max(elapsed - self.child_seconds, 0.0)
+        _registry.observe("stage_seconds", elapsed, service=self.service, stage=self.stage)
+        _registry.observe("stage_self_seconds", self_elapsed, service=self.service, stage=self.stage)
+        if exc is not None:
+            _registry.inc("stage_errors", service=self.service, stage=self.stage)
+        if _hooks:
+            event = {
+                "service": self.service,
+                "stage": self.stage,
+                "start": self.start,
+                "elapsed": elapsed,
+                "error": exc,
+            }
+            for hook in list(_hooks):
+                try:
+                    hook(event)
+                except Exception as e:
+                    print(f"Error in instrumentation hook: {e}")
+        return False
+
+
+def span(service, stage: str):
+    """
+    Returns a context manager timing a stage of a service, recorded as the
+    'stage_seconds' histogram. Its time without the spans opened inside it
+    goes to 'stage_self_seconds'. A no-op unless instrumentation is enabled.
+
+    Args:
+        service: The service class or a name.
+        stage (str): The stage, e.g. "fetch", "parse_base", "details".
+    """
+    if not _enabled:
+        return _NOOP_SPAN
+    return Span(getattr(service, "__name__", service), stage)
+
+
+class RequestTimer:
+    """
+    Times one HTTP request, see `time_request`.
+    """
+
+    __slots__ = ("host", "status", "start")
+
+    def __init__(self, url: str):
+        self.host = urlsplit(url).netloc
+        self.status = "error"
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        _registry.inc("http_requests", host=self.host, status=self.status)
+        _registry.observe("http_request_seconds", time.perf_counter() - self.start, host=self.host)
+        return False
+
+
+def time_request(url: str):
+    """
+    Returns a context manager recording an HTTP request as the 'http_requests'
+    counter (by host and status) and the 'http_request_seconds' histogram (by
+    host). Set `status` on it once the response arrives; requests that raise
+    are counted with status 'error'. Enters as None unless instrumentation is enabled.
+    """
+    if not _enabled:
+        return _NOOP_SPAN
+    return RequestTimer(url)
@@ -1,46 +1,378 @@
+import asyncio
 import base64
+import json
+import os
+import threading
 import uuid
 import time
-from cryptography.hazmat.primitives.asymmetric import ec
-from cryptography.hazmat.primitives import serialization
+import weakref
+from importlib.util import find_spec
+from urllib.parse import urlsplit
 import httpx
-from jose import jwt
-
-def get_pop_jwt(url, method="GET"):
-    private_key = ec.generate_private_key(ec.SECP256R1())
-    public_key = private_key.public_key()
-
-    header = {
-        "typ": "dpop+jwt",
-        "alg": "ES256",
-        "jwk": {
-            "crv": "P-256",
-            "kty": "EC",
-            "x": base64.urlsafe_b64encode(public_key.public_numbers().x.to_bytes(32, 'big')).rstrip(b'=').decode('utf-8'),
-            "y": base64.urlsafe_b64encode(public_key.public_numbers().y.to_bytes(32, 'big')).rstrip(b'=').decode('utf-8'),
-        },
-    }
-
-    payload = {
-        "iat": int(time.time()),
-        "jti": str(uuid.uuid4()), 
-        "htu": url,
-        "htm": method,
-        "uuid": str(uuid.uuid4()),
-    }
-
-    private_key_pem = private_key.private_bytes(
-        encoding=serialization.Encoding.PEM,
-        format=serialization.PrivateFormat.PKCS8,
-        encryption_algorithm=serialization.NoEncryption()
-    )
-
-    pop_jwt = jwt.encode(payload, private_key_pem,
-                         algorithm='ES256', headers=header)
-    
-    return pop_jwt
-
-async def fetch_async(url):
-    async with httpx.AsyncClient(timeout=15) as client:
-        response = await client.get(url)
+from .metrics_utils import time_request
+from .retry_utils import send_with_retries, send_with_retries_async
+from .ratelimit_utils import get_rate_limiter
+
+DEFAULT_TIMEOUT = 15
+# HTTP/2 is negotiated through ALPN, so hosts that don't speak it fall back to
+# HTTP/1.1. It needs the optional `h2` package (`pip install postalservice[http2]`).
+HTTP2_AVAILABLE = find_spec("h2") is not None
+
+
+class ClientPool:
+    """
+    Keeps one keep-alive httpx client per host, so repeated requests to the
+    same marketplace reuse their TCP and TLS connections.
+
+    Async clients are also keyed by event loop because an `httpx.AsyncClient`
+    can't be shared between loops (e.g. across several `asyncio.run` calls).
+    They can only be closed on their loop, so async clients replaced by
+    `configure_host` are kept until `aclose()` is awaited on that loop.
+
+    Args:
+        timeout (float): Timeout in seconds for every request.
+        http2 (bool): Use HTTP/2 where the server supports it. Ignored if `h2` is not installed.
+        max_connections_per_host (int): Maximum open connections to a single host.
+        max_keepalive_per_host (int): Maximum idle connections kept open per host.
+        keepalive_expiry (float): Seconds an idle connection is kept open.
+        transport: An httpx transport used instead of the network, e.g. a
+            `RecordingTransport`, `ReplayTransport` or `httpx.MockTransport`.
+            It must support both sync and async requests. The connection
+            options above don't apply to it.
+    """
+
+    def __init__(
+        self,
+        timeout: float = DEFAULT_TIMEOUT,
+        http2: bool = True,
+        max_connections_per_host: int = 10,
+        max_keepalive_per_host: int = 10,
+        keepalive_expiry: float = 30.0,
+        transport=None,
+    ):
+        self.options = {
+            "timeout": timeout,
+            "http2": http2,
+            "max_connections_per_host": max_connections_per_host,
+            "max_keepalive_per_host": max_keepalive_per_host,
+            "keepalive_expiry": keepalive_expiry,
+            "transport": transport,
+        }
+        self.host_options = {}
+        self._clients = {}
+        self._async_clients = weakref.WeakKeyDictionary()
+        # Replaced async clients per loop, closed by `aclose`
+        self._retired = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def configure_host(self, host: str, **options) -> None:
+        """
+        Overrides the pool options for a single host, e.g.
+        `pool.configure_host("api.mercari.jp", max_connections_per_host=4)`.
+        Existing clients for the host are replaced so the change applies to the
+        next request. Replaced async clients are closed by `aclose()`.
+        """
+        unknown = set(options) - set(self.options)
+        if unknown:
+            raise ValueError(f"Unknown client options: {sorted(unknown)}")
+        with self._lock:
+            self.host_options.setdefault(host, {}).update(options)
+            client = self._clients.pop(host, None)
+            for loop, clients in self._async_clients.items():
+                async_client = clients.pop(host, None)
+                if async_client is not None:
+                    self._retired.setdefault(loop, []).append(async_client)
+        if client is not None:
+            client.close()
+
+    def _client_kwargs(self, host: str) -> dict:
+        options = {**self.options, **self.host_options.get(host, {})}
+        kwargs = {
+            "timeout": options["timeout"],
+            "http2": options["http2"] and HTTP2_AVAILABLE,
+            "limits": httpx.Limits(
+                max_connections=options["max_connections_per_host"],
+                max_keepalive_connections=options["max_keepalive_per_host"],
+                keepalive_expiry=options["keepalive_expiry"],
+            ),
+        }
+        if options["transport"] is not None:
+            kwargs["transport"] = options["transport"]
+        return kwargs
+
+    def get_client(self, url: str) -> httpx.Client:
+        """
+        Returns the shared sync client for the host of the given URL.
+        """
+        host = urlsplit(url).netloc
+        client = self._clients.get(host)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(host)
+                if client is None:
+                    client = httpx.Client(**self._client_kwargs(host))
+                    self._clients[host] = client
+        return client
+
+    def get_async_client(self, url: str) -> httpx.AsyncClient:
+        """
+        Returns the shared async client for the host of the given URL on the running event loop.
+        """
+        host = urlsplit(url).netloc
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._async_clients.setdefault(loop, {})
+            client = clients.get(host)
+            if client is None:
+                client = httpx.AsyncClient(**self._client_kwargs(host))
+                clients[host] = client
+        return client
+
+    def close(self) -> None:
+        """
+        Closes all sync clients in the pool.
+        """
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+    def retire(self, other: "ClientPool") -> None:
+        """
+        Takes over the async clients of a pool that is being replaced, so this
+        pool's `aclose()` closes them.
+        """
+        with other._lock:
+            loops = set(other._async_clients) | set(other._retired)
+            retired = {
+                loop: list(other._async_clients.pop(loop, {}).values()) + other._retired.pop(loop, [])
+                for loop in loops
+            }
+        with self._lock:
+            for loop, clients in retired.items():
+                self._retired.setdefault(loop, []).extend(clients)
+
+    async def aclose(self) -> None:
+        """
+        Closes the async clients that belong to the running event loop,
+        including those replaced since by `configure_host` or `configure_pool`.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = list(self._async_clients.pop(loop, {}).values()) + self._retired.pop(loop, [])
+        for client in clients:
+            await client.aclose()
+
+
+_pool = ClientPool()
+
+
+def get_pool() -> ClientPool:
+    return _pool
+
+
+def configure_pool(**options) -> ClientPool:
+    """
+    Replaces the shared client pool with one built from the given `ClientPool` options.
+    Sync clients of the previous pool are closed. Its async clients can only
+    be closed on their event loop, so they are handed to the new pool and
+    closed by `aclose_pool()`.
+    """
+    global _pool
+    previous = _pool
+    _pool = ClientPool(**options)
+    _pool.retire(previous)
+    previous.close()
+    return _pool
+
+
+async def aclose_pool() -> None:
+    """
+    Closes the shared pool's async clients of the running event loop, and
+    those of the pools it replaced. Call it before the loop ends.
+    """
+    await _pool.aclose()
+
+
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("utf-8")
+
+
+class DPoPSigner:
+    """
+    Signs DPoP proof JWTs with an ES256 key that is generated once and reused.
+
+    The key and the encoded JWT header (which carries the public key) are made
+    on first use, so each proof only costs encoding the small payload and one
+    ECDSA signature. A new key is generated if the process has been forked.
+    """
+
+    def __init__(self):
+        # (private key, encoded header), swapped as one so a rotation can't mix them
+        self._key = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def rotate(self) -> None:
+        """
+        Generates a new key pair and header.
+        """
+        # cryptography is only needed by Mercari, so it is imported on first use
+        from cryptography.hazmat.primitives.asymmetric import ec
+
+        private_key = ec.generate_private_key(ec.SECP256R1())
+        public_numbers = private_key.public_key().public_numbers()
+        header = {
+            "typ": "dpop+jwt",
+            "alg": "ES256",
+            "jwk": {
+                "crv": "P-256",
+                "kty": "EC",
+                "x": _b64url(public_numbers.x.to_bytes(32, "big")),
+                "y": _b64url(public_numbers.y.to_bytes(32, "big")),
+            },
+        }
+        encoded_header = _b64url(json.dumps(header, separators=(",", ":")).encode())
+        self._key = (private_key, encoded_header)
+        self._pid = os.getpid()
+
+    def sign(self, url: str, method: str = "GET") -> str:
+        """
+        Returns a DPoP proof JWT for a request to the given URL.
+        """
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import ec
+        from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature
+
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self.rotate()
+        private_key, encoded_header = self._key
+
+        payload = {
+            "iat": int(time.time()),
+            "jti": str(uuid.uuid4()),
+            "htu": url,
+            "htm": method,
+            "uuid": str(uuid.uuid4()),
+        }
+        signing_input = (
+            encoded_header
+            + "."
+            + _b64url(json.dumps(payload, separators=(",", ":")).encode())
+        )
+        der_signature = private_key.sign(
+            signing_input.encode("ascii"), ec.ECDSA(hashes.SHA256())
+        )
+        # JWS wants the raw 64 byte r || s form instead of DER
+        r, s = decode_dss_signature(der_signature)
+        signature = r.to_bytes(32, "big") + s.to_bytes(32, "big")
+        return signing_input + "." + _b64url(signature)
+
+
+_dpop_signer = DPoPSigner()
+
+
+def get_pop_jwt(url, method="GET", signer: DPoPSigner = None):
+    """
+    Returns a DPoP proof JWT for the request, signed by the given signer or
+    the process-wide one.
+    """
+    signer = signer or _dpop_signer
+    return signer.sign(url, method)
+
+
+def _attempt_kwargs(kwargs: dict, attempt_headers) -> dict:
+    if attempt_headers is None:
+        return kwargs
+    return {**kwargs, "headers": {**(kwargs.get("headers") or {}), **attempt_headers()}}
+
+
+def request(method, url, attempt_headers=None, **kwargs) -> httpx.Response:
+    """
+    Sends a request through the shared client pool. 429/5xx responses and
+    transport errors are retried with backoff and the host's circuit breaker
+    is consulted, see `retry_utils.RetryPolicy`. If rate limiting is on, every
+    attempt waits for its host's token bucket, see `ratelimit_utils.RateLimiter`.
+
+    `attempt_headers` is called before every attempt and returns headers
+    added to that attempt only, for headers a retry can't resend, like a
+    single-use DPoP proof.
+    """
+    client = _pool.get_client(url)
+
+    def send():
+        limiter = get_rate_limiter()
+        if limiter is not None:
+            limiter.acquire(url)
+        with time_request(url) as timer:
+            response = client.request(method, url, **_attempt_kwargs(kwargs, attempt_headers))
+            if timer is not None:
+                timer.status = response.status_code
+        if limiter is not None:
+            limiter.record_response(url, response)
         return response
+
+    return send_with_retries(url, send)
+
+async def request_async(method, url, attempt_headers=None, **kwargs) -> httpx.Response:
+    client = _pool.get_async_client(url)
+
+    async def send():
+        limiter = get_rate_limiter()
+        if limiter is not None:
+            await limiter.acquire_async(url)
+        with time_request(url) as timer:
+            response = await client.request(method, url, **_attempt_kwargs(kwargs, attempt_headers))
+            if timer is not None:
+                timer.status = response.status_code
+        if limiter is not None:
+            limiter.record_response(url, response)
+        return response
+
+    return await send_with_retries_async(url, send)
+
+def fetch(url, **kwargs) -> httpx.Response:
+    return request("GET", url, **kwargs)
+
+async def fetch_async(url, **kwargs) -> httpx.Response:
+    return await request_async("GET", url, **kwargs)
+
+async def fetch_until_async(url, consume, **kwargs) -> httpx.Response:
+    """
+    Streams a GET response, passing each decoded text chunk to `consume` until
+    it returns True. The rest of the body isn't downloaded, the connection is
+    closed instead. Retried like `request` until the response headers arrive;
+    once `consume` has been called the request isn't retried.
+
+    Args:
+        url (str): The URL to fetch.
+        consume: Called with each text chunk, returns True to stop.
+
+    Returns:
+        httpx.Response: The response. Its body has already been consumed.
+    """
+    client = _pool.get_async_client(url)
+
+    async def send():
+        limiter = get_rate_limiter()
+        if limiter is not None:
+            await limiter.acquire_async(url)
+        with time_request(url) as timer:
+            response = await client.send(client.build_request("GET", url, **kwargs), stream=True)
+            if timer is not None:
+                timer.status = response.status_code
+        if limiter is not None:
+            limiter.record_response(url, response)
+        return response
+
+    response = await send_with_retries_async(url, send)
+    try:
+        async for chunk in response.aiter_text():
+            if consume(chunk):
+                break
+    finally:
+        await response.aclose()
+    return response
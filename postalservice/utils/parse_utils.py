@@ -0,0 +1,173 @@
+import asyncio
+import atexit
+import functools
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+DEFAULT_OPTIONS = {
+    "executor": None,
+    "max_workers": None,
+    "batch_size": 8,
+}
+
+
+class ResponseText:
+    """
+    Stand-in for an `httpx.Response` that carries only its text. Responses
+    can't be pickled, so this is what a parser receives in a worker process.
+    """
+
+    __slots__ = ("text", "status_code")
+
+    def __init__(self, text: str, status_code: int = 200):
+        self.text = text
+        self.status_code = status_code
+
+
+def _parse_batch(func, texts: list) -> list:
+    return [func(text) for text in texts]
+
+
+def _init_worker(html_options: dict) -> None:
+    # Worker processes don't see options set in the parent after they start,
+    # and with the "spawn" start method they don't see any
+    from .html_utils import configure_html_parser
+
+    configure_html_parser(**html_options)
+
+
+_options = dict(DEFAULT_OPTIONS)
+_executor = None
+_executor_html_options = None
+_lock = threading.Lock()
+
+
+def configure_parsing(**options) -> None:
+    """
+    Sets where the HTML services parse search and item pages.
+
+    Args:
+        executor: None to parse in the calling thread (the default), "thread"
+            or "process" for a pool created on first use, or any
+            `concurrent.futures.Executor`. A process pool uses all cores; a
+            thread pool keeps the event loop responsive but shares the GIL.
+        max_workers (int): Workers of a pool created from "thread" or "process".
+            Defaults to the number of CPUs.
+        batch_size (int): Item pages sent to a worker at once. Larger batches
+            cut the per-task overhead, most noticeably with processes.
+    """
+    unknown = set(options) - set(DEFAULT_OPTIONS)
+    if unknown:
+        raise ValueError(f"Unknown parsing options: {sorted(unknown)}")
+    executor = options.get("executor", _options["executor"])
+    if executor not in (None, "thread", "process") and not isinstance(executor, Executor):
+        raise ValueError(f"Unknown executor {executor}")
+    if options.get("batch_size", 1) < 1:
+        raise ValueError("batch_size must be at least 1")
+
+    shutdown_parse_executor()
+    _options.update(options)
+
+
+def get_parse_executor():
+    """
+    Returns the executor used for parsing, or None if pages are parsed in the calling thread.
+
+    A process pool is started with the current `configure_html_parser`
+    options, and restarted when they have changed since.
+    """
+    global _executor, _executor_html_options
+    executor = _options["executor"]
+    if executor is None or isinstance(executor, Executor):
+        return executor
+    with _lock:
+        if executor == "process":
+            from .html_utils import html_parser_options
+
+            html_options = html_parser_options()
+            if _executor is not None and html_options != _executor_html_options:
+                _executor.shutdown(wait=False)
+                _executor = None
+        if _executor is None:
+            max_workers = _options["max_workers"] or os.cpu_count()
+            if executor == "process":
+                _executor = ProcessPoolExecutor(
+                    max_workers=max_workers,
+                    initializer=_init_worker,
+                    initargs=(html_options,),
+                )
+                _executor_html_options = html_options
+            else:
+                _executor = ThreadPoolExecutor(
+                    max_workers=max_workers, thread_name_prefix="postalservice-parse"
+                )
+        return _executor
+
+
+def shutdown_parse_executor() -> None:
+    """
+    Shuts down the pool created for "thread" or "process". Executors passed in
+    by the caller are left to the caller.
+    """
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def _batches(texts: list) -> list:
+    size = _options["batch_size"]
+    return [texts[i : i + size] for i in range(0, len(texts), size)]
+
+
+async def parse_page_async(func, response, **kwargs):
+    """
+    Runs `func(response, **kwargs)` on the parse executor without blocking the event loop.
+    """
+    executor = get_parse_executor()
+    if executor is None:
+        return func(response, **kwargs)
+    call = functools.partial(func, ResponseText(response.text), **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(executor, call)
+
+
+async def parse_many_async(func, texts: list) -> list:
+    """
+    Applies `func` to every page text on the parse executor, in batches of
+    `batch_size`, and returns the results in the order of the texts.
+
+    Args:
+        func: A parser taking the page text, e.g. `FrilService.parse_item_details`.
+            It must be a module- or class-level function to run in a process pool.
+        texts (list): The page texts.
+
+    Returns:
+        list: One result per text.
+    """
+    executor = get_parse_executor()
+    if executor is None:
+        return [func(text) for text in texts]
+    loop = asyncio.get_running_loop()
+    parsed = await asyncio.gather(
+        *[
+            loop.run_in_executor(executor, _parse_batch, func, batch)
+            for batch in _batches(texts)
+        ]
+    )
+    return [result for batch in parsed for result in batch]
+
+
+def parse_many(func, texts: list) -> list:
+    """
+    Synchronous version of `parse_many_async`.
+    """
+    executor = get_parse_executor()
+    if executor is None:
+        return [func(text) for text in texts]
+    futures = [executor.submit(_parse_batch, func, batch) for batch in _batches(texts)]
+    return [result for future in futures for result in future.result()]
+
+
+atexit.register(shutdown_parse_executor)
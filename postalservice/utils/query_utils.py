@@ -0,0 +1,169 @@
+import heapq
+import math
+import re
+from importlib.util import find_spec
+
+# Result sets at least this large use NumPy for price filtering, sorting and
+# statistics when it is installed. Below it plain Python is faster than the
+# conversion to NumPy arrays.
+NUMPY_THRESHOLD = 5000
+NUMPY_AVAILABLE = find_spec("numpy") is not None
+
+_numpy = None
+
+
+def _get_numpy(size: int):
+    global _numpy
+    if not NUMPY_AVAILABLE or size < NUMPY_THRESHOLD:
+        return None
+    if _numpy is None:
+        import numpy
+
+        _numpy = numpy
+    return _numpy
+
+
+def _as_float_array(np, prices):
+    try:
+        # array('d') columns are shared with NumPy without a copy
+        return np.frombuffer(prices, dtype=np.float64)
+    except TypeError:
+        return np.asarray(prices, dtype=np.float64)
+
+
+def price_rows(prices, min_price: float = None, max_price: float = None) -> list:
+    """
+    Returns the rows whose price is within [min_price, max_price]. Either bound may be None.
+    """
+    np = _get_numpy(len(prices))
+    if np is not None:
+        values = _as_float_array(np, prices)
+        mask = np.ones(len(values), dtype=bool)
+        if min_price is not None:
+            mask &= values >= min_price
+        if max_price is not None:
+            mask &= values <= max_price
+        return np.flatnonzero(mask).tolist()
+
+    low = -math.inf if min_price is None else min_price
+    high = math.inf if max_price is None else max_price
+    return [row for row, price in enumerate(prices) if low <= price <= high]
+
+
+def member_rows(values, allowed, case_sensitive: bool = False) -> list:
+    """
+    Returns the rows whose value is one of the allowed values.
+    """
+    if case_sensitive:
+        allowed = set(allowed)
+        return [row for row, value in enumerate(values) if value in allowed]
+    allowed = {value.casefold() for value in allowed}
+    return [
+        row
+        for row, value in enumerate(values)
+        if value is not None and value.casefold() in allowed
+    ]
+
+
+def title_rows(titles, substring: str = None, pattern: str = None, case_sensitive: bool = False) -> list:
+    """
+    Returns the rows whose title contains the substring and/or matches the regular expression.
+    """
+    rows = range(len(titles))
+    if substring is not None:
+        if case_sensitive:
+            rows = [row for row in rows if substring in titles[row]]
+        else:
+            needle = substring.casefold()
+            rows = [row for row in rows if needle in titles[row].casefold()]
+    if pattern is not None:
+        regex = re.compile(pattern, 0 if case_sensitive else re.IGNORECASE)
+        rows = [row for row in rows if regex.search(titles[row])]
+    return list(rows)
+
+
+def sorted_rows(prices, descending: bool = False) -> list:
+    """
+    Returns the rows ordered by price. Listings with equal prices keep their order.
+    """
+    np = _get_numpy(len(prices))
+    if np is not None:
+        values = _as_float_array(np, prices)
+        return np.argsort(-values if descending else values, kind="stable").tolist()
+    return sorted(range(len(prices)), key=prices.__getitem__, reverse=descending)
+
+
+def top_k_rows(prices, k: int, descending: bool = False) -> list:
+    """
+    Returns the rows of the k cheapest (or most expensive) listings, in price order.
+    """
+    k = min(k, len(prices))
+    if k <= 0:
+        return []
+    np = _get_numpy(len(prices))
+    if np is not None:
+        values = _as_float_array(np, prices)
+        values = -values if descending else values
+        candidates = np.argpartition(values, k - 1)[:k]
+        return candidates[np.argsort(values[candidates], kind="stable")].tolist()
+    pick = heapq.nlargest if descending else heapq.nsmallest
+    return pick(k, range(len(prices)), key=prices.__getitem__)
+
+
+def percentile(sorted_values, q: float) -> float:
+    """
+    Returns the q-th percentile of already sorted values, interpolating
+    linearly between the closest ranks like NumPy's default.
+    """
+    if not len(sorted_values):
+        raise ValueError("percentile of an empty sequence")
+    position = (len(sorted_values) - 1) * q / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    fraction = position - lower
+    return float(
+        sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * fraction
+    )
+
+
+def price_stats(prices, groups=None, percentiles=(25, 50, 75)) -> dict:
+    """
+    Returns price statistics for all listings, or per group if group values
+    (e.g. the brand column) are given.
+
+    Each entry has 'count', 'min', 'max', 'mean', 'median' and 'p<q>' for each requested percentile.
+    """
+    if groups is None:
+        grouped = {None: list(range(len(prices)))}
+    else:
+        grouped = {}
+        for row, group in enumerate(groups):
+            grouped.setdefault(group, []).append(row)
+
+    np = _get_numpy(len(prices))
+    values = _as_float_array(np, prices) if np is not None else None
+
+    stats = {}
+    for group, rows in grouped.items():
+        if not rows:
+            continue
+        if np is not None and len(rows) >= NUMPY_THRESHOLD:
+            group_prices = np.sort(values[rows])
+            mean = float(group_prices.mean())
+        else:
+            group_prices = sorted(prices[row] for row in rows)
+            mean = sum(group_prices) / len(group_prices)
+        entry = {
+            "count": len(rows),
+            "min": float(group_prices[0]),
+            "max": float(group_prices[-1]),
+            "mean": mean,
+            "median": percentile(group_prices, 50),
+        }
+        for q in percentiles:
+            entry[f"p{q}"] = percentile(group_prices, q)
+        stats[group] = entry
+
+    if groups is None:
+        return stats.get(None, {})
+    return stats
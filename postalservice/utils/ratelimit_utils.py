@@ -0,0 +1,261 @@
+import asyncio
+import os
+import struct
+import threading
+import time
+from urllib.parse import urlsplit
+from .metrics_utils import get_registry, instrumentation_enabled
+from .retry_utils import RetryPolicy
+
+try:
+    import fcntl
+except ImportError:  # Windows, only in-process buckets are available
+    fcntl = None
+
+# tokens, last refill (epoch seconds), current rate, no requests before (epoch seconds)
+STATE_FORMAT = struct.Struct("<dddd")
+
+
+class MemoryBucketState:
+    """
+    Bucket state shared by the threads and event loops of this process.
+    """
+
+    def __init__(self, initial: tuple):
+        self._state = initial
+        self._lock = threading.Lock()
+
+    def update(self, func):
+        """
+        Replaces the state with `func(state)[0]` atomically and returns `func(state)[1]`.
+        """
+        with self._lock:
+            self._state, result = func(self._state)
+        return result
+
+    def read(self) -> tuple:
+        return self._state
+
+
+class FileBucketState:
+    """
+    Bucket state kept in a small file and updated under an exclusive `flock`,
+    so every process on the machine that uses the same file shares one bucket.
+    """
+
+    def __init__(self, path: str, initial: tuple):
+        if fcntl is None:
+            raise RuntimeError("Shared rate limit state needs fcntl, which this platform lacks")
+        self.path = path
+        self._initial = initial
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def _read(self) -> tuple:
+        data = os.pread(self._fd, STATE_FORMAT.size, 0)
+        if len(data) < STATE_FORMAT.size:
+            return self._initial
+        return STATE_FORMAT.unpack(data)
+
+    def update(self, func):
+        with self._lock:
+            if self._pid != os.getpid():
+                # A forked child must not share the parent's descriptor and its lock
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                self._pid = os.getpid()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                state, result = func(self._read())
+                os.pwrite(self._fd, STATE_FORMAT.pack(*state), 0)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return result
+
+    def read(self) -> tuple:
+        with self._lock:
+            return self._read()
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class AdaptiveTokenBucket:
+    """
+    Token bucket whose refill rate adapts to the server: each 429 response
+    multiplies the rate by `decrease`, and each 2xx or 3xx response adds
+    `increase` requests per second, up to `max_rate` (additive increase,
+    multiplicative decrease). Other errors, such as 403 or 5xx, leave the rate
+    as it is: a failing or blocking host must not be paced faster. A
+    `Retry-After` on a 429 also pauses the bucket.
+
+    Callers reserve a token and then wait for it, so concurrent callers are
+    spaced out instead of all retrying at once.
+
+    Args:
+        rate (float): Requests per second to start with.
+        burst (float): Tokens the bucket holds, i.e. requests sent back to back after a pause.
+        min_rate (float): The rate never drops below this.
+        max_rate (float): The rate never grows above this, defaults to twice `rate`.
+        increase (float): Requests per second added per 2xx or 3xx response.
+        decrease (float): Factor the rate is multiplied by on a 429.
+        state_path (str): File the state is shared through with other processes, None for in-process.
+    """
+
+    def __init__(
+        self,
+        rate: float = 5.0,
+        burst: float = 5.0,
+        min_rate: float = 0.2,
+        max_rate: float = None,
+        increase: float = 0.05,
+        decrease: float = 0.5,
+        state_path: str = None,
+    ):
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate if max_rate is not None else rate * 2
+        self.increase = increase
+        self.decrease = decrease
+        initial = (burst, time.time(), rate, 0.0)
+        if state_path is None:
+            self.state = MemoryBucketState(initial)
+        else:
+            self.state = FileBucketState(state_path, initial)
+
+    @property
+    def rate(self) -> float:
+        return self.state.read()[2]
+
+    def reserve(self) -> float:
+        """
+        Takes a token and returns the seconds to wait before using it.
+        """
+
+        def take(state):
+            tokens, updated, rate, blocked_until = state
+            now = time.time()
+            tokens = min(self.burst, tokens + max(0.0, now - updated) * rate) - 1
+            wait = max(-tokens / rate if tokens < 0 else 0.0, blocked_until - now)
+            return (tokens, now, rate, blocked_until), wait
+
+        return self.state.update(take)
+
+    def record(self, status: int, retry_after: float = None) -> None:
+        """
+        Adapts the rate to a response status.
+        """
+
+        def adapt(state):
+            tokens, updated, rate, blocked_until = state
+            if status == 429:
+                rate = max(self.min_rate, rate * self.decrease)
+                if retry_after:
+                    blocked_until = max(blocked_until, time.time() + retry_after)
+            elif status < 400:
+                rate = min(self.max_rate, rate + self.increase)
+            return (tokens, updated, rate, blocked_until), None
+
+        self.state.update(adapt)
+
+
+class RateLimiter:
+    """
+    Keeps an `AdaptiveTokenBucket` per host and paces the requests sent
+    through the shared client pool with it.
+
+    Args:
+        state_dir (str): Directory for shared bucket files, one per host, so
+            every process using the same directory shares the per-host rate.
+            None keeps the buckets in this process.
+        **options: Default `AdaptiveTokenBucket` options for every host.
+    """
+
+    def __init__(self, state_dir: str = None, **options):
+        self.state_dir = state_dir
+        self.options = options
+        self.host_options = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+        if state_dir is not None:
+            os.makedirs(state_dir, exist_ok=True)
+
+    def configure_host(self, host: str, **options) -> None:
+        """
+        Overrides the bucket options for a single host, e.g.
+        `limiter.configure_host("api.mercari.jp", rate=3, max_rate=4)`.
+        """
+        with self._lock:
+            self.host_options.setdefault(host, {}).update(options)
+            self._buckets.pop(host, None)
+
+    def bucket(self, url: str) -> AdaptiveTokenBucket:
+        """
+        Returns the bucket of the URL's host.
+        """
+        host = urlsplit(url).netloc
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(host)
+                if bucket is None:
+                    options = {**self.options, **self.host_options.get(host, {})}
+                    if self.state_dir is not None:
+                        options["state_path"] = os.path.join(self.state_dir, f"{host}.bucket")
+                    bucket = self._buckets[host] = AdaptiveTokenBucket(**options)
+        return bucket
+
+    def _observe(self, url: str, wait: float) -> None:
+        if instrumentation_enabled():
+            get_registry().observe("rate_limit_wait_seconds", wait, host=urlsplit(url).netloc)
+
+    def acquire(self, url: str) -> None:
+        """
+        Blocks until a request to the URL's host may be sent.
+        """
+        wait = self.bucket(url).reserve()
+        self._observe(url, wait)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, url: str) -> None:
+        wait = self.bucket(url).reserve()
+        self._observe(url, wait)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def record(self, url: str, status: int, retry_after: float = None) -> None:
+        self.bucket(url).record(status, retry_after)
+
+    def record_response(self, url: str, response) -> None:
+        retry_after = RetryPolicy.parse_retry_after(response.headers.get("retry-after"))
+        self.record(url, response.status_code, retry_after)
+
+    def rates(self) -> dict:
+        """
+        Returns the current rate of every host's bucket, in requests per second.
+        """
+        return {host: bucket.rate for host, bucket in list(self._buckets.items())}
+
+
+_rate_limiter = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    return _rate_limiter
+
+
+def configure_rate_limiter(enabled: bool = True, **options) -> RateLimiter:
+    """
+    Turns per-host rate limiting of HTTP requests on or off. Off by default.
+
+    Args:
+        enabled (bool): Pace requests with a new `RateLimiter`, or stop pacing.
+        **options: `RateLimiter` options, state_dir and the bucket options.
+
+    Returns:
+        RateLimiter: The new shared limiter, None if disabled.
+    """
+    global _rate_limiter
+    _rate_limiter = RateLimiter(**options) if enabled else None
+    return _rate_limiter
@@ -0,0 +1,325 @@
+import asyncio
+import base64
+import gzip
+import hashlib
+import json
+import random
+import threading
+import time
+import weakref
+import httpx
+
+# Headers that describe the encoding on the wire. Recorded bodies are stored
+# decoded, so these would be wrong on replay.
+WIRE_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+# JSON request body fields that change on every request, e.g. Mercari's
+# random search session id, left out when matching requests
+VOLATILE_FIELDS = {"searchSessionId"}
+# Query params that change on every request, e.g. Kindal's timestamp and
+# random session and request ids, left out when matching requests
+VOLATILE_PARAMS = {"t", "sid", "parent_request_id"}
+
+
+def _without_volatile(value):
+    if isinstance(value, dict):
+        return {key: _without_volatile(v) for key, v in value.items() if key not in VOLATILE_FIELDS}
+    if isinstance(value, list):
+        return [_without_volatile(v) for v in value]
+    return value
+
+
+def request_url_key(url) -> str:
+    """
+    Returns the URL a request is matched by: the URL without `VOLATILE_PARAMS`.
+    """
+    url = httpx.URL(str(url))
+    for name in VOLATILE_PARAMS:
+        if name in url.params:
+            url = url.copy_remove_param(name)
+    return str(url)
+
+
+def request_body_hash(body: bytes) -> str:
+    """
+    Returns a hash of a request body to match requests by, or None for an
+    empty body. JSON bodies are hashed without `VOLATILE_FIELDS` and key
+    order, so two searches for the same thing match.
+    """
+    if not body:
+        return None
+    try:
+        normalized = json.dumps(_without_volatile(json.loads(body)), sort_keys=True).encode("utf-8")
+    except ValueError:
+        normalized = body
+    return hashlib.sha256(normalized).hexdigest()[:16]
+
+
+def _entry(method: str, url: str, status: int, headers, body: bytes, request_body: bytes = None) -> dict:
+    entry = {
+        "method": method.upper(),
+        "url": str(url),
+        "body_hash": request_body_hash(request_body),
+        "status": status,
+        "headers": [
+            [name, value] for name, value in headers if name.lower() not in WIRE_HEADERS
+        ],
+    }
+    # Text bodies are stored as is, they compress far better than base64
+    try:
+        entry["text"] = body.decode("utf-8")
+    except UnicodeDecodeError:
+        entry["body"] = base64.b64encode(body).decode("ascii")
+    return entry
+
+
+def _entry_body(entry: dict) -> bytes:
+    if "text" in entry:
+        return entry["text"].encode("utf-8")
+    return base64.b64decode(entry["body"])
+
+
+def load_archive(path: str) -> list:
+    """
+    Reads the entries of an archive written by `RecordingTransport.save`.
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class RecordingTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    Sends requests to the network and records every response into an archive
+    for `ReplayTransport`. Use it as the transport of the client pool:
+
+        recorder = RecordingTransport("traffic.jsonl.gz")
+        configure_pool(transport=recorder)
+        configure_browser_pool(route_handler=recorder)  # for 2nd Street
+        ...
+        recorder.save()
+
+    It is also a Playwright route handler (`route`/`route_async`), so pages
+    loaded by the browser pool are recorded into the same archive.
+
+    Args:
+        path (str): Where `save` writes the archive (gzipped JSON lines).
+        transport: The transport that really sends the requests. Defaults to
+            httpx's HTTP transports.
+    """
+
+    def __init__(self, path: str, transport=None):
+        self.path = path
+        self.entries = []
+        self._transport = transport
+        self._sync_transport = None
+        self._async_transports = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _record(self, entry: dict) -> None:
+        with self._lock:
+            self.entries.append(entry)
+
+    def _get_transport(self):
+        if self._transport is not None:
+            return self._transport
+        if self._sync_transport is None:
+            self._sync_transport = httpx.HTTPTransport()
+        return self._sync_transport
+
+    def _get_async_transport(self):
+        if self._transport is not None:
+            return self._transport
+        # Connections are bound to the event loop they were opened on
+        loop = asyncio.get_running_loop()
+        transport = self._async_transports.get(loop)
+        if transport is None:
+            transport = httpx.AsyncHTTPTransport()
+            self._async_transports[loop] = transport
+        return transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        response = self._get_transport().handle_request(request)
+        body = response.read()
+        response.close()
+        return self._recorded_response(request, response, body)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self._get_async_transport().handle_async_request(request)
+        body = await response.aread()
+        await response.aclose()
+        return self._recorded_response(request, response, body)
+
+    def _recorded_response(self, request, response, body: bytes) -> httpx.Response:
+        headers = response.headers.multi_items()
+        self._record(
+            _entry(request.method, request.url, response.status_code, headers, body, request.content)
+        )
+        return httpx.Response(
+            response.status_code,
+            headers=[(name, value) for name, value in headers if name.lower() not in WIRE_HEADERS],
+            content=body,
+            request=request,
+        )
+
+    def route(self, route) -> None:
+        """
+        Playwright (sync) route handler that fetches and records the request.
+        """
+        response = route.fetch()
+        self._record(
+            _entry(
+                route.request.method,
+                route.request.url,
+                response.status,
+                [(header["name"], header["value"]) for header in response.headers_array],
+                response.body(),
+                route.request.post_data_buffer,
+            )
+        )
+        route.fulfill(response=response)
+
+    async def route_async(self, route) -> None:
+        """
+        Playwright (async) route handler that fetches and records the request.
+        """
+        response = await route.fetch()
+        self._record(
+            _entry(
+                route.request.method,
+                route.request.url,
+                response.status,
+                [(header["name"], header["value"]) for header in response.headers_array],
+                await response.body(),
+                route.request.post_data_buffer,
+            )
+        )
+        await route.fulfill(response=response)
+
+    def save(self, path: str = None) -> None:
+        """
+        Writes the recorded entries as gzipped JSON lines.
+        """
+        with self._lock:
+            entries = list(self.entries)
+        with gzip.open(path or self.path, "wt", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def close(self) -> None:
+        # Every client of the pool closes its transport, a later request opens a new one
+        transport, self._sync_transport = self._sync_transport, None
+        if transport is not None:
+            transport.close()
+
+    async def aclose(self) -> None:
+        transport = self._async_transports.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
+
+
+class ReplayTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    Answers requests from an archive recorded by `RecordingTransport`, without
+    touching the network. Requests are matched by method, URL and body (see
+    `request_url_key` and `request_body_hash`); when a request was recorded several times its
+    responses are returned in turn.
+
+    Like the recorder it is also a Playwright route handler, for the browser pool.
+
+    Args:
+        archive: Path of the archive, or a list of entries.
+        latency (float): Seconds every response is delayed by, to simulate the network.
+        jitter (float): Up to this many seconds are added to the latency at random.
+        strict (bool): Raise `httpx.ConnectError` for requests that weren't
+            recorded. Otherwise they get an empty 404 response.
+    """
+
+    def __init__(self, archive, latency: float = 0.0, jitter: float = 0.0, strict: bool = True):
+        self.latency = latency
+        self.jitter = jitter
+        self.strict = strict
+        entries = load_archive(archive) if isinstance(archive, str) else archive
+        self._responses = {}
+        for entry in entries:
+            key = (entry["method"], request_url_key(entry["url"]), entry.get("body_hash"))
+            self._responses.setdefault(key, []).append(
+                (entry["status"], entry["headers"], _entry_body(entry))
+            )
+        self._turns = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(len(responses) for responses in self._responses.values())
+
+    def lookup(self, method: str, url: str, body: bytes = None):
+        """
+        Returns the next recorded (status, headers, body) for the request, or None.
+        """
+        url = request_url_key(url)
+        key = (method.upper(), url, request_body_hash(body))
+        responses = self._responses.get(key)
+        if not responses:
+            # Archives recorded without body hashes match by method and URL
+            key = (method.upper(), url, None)
+            responses = self._responses.get(key)
+        if not responses:
+            return None
+        with self._lock:
+            turn = self._turns.get(key, 0)
+            self._turns[key] = turn + 1
+        return responses[turn % len(responses)]
+
+    def _delay(self) -> float:
+        return self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def _response(self, request: httpx.Request) -> httpx.Response:
+        recorded = self.lookup(request.method, request.url, request.content)
+        if recorded is None:
+            if self.strict:
+                raise httpx.ConnectError(
+                    f"No recorded response for {request.method} {request.url}", request=request
+                )
+            return httpx.Response(404, request=request)
+        status, headers, body = recorded
+        return httpx.Response(status, headers=headers, content=body, request=request)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        delay = self._delay()
+        if delay:
+            time.sleep(delay)
+        return self._response(request)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        delay = self._delay()
+        if delay:
+            await asyncio.sleep(delay)
+        return self._response(request)
+
+    def route(self, route) -> None:
+        """
+        Playwright (sync) route handler that fulfills requests from the archive.
+        Requests that weren't recorded are aborted.
+        """
+        recorded = self.lookup(route.request.method, route.request.url, route.request.post_data_buffer)
+        if recorded is None:
+            route.abort()
+            return
+        status, headers, body = recorded
+        delay = self._delay()
+        if delay:
+            time.sleep(delay)
+        route.fulfill(status=status, headers=dict(headers), body=body)
+
+    async def route_async(self, route) -> None:
+        """
+        Playwright (async) route handler that fulfills requests from the archive.
+        Requests that weren't recorded are aborted.
+        """
+        recorded = self.lookup(route.request.method, route.request.url, route.request.post_data_buffer)
+        if recorded is None:
+            await route.abort()
+            return
+        status, headers, body = recorded
+        delay = self._delay()
+        if delay:
+            await asyncio.sleep(delay)
+        await route.fulfill(status=status, headers=dict(headers), body=body)
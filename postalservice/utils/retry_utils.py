@@ -0,0 +1,351 @@
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+import httpx
+from .metrics_utils import get_registry, instrumentation_enabled
+
+# Statuses that mean "try again later" rather than "this request is wrong"
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Connection failures, timeouts and broken responses, all worth another try
+RETRY_ERRORS = (httpx.TransportError,)
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of sending a request while the circuit breaker of its host is open.
+    """
+
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(f"Circuit breaker for {host} is open, retrying in {retry_in:.1f}s")
+        self.host = host
+        self.retry_in = retry_in
+
+
+class RetryableStatusError(Exception):
+    """
+    Raised by fetchers that don't return an httpx response (e.g. the Playwright
+    ones) to have a 429/5xx status retried like an httpx response would be.
+    """
+
+    def __init__(self, status: int, retry_after: str = None):
+        super().__init__(f"Retryable status {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Counts consecutive failures of a host. After `failure_threshold` of them the
+    circuit opens and requests fail fast for `reset_timeout` seconds. Then one
+    trial request is let through: if it succeeds the circuit closes, if it
+    fails the circuit opens again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_started = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half-open"
+
+    def allow(self) -> float:
+        """
+        Returns 0 if a request may be sent now, else the seconds until the next trial.
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return 0.0
+            now = time.monotonic()
+            remaining = self.opened_at + self.reset_timeout - now
+            if remaining > 0:
+                return remaining
+            # Half-open: one trial at a time, a stuck trial is replaced after another timeout
+            if self._trial_started is not None and now - self._trial_started < self.reset_timeout:
+                return self._trial_started + self.reset_timeout - now
+            self._trial_started = now
+            return 0.0
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_started = None
+
+    def record_rate_limited(self) -> None:
+        """
+        Records a 429 response. It doesn't count against the host, except that
+        a trial request getting one reopens the circuit with a fresh timeout,
+        as the host still isn't taking requests.
+        """
+        with self._lock:
+            if self._trial_started is not None:
+                self.opened_at = time.monotonic()
+                self._trial_started = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._trial_started = None
+
+
+class RetryPolicy:
+    """
+    Decides whether and when a failed request is retried, and keeps a circuit
+    breaker per host.
+
+    Requests are retried on 429 and 5xx responses and on transport errors, with
+    exponential backoff and full jitter: attempt n waits a random time between
+    0 and min(max_delay, base_delay * 2 ** n). A `Retry-After` header replaces
+    the backoff; if it asks for more than `max_retry_after` seconds the
+    response is returned as is.
+
+    5xx responses and transport errors count as failures of the host, any
+    other response as a success. 429 doesn't count either way, a host that
+    limits the rate is up, except that it fails the trial request of a
+    half-open circuit.
+
+    Args:
+        max_attempts (int): Attempts per request including the first, 1 disables retries.
+        base_delay (float): Backoff in seconds before the first retry.
+        max_delay (float): Upper bound of the backoff in seconds.
+        max_retry_after (float): Longest `Retry-After` in seconds that is waited for.
+        failure_threshold (int): Consecutive failures that open a host's circuit.
+        reset_timeout (float): Seconds a circuit stays open before a trial request.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 20.0,
+        max_retry_after: float = 60.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, url: str) -> CircuitBreaker:
+        """
+        Returns the circuit breaker of the URL's host.
+        """
+        host = urlsplit(url).netloc
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(
+                    host, CircuitBreaker(self.failure_threshold, self.reset_timeout)
+                )
+        return breaker
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    @staticmethod
+    def parse_retry_after(value) -> float:
+        """
+        Returns the seconds a `Retry-After` header value (seconds or an HTTP date) asks for, or None.
+        """
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def before_attempt(self, url: str) -> None:
+        """
+        Raises `CircuitOpenError` if the host's circuit is open.
+        """
+        retry_in = self.breaker(url).allow()
+        if retry_in > 0:
+            _count("circuit_open", url)
+            raise CircuitOpenError(urlsplit(url).netloc, retry_in)
+
+    def after_status(self, url: str, attempt: int, status: int, retry_after=None) -> float:
+        """
+        Records the outcome of a response and returns the seconds to wait
+        before retrying it, or None if it should be returned.
+        """
+        breaker = self.breaker(url)
+        if status >= 500:
+            breaker.record_failure()
+        elif status == 429:
+            breaker.record_rate_limited()
+        else:
+            breaker.record_success()
+        if status not in RETRY_STATUSES or attempt + 1 >= self.max_attempts:
+            return None
+        delay = self.parse_retry_after(retry_after)
+        if delay is None:
+            delay = self.backoff(attempt)
+        elif delay > self.max_retry_after:
+            return None
+        _count("http_retries", url)
+        return delay
+
+    def after_error(self, url: str, attempt: int, error: Exception, retry_errors=RETRY_ERRORS) -> float:
+        """
+        Records a failed attempt and returns the seconds to wait before
+        retrying it, or None if the error should be raised.
+        """
+        if isinstance(error, RetryableStatusError):
+            return self.after_status(url, attempt, error.status, error.retry_after)
+        if not isinstance(error, retry_errors):
+            return None
+        self.breaker(url).record_failure()
+        if attempt + 1 >= self.max_attempts:
+            return None
+        _count("http_retries", url)
+        return self.backoff(attempt)
+
+
+def _count(name: str, url: str) -> None:
+    if instrumentation_enabled():
+        get_registry().inc(name, host=urlsplit(url).netloc)
+
+
+_policy = RetryPolicy()
+
+
+def get_retry_policy() -> RetryPolicy:
+    return _policy
+
+
+def configure_retries(**options) -> RetryPolicy:
+    """
+    Replaces the shared retry policy with one built from the given `RetryPolicy`
+    options. The circuit breakers start closed again.
+    """
+    global _policy
+    _policy = RetryPolicy(**options)
+    return _policy
+
+
+def send_with_retries(url: str, send, retry_errors=RETRY_ERRORS, policy: RetryPolicy = None):
+    """
+    Calls `send()` until it returns a response that shouldn't be retried, see
+    `RetryPolicy`. The last response is returned even if its status is an error.
+
+    Args:
+        url (str): The URL requested, its host selects the circuit breaker.
+        send: Function sending the request and returning an httpx response.
+        retry_errors: Exception types that are retried.
+        policy (RetryPolicy): Defaults to the shared policy.
+
+    Raises:
+        CircuitOpenError: The host's circuit is open.
+    """
+    policy = policy or _policy
+    attempt = 0
+    while True:
+        policy.before_attempt(url)
+        try:
+            response = send()
+        except Exception as e:
+            delay = policy.after_error(url, attempt, e, retry_errors)
+            if delay is None:
+                raise
+        else:
+            delay = policy.after_status(
+                url, attempt, response.status_code, response.headers.get("retry-after")
+            )
+            if delay is None:
+                return response
+            response.close()
+        attempt += 1
+        time.sleep(delay)
+
+
+async def send_with_retries_async(url: str, send, retry_errors=RETRY_ERRORS, policy: RetryPolicy = None):
+    """
+    Async version of `send_with_retries`, `send` is a coroutine function.
+    """
+    policy = policy or _policy
+    attempt = 0
+    while True:
+        policy.before_attempt(url)
+        try:
+            response = await send()
+        except Exception as e:
+            delay = policy.after_error(url, attempt, e, retry_errors)
+            if delay is None:
+                raise
+        else:
+            delay = policy.after_status(
+                url, attempt, response.status_code, response.headers.get("retry-after")
+            )
+            if delay is None:
+                return response
+            await response.aclose()
+        attempt += 1
+        await asyncio.sleep(delay)
+
+
+def call_with_retries(url: str, call, retry_errors=RETRY_ERRORS, policy: RetryPolicy = None):
+    """
+    Like `send_with_retries` for fetchers that don't return an httpx response,
+    e.g. a Playwright page load. `call()` returns the result, or raises
+    `RetryableStatusError` for a 429/5xx status. The last error is raised once
+    the attempts run out.
+    """
+    policy = policy or _policy
+    attempt = 0
+    while True:
+        policy.before_attempt(url)
+        try:
+            result = call()
+        except Exception as e:
+            delay = policy.after_error(url, attempt, e, retry_errors)
+            if delay is None:
+                raise
+        else:
+            policy.breaker(url).record_success()
+            return result
+        attempt += 1
+        time.sleep(delay)
+
+
+async def call_with_retries_async(url: str, call, retry_errors=RETRY_ERRORS, policy: RetryPolicy = None):
+    """
+    Async version of `call_with_retries`, `call` is a coroutine function.
+    """
+    policy = policy or _policy
+    attempt = 0
+    while True:
+        policy.before_attempt(url)
+        try:
+            result = await call()
+        except Exception as e:
+            delay = policy.after_error(url, attempt, e, retry_errors)
+            if delay is None:
+                raise
+        else:
+            policy.breaker(url).record_success()
+            return result
+        attempt += 1
+        await asyncio.sleep(delay)
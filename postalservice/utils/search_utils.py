@@ -1,7 +1,197 @@
+from abc import ABC, abstractmethod
 import json
+import sys
+from array import array
+from . import query_utils
 
+FIELDS = ("id", "title", "price", "brand", "size", "url", "img")
 
-class SearchResults:
+
+def validate_item(result: dict) -> None:
+    """
+    Raises ValueError if the item dictionary is missing a field or a field has the wrong type.
+    """
+    if not all(
+        key in result for key in ["id", "title", "price", "size", "url", "img"]
+    ):
+        raise ValueError("Missing expected key in result, ", result)
+    if not isinstance(result["id"], str):
+        raise ValueError(f"id must be a string, not {type(result['id'])}")
+    if not isinstance(result["title"], str):
+        raise ValueError(f"title must be a string, not {type(result['title'])}")
+    if not isinstance(result["price"], float):
+        raise ValueError(f"price must be a float, not {type(result['price'])}")
+    if not isinstance(result["brand"], str):
+        raise ValueError(f"brand must be a string, not {type(result['brand'])}")
+    if result["size"]:
+        if not isinstance(result["size"], str):
+            raise ValueError(
+                f"size must be a string, not {type(result['size'])}"
+            )
+    if not isinstance(result["url"], str):
+        raise ValueError(f"url must be a string, not {type(result['url'])}")
+    if not isinstance(result["img"], list) or not all(
+        isinstance(i, str) for i in result["img"]
+    ):
+        raise ValueError(
+            f"img must be a list of strings, not {type(result['img'])}"
+        )
+
+
+class Listing:
+    """
+    A single validated search result. Uses `__slots__`, so a listing takes a
+    fraction of the memory of the equivalent dictionary.
+
+    Keys other than the standard fields (e.g. 'condition' from 2nd Street) are
+    kept in `extra`, which is None when there are none. Brand and size strings
+    are interned since few distinct values repeat across many listings.
+    """
+
+    __slots__ = FIELDS + ("extra",)
+
+    def __init__(
+        self,
+        id: str,
+        title: str,
+        price: float,
+        brand: str,
+        size,
+        url: str,
+        img: list,
+        extra: dict = None,
+    ):
+        validate_item(
+            {
+                "id": id,
+                "title": title,
+                "price": price,
+                "brand": brand,
+                "size": size,
+                "url": url,
+                "img": list(img) if isinstance(img, tuple) else img,
+            }
+        )
+        self.id = id
+        self.title = title
+        self.price = price
+        self.brand = sys.intern(brand)
+        self.size = sys.intern(size) if size else size
+        self.url = url
+        self.img = tuple(img)
+        self.extra = extra or None
+
+    @classmethod
+    def from_dict(cls, result: dict) -> "Listing":
+        extra = {key: value for key, value in result.items() if key not in FIELDS}
+        return cls(
+            result.get("id"),
+            result.get("title"),
+            result.get("price"),
+            result.get("brand"),
+            result.get("size"),
+            result.get("url"),
+            result.get("img"),
+            extra,
+        )
+
+    def to_dict(self) -> dict:
+        result = {
+            "id": self.id,
+            "title": self.title,
+            "price": self.price,
+            "brand": self.brand,
+            "size": self.size,
+            "url": self.url,
+            "img": list(self.img),
+        }
+        if self.extra:
+            result.update(self.extra)
+        return result
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Listing):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f"Listing(id={self.id!r}, title={self.title!r}, price={self.price!r})"
+
+
+class ResultQueries(ABC):
+    """
+    Filtering, sorting and price statistics shared by `SearchResults` and
+    `ColumnarSearchResults`. Every filter and sort returns a new result set of
+    the same kind, so calls can be chained:
+
+        results.filter_price(max_price=20000).filter_brands(["JUNYA WATANABE MAN"]).sort_by_price()
+
+    Large sets are processed with NumPy when it is installed, see `query_utils`.
+    """
+
+    @abstractmethod
+    def _column(self, field: str):
+        """
+        Returns the values of a field for every listing, in order.
+        """
+
+    @abstractmethod
+    def take(self, rows):
+        """
+        Returns a new result set of the same kind with the listings at the given row indices.
+        """
+
+    def filter_price(self, min_price: float = None, max_price: float = None):
+        """
+        Keeps the listings priced within [min_price, max_price]. Either bound may be None.
+        """
+        return self.take(query_utils.price_rows(self._column("price"), min_price, max_price))
+
+    def filter_brands(self, brands, case_sensitive: bool = False):
+        """
+        Keeps the listings whose brand is one of the given brands.
+        """
+        return self.take(query_utils.member_rows(self._column("brand"), brands, case_sensitive))
+
+    def filter_sizes(self, sizes, case_sensitive: bool = False):
+        """
+        Keeps the listings whose size is one of the given sizes.
+        """
+        return self.take(query_utils.member_rows(self._column("size"), sizes, case_sensitive))
+
+    def filter_title(self, substring: str = None, pattern: str = None, case_sensitive: bool = False):
+        """
+        Keeps the listings whose title contains the substring and/or matches the regular expression.
+        """
+        return self.take(
+            query_utils.title_rows(self._column("title"), substring, pattern, case_sensitive)
+        )
+
+    def sort_by_price(self, descending: bool = False):
+        """
+        Returns the listings ordered by price, cheapest first unless descending.
+        """
+        return self.take(query_utils.sorted_rows(self._column("price"), descending))
+
+    def top_k(self, k: int, descending: bool = False):
+        """
+        Returns the k cheapest listings, or the k most expensive if descending, in price order.
+        """
+        return self.take(query_utils.top_k_rows(self._column("price"), k, descending))
+
+    def price_stats(self, by: str = None, percentiles=(25, 50, 75)) -> dict:
+        """
+        Returns price statistics ('count', 'min', 'max', 'mean', 'median' and
+        'p<q>' per percentile) for all listings, or a dict of them per brand or
+        size when `by` is "brand" or "size".
+        """
+        if by not in (None, "brand", "size"):
+            raise ValueError(f"Cannot group prices by {by}")
+        groups = None if by is None else self._column(by)
+        return query_utils.price_stats(self._column("price"), groups, percentiles)
+
+
+class SearchResults(ResultQueries):
     """
     Represents a collection of search results.
     Fields for each item:
@@ -14,38 +204,19 @@ class SearchResults:
     img -> list of string
     """
 
-    def __init__(self, results_json: str):
-        try:
-            results = json.loads(results_json)
-        except json.JSONDecodeError:
-            raise ValueError("Invalid JSON string")
+    def __init__(self, results):
+        """
+        Validates and wraps the results, given either as a list of item
+        dictionaries or as a JSON string of such a list.
+        """
+        if isinstance(results, str):
+            try:
+                results = json.loads(results)
+            except json.JSONDecodeError:
+                raise ValueError("Invalid JSON string")
 
         for result in results:
-            if not all(
-                key in result for key in ["id", "title", "price", "size", "url", "img"]
-            ):
-                raise ValueError("Missing expected key in result, ", result)
-            if not isinstance(result["id"], str):
-                raise ValueError(f"id must be a string, not {type(result['id'])}")
-            if not isinstance(result["title"], str):
-                raise ValueError(f"title must be a string, not {type(result['title'])}")
-            if not isinstance(result["price"], float):
-                raise ValueError(f"price must be a float, not {type(result['price'])}")
-            if not isinstance(result["brand"], str):
-                raise ValueError(f"brand must be a string, not {type(result['brand'])}")
-            if result["size"]:
-                if not isinstance(result["size"], str):
-                    raise ValueError(
-                        f"size must be a string, not {type(result['size'])}"
-                    )
-            if not isinstance(result["url"], str):
-                raise ValueError(f"url must be a string, not {type(result['url'])}")
-            if not isinstance(result["img"], list) or not all(
-                isinstance(i, str) for i in result["img"]
-            ):
-                raise ValueError(
-                    f"img must be a list of strings, not {type(result['img'])}"
-                )
+            validate_item(result)
 
         self.results: list = results
 
@@ -77,5 +248,167 @@ class SearchResults:
         """
         return len(self.results)
 
+    def to_listings(self) -> list:
+        """
+        Returns the search results as a list of `Listing` objects.
+        """
+        return [Listing.from_dict(result) for result in self.results]
+
+    def _column(self, field: str) -> list:
+        return [result[field] for result in self.results]
+
+    def take(self, rows) -> "SearchResults":
+        """
+        Returns a new `SearchResults` with the results at the given indices, in that order.
+        """
+        taken = SearchResults.__new__(SearchResults)
+        # Already validated
+        taken.results = [self.results[row] for row in rows]
+        return taken
+
     def __str__(self) -> str:
         return json.dumps(self.results, indent=4, ensure_ascii=False)
+
+
+class ColumnarSearchResults(ResultQueries):
+    """
+    Stores many search results as parallel columns instead of one object per
+    listing, for large aggregated result sets (e.g. for deduplication or price
+    tracking). Prices are kept in a packed float array, images as tuples and
+    brand and size strings are interned.
+
+    Rows are returned as `Listing` objects by indexing and iteration and as
+    dictionaries by `get` and `to_list`, like `SearchResults`.
+    """
+
+    def __init__(self, results=None):
+        self.ids = []
+        self.titles = []
+        self.prices = array("d")
+        self.brands = []
+        self.sizes = []
+        self.urls = []
+        self.imgs = []
+        # Extra keys per row, only rows that have any
+        self.extras = {}
+        self._index = None
+        if results is not None:
+            self.extend(results)
+
+    def append(self, result) -> None:
+        """
+        Appends a listing, given as a `Listing` or an item dictionary.
+        """
+        if not isinstance(result, Listing):
+            result = Listing.from_dict(result)
+        if result.extra:
+            self.extras[len(self.ids)] = result.extra
+        if self._index is not None:
+            self._index.setdefault(result.id, len(self.ids))
+        self.ids.append(result.id)
+        self.titles.append(result.title)
+        self.prices.append(result.price)
+        self.brands.append(result.brand)
+        self.sizes.append(result.size)
+        self.urls.append(result.url)
+        self.imgs.append(result.img)
+
+    def extend(self, results) -> None:
+        """
+        Appends listings from a `SearchResults`, another columnar set, or an
+        iterable of `Listing` objects or item dictionaries.
+        """
+        if isinstance(results, SearchResults):
+            results = results.to_list()
+        for result in results:
+            self.append(result)
+
+    def index_of(self, item_id: str) -> int:
+        """
+        Returns the row of the first listing with the id, or -1. The id index is
+        built on first use.
+        """
+        if self._index is None:
+            self._index = {}
+            for row, row_id in enumerate(self.ids):
+                self._index.setdefault(row_id, row)
+        return self._index.get(item_id, -1)
+
+    def __contains__(self, item_id: str) -> bool:
+        return self.index_of(item_id) != -1
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, row: int) -> Listing:
+        if row < 0:
+            row += len(self.ids)
+        if not 0 <= row < len(self.ids):
+            raise IndexError("row out of range")
+        listing = Listing.__new__(Listing)
+        listing.id = self.ids[row]
+        listing.title = self.titles[row]
+        listing.price = self.prices[row]
+        listing.brand = self.brands[row]
+        listing.size = self.sizes[row]
+        listing.url = self.urls[row]
+        listing.img = self.imgs[row]
+        listing.extra = self.extras.get(row)
+        return listing
+
+    def __iter__(self):
+        for row in range(len(self.ids)):
+            yield self[row]
+
+    def get(self, index: int) -> dict:
+        """
+        Returns the search result at the specified index as a dictionary.
+        If the index is out of range, an empty dictionary is returned.
+        """
+        try:
+            return self[index].to_dict()
+        except IndexError:
+            return {}
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    _COLUMNS = {
+        "id": "ids",
+        "title": "titles",
+        "price": "prices",
+        "brand": "brands",
+        "size": "sizes",
+        "url": "urls",
+        "img": "imgs",
+    }
+
+    def _column(self, field: str):
+        return getattr(self, self._COLUMNS[field])
+
+    def take(self, rows) -> "ColumnarSearchResults":
+        """
+        Returns a new columnar set with the rows at the given indices, in that order.
+        """
+        rows = list(rows)
+        taken = ColumnarSearchResults()
+        taken.ids = [self.ids[row] for row in rows]
+        taken.titles = [self.titles[row] for row in rows]
+        taken.prices = array("d", [self.prices[row] for row in rows])
+        taken.brands = [self.brands[row] for row in rows]
+        taken.sizes = [self.sizes[row] for row in rows]
+        taken.urls = [self.urls[row] for row in rows]
+        taken.imgs = [self.imgs[row] for row in rows]
+        if self.extras:
+            taken.extras = {
+                new_row: self.extras[row]
+                for new_row, row in enumerate(rows)
+                if row in self.extras
+            }
+        return taken
+
+    def to_list(self) -> list:
+        return [listing.to_dict() for listing in self]
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_list())
@@ -0,0 +1,433 @@
+import bisect
+import difflib
+import json
+import os
+import pickle
+import re
+import threading
+import unicodedata
+
+# The id_jsons directory shipped inside the package
+DEFAULT_SOURCE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "id_jsons")
+# Despite its name, fril_brands.json holds Fril's whole category tree
+SOURCE_FILES = (
+    "fril_brands.json",
+    "fril_sizes.json",
+    "fril_categories_mens.json",
+    "fril_categories_womens.json",
+    "mercari_categories_mens.json",
+)
+# Bumped whenever the compiled layout changes, so stale caches are rebuilt
+FORMAT_VERSION = 2
+
+_NON_WORD = re.compile(r"[\W_]+")
+# Katakana that have a hiragana counterpart, shifted down by 0x60
+_KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(0x30A1, 0x30F7)}
+
+
+def normalize_name(name: str) -> str:
+    """
+    Folds a name for lookups: full-width characters become half-width (NFKC),
+    case is folded, katakana become hiragana and whitespace and punctuation
+    are dropped. "Ｔシャツ (半袖)", "tシャツ半袖" and "Tしゃつ・半袖" all fold to the same key.
+    """
+    name = unicodedata.normalize("NFKC", name).casefold()
+    return _NON_WORD.sub("", name.translate(_KATAKANA_TO_HIRAGANA))
+
+
+def default_cache_path() -> str:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "postalservice", f"taxonomy-v{FORMAT_VERSION}.pickle")
+
+
+def source_fingerprint(source_dir: str) -> tuple:
+    """
+    Size and modification time of every source file, stored in the compiled
+    index so a cache built from other files is never used.
+    """
+    fingerprint = []
+    for name in SOURCE_FILES:
+        path = os.path.join(source_dir, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            fingerprint.append((name, None, None))
+        else:
+            fingerprint.append((name, stat.st_size, stat.st_mtime_ns))
+    return tuple(fingerprint)
+
+
+def _check_sources(source_dir: str) -> None:
+    missing = [name for name in SOURCE_FILES if not os.path.isfile(os.path.join(source_dir, name))]
+    if missing:
+        raise FileNotFoundError(f"Taxonomy source files missing from {source_dir}: {', '.join(missing)}")
+
+
+def _read_json(source_dir: str, name: str):
+    with open(os.path.join(source_dir, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compile_taxonomy(source_dir: str = DEFAULT_SOURCE_DIR) -> dict:
+    """
+    Parses the id_jsons files into the compact form `TaxonomyIndex` is built from.
+    It holds only tuples, lists and dicts of ids and strings, so it pickles small and loads fast.
+
+    Returns:
+        dict: 'categories' {id: (parent id, name, kana name, size group id)},
+            'children' {id: [child ids]}, 'size_groups' {id: (name, english name)},
+            'sizes' {id: (size group id, name)}, 'mercari_categories' {id: name},
+            'keys' the sorted (normalised name, kind, id) triples and 'fingerprint'.
+
+    Raises:
+        FileNotFoundError: A source file is missing from `source_dir`.
+        ValueError: The source files hold no categories or sizes.
+    """
+    _check_sources(source_dir)
+    categories = {}
+    children = {}
+    size_groups = {}
+    sizes = {}
+    mercari_categories = {}
+    keys = set()
+
+    def add_category(node):
+        category_id = node["id"]
+        categories[category_id] = (
+            node.get("parent_id"),
+            node["name"],
+            node.get("kana_name") or "",
+            node.get("size_group_id"),
+        )
+        for name in (node["name"], node.get("kana_name"), node.get("seo_name")):
+            if name:
+                keys.add((normalize_name(name), "category", category_id))
+        node_children = node.get("children") or []
+        if node_children:
+            children[category_id] = [child["id"] for child in node_children]
+        for child in node_children:
+            add_category(child)
+
+    for root in _read_json(source_dir, "fril_brands.json") or []:
+        add_category(root)
+    womens = _read_json(source_dir, "fril_categories_womens.json")
+    if womens:
+        if womens["id"] not in categories:
+            add_category(womens)
+        # Its root is named "womens", an English alias of レディース
+        keys.add((normalize_name(womens["name"]), "category", womens["id"]))
+    for alias in _read_json(source_dir, "fril_categories_mens.json") or []:
+        keys.add((normalize_name(alias["name"]), "category", alias["id"]))
+        if alias["id"] in categories:
+            parent_id = categories[alias["id"]][0]
+            if parent_id in categories:
+                keys.add((normalize_name("mens"), "category", parent_id))
+
+    for group in _read_json(source_dir, "fril_sizes.json") or []:
+        size_groups[group["id"]] = (group["name"], group.get("en_name") or "")
+        for name in (group["name"], group.get("en_name")):
+            if name:
+                keys.add((normalize_name(name), "size_group", group["id"]))
+        for size in group.get("sizes") or []:
+            sizes[size["id"]] = (group["id"], size["name"])
+            keys.add((normalize_name(size["name"]), "size", size["id"]))
+
+    for category in _read_json(source_dir, "mercari_categories_mens.json") or []:
+        mercari_categories[category["id"]] = category["name"]
+        keys.add((normalize_name(category["name"]), "mercari_category", category["id"]))
+
+    if not categories or not sizes:
+        raise ValueError(f"Taxonomy source files in {source_dir} hold no categories or sizes")
+    return {
+        "version": FORMAT_VERSION,
+        "fingerprint": source_fingerprint(source_dir),
+        "categories": categories,
+        "children": children,
+        "size_groups": size_groups,
+        "sizes": sizes,
+        "mercari_categories": mercari_categories,
+        # Names that fold to nothing (e.g. only punctuation) can't be looked up
+        "keys": sorted(key for key in keys if key[0]),
+    }
+
+
+def load_taxonomy(source_dir: str = DEFAULT_SOURCE_DIR, cache_path: str = None) -> dict:
+    """
+    Returns the compiled taxonomy from the pickle at `cache_path`, compiling
+    and writing it first if it is missing or was built from other source files.
+    A cache that can't be written is skipped, the index then lives in memory only.
+    The source files must exist even when the cache is used, see `compile_taxonomy`.
+    """
+    _check_sources(source_dir)
+    cache_path = cache_path or default_cache_path()
+    fingerprint = source_fingerprint(source_dir)
+    try:
+        with open(cache_path, "rb") as f:
+            compiled = pickle.load(f)
+        if compiled.get("version") == FORMAT_VERSION and compiled.get("fingerprint") == fingerprint:
+            return compiled
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+        pass
+
+    compiled = compile_taxonomy(source_dir)
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        # Written aside and renamed, so a concurrent reader never sees half a file
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump(compiled, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        print(f"Error writing taxonomy cache: {e}")
+    return compiled
+
+
+class TaxonomyIndex:
+    """
+    Looks up Fril categories and sizes and Mercari categories by name.
+
+    Names are matched after `normalize_name`, so case, full-width characters,
+    katakana/hiragana and punctuation don't matter, and both the Japanese,
+    kana and English names of an entry are indexed. Entries are returned as
+    dicts with at least 'kind' ("category", "size", "size_group" or
+    "mercari_category"), 'id' and 'name'.
+
+    Args:
+        compiled (dict): The output of `compile_taxonomy` or `load_taxonomy`.
+    """
+
+    def __init__(self, compiled: dict):
+        self.categories = compiled["categories"]
+        self.children_ids = compiled["children"]
+        self.size_groups = compiled["size_groups"]
+        self.sizes = compiled["sizes"]
+        self.mercari_categories = compiled["mercari_categories"]
+        self._keys = compiled["keys"]
+        # Only the names, for bisect and difflib
+        self._names = [key[0] for key in self._keys]
+        self._unique_names = sorted(set(self._names))
+
+    @classmethod
+    def from_source(cls, source_dir: str = DEFAULT_SOURCE_DIR) -> "TaxonomyIndex":
+        return cls(compile_taxonomy(source_dir))
+
+    def __len__(self) -> int:
+        return len(self.categories) + len(self.sizes) + len(self.mercari_categories)
+
+    def entry(self, kind: str, entry_id: int) -> dict:
+        """
+        Returns the entry of the given kind and id, or None.
+        """
+        if kind == "category":
+            category = self.categories.get(entry_id)
+            if category is None:
+                return None
+            parent_id, name, kana_name, size_group_id = category
+            return {
+                "kind": kind,
+                "id": entry_id,
+                "name": name,
+                "kana_name": kana_name,
+                "parent_id": parent_id,
+                "size_group_id": size_group_id,
+            }
+        if kind == "size":
+            size = self.sizes.get(entry_id)
+            if size is None:
+                return None
+            return {"kind": kind, "id": entry_id, "name": size[1], "size_group_id": size[0]}
+        if kind == "size_group":
+            group = self.size_groups.get(entry_id)
+            if group is None:
+                return None
+            return {"kind": kind, "id": entry_id, "name": group[0], "en_name": group[1]}
+        if kind == "mercari_category":
+            name = self.mercari_categories.get(entry_id)
+            if name is None:
+                return None
+            return {"kind": kind, "id": entry_id, "name": name}
+        raise ValueError(f"Unknown taxonomy kind {kind}")
+
+    def _entries(self, keys, kind: str = None, under: int = None, limit: int = None) -> list:
+        entries = []
+        seen = set()
+        for _, key_kind, entry_id in keys:
+            if kind is not None and key_kind != kind:
+                continue
+            if (key_kind, entry_id) in seen:
+                continue
+            if under is not None and not self.is_under(entry_id, under, key_kind):
+                continue
+            seen.add((key_kind, entry_id))
+            entries.append(self.entry(key_kind, entry_id))
+            if limit is not None and len(entries) >= limit:
+                break
+        return entries
+
+    def _range(self, start: str, end: str = None):
+        low = bisect.bisect_left(self._names, start)
+        high = bisect.bisect_right(self._names, end if end is not None else start, lo=low)
+        return self._keys[low:high]
+
+    def lookup(self, name: str, kind: str = None, under: int = None) -> list:
+        """
+        Returns the entries whose name matches exactly after normalisation.
+
+        Args:
+            name (str): The name to look up.
+            kind (str): Only return entries of this kind.
+            under: Only return entries in the subtree of this category id (for
+                categories) or in this size group (for sizes).
+        """
+        return self._entries(self._range(normalize_name(name)), kind, under)
+
+    def prefix(self, text: str, kind: str = None, under: int = None, limit: int = 10) -> list:
+        """
+        Returns up to `limit` entries with a name starting with the text, in name order.
+        """
+        key = normalize_name(text)
+        if not key:
+            return []
+        # Every name with the prefix sorts between it and it followed by the largest code point
+        return self._entries(self._range(key, key + "\U0010ffff"), kind, under, limit)
+
+    def fuzzy(self, text: str, kind: str = None, under: int = None, limit: int = 5, cutoff: float = 0.6) -> list:
+        """
+        Returns up to `limit` entries with a name similar to the text, best match first.
+        """
+        key = normalize_name(text)
+        if not key:
+            return []
+        entries = []
+        for name in difflib.get_close_matches(key, self._unique_names, n=limit * 4, cutoff=cutoff):
+            for entry in self._entries(self._range(name), kind, under):
+                if entry not in entries:
+                    entries.append(entry)
+        return entries[:limit]
+
+    def resolve(self, name: str, kind: str = None, under: int = None) -> dict:
+        """
+        Returns the single entry for the name: an exact match, else the only
+        entry starting with it. None if nothing matches or the match is
+        ambiguous. Fuzzy matches are never returned, as a close name (e.g. "3L"
+        for "L") is a different entry; use `fuzzy` to suggest names instead.
+        """
+        for entries in (
+            self.lookup(name, kind, under),
+            self.prefix(name, kind, under, limit=2),
+        ):
+            if len(entries) == 1:
+                return entries[0]
+            if entries:
+                return None
+        return None
+
+    def unsupported(self, name: str, kind: str, under: int = None) -> ValueError:
+        """
+        Returns the error for a name that doesn't resolve, listing the closest names as suggestions.
+        """
+        label = kind.replace("_", " ").capitalize()
+        suggestions = [entry["name"] for entry in self.fuzzy(name, kind, under, limit=3)]
+        if not suggestions:
+            return ValueError(f"{label} {name} is not supported")
+        return ValueError(f"{label} {name} is not supported, did you mean {', '.join(suggestions)}?")
+
+    def parent(self, category_id: int) -> dict:
+        category = self.categories.get(category_id)
+        if category is None:
+            return None
+        return self.entry("category", category[0])
+
+    def children(self, category_id: int) -> list:
+        return [self.entry("category", child) for child in self.children_ids.get(category_id, [])]
+
+    def ancestors(self, category_id: int) -> list:
+        """
+        Returns the parents of the category, nearest first.
+        """
+        ancestors = []
+        parent = self.parent(category_id)
+        while parent is not None:
+            ancestors.append(parent)
+            parent = self.parent(parent["id"])
+        return ancestors
+
+    def descendants(self, category_id: int) -> list:
+        """
+        Returns every category below the given one, depth first.
+        """
+        descendants = []
+        stack = list(reversed(self.children_ids.get(category_id, [])))
+        while stack:
+            child = stack.pop()
+            descendants.append(self.entry("category", child))
+            stack.extend(reversed(self.children_ids.get(child, [])))
+        return descendants
+
+    def path(self, category_id: int) -> list:
+        """
+        Returns the names from the root down to the category, e.g. ["メンズ", "トップス", "Tシャツ/カットソー(半袖/袖なし)"].
+        """
+        if category_id not in self.categories:
+            return []
+        names = [entry["name"] for entry in reversed(self.ancestors(category_id))]
+        return names + [self.categories[category_id][1]]
+
+    def is_under(self, entry_id: int, root_id: int, kind: str = "category") -> bool:
+        """
+        Whether a category is the given category or below it, or a size belongs to the given size group.
+        """
+        if kind == "size":
+            size = self.sizes.get(entry_id)
+            return size is not None and size[0] == root_id
+        if kind != "category":
+            return False
+        while entry_id is not None:
+            if entry_id == root_id:
+                return True
+            category = self.categories.get(entry_id)
+            entry_id = category[0] if category is not None else None
+        return False
+
+    def sizes_in_group(self, size_group_id: int) -> list:
+        return [
+            self.entry("size", size_id)
+            for size_id, (group_id, _) in self.sizes.items()
+            if group_id == size_group_id
+        ]
+
+
+_options = {"source_dir": DEFAULT_SOURCE_DIR, "cache_path": None}
+_taxonomy = None
+_taxonomy_lock = threading.Lock()
+
+
+def configure_taxonomy(source_dir: str = DEFAULT_SOURCE_DIR, cache_path: str = None) -> None:
+    """
+    Sets where the taxonomy is read from and cached. The shared index is
+    rebuilt on the next `get_taxonomy` call.
+
+    Args:
+        source_dir (str): Directory with the id_jsons files.
+        cache_path (str): Path of the compiled pickle, defaults to one in the user's cache directory.
+    """
+    global _taxonomy
+    with _taxonomy_lock:
+        _options["source_dir"] = source_dir
+        _options["cache_path"] = cache_path
+        _taxonomy = None
+
+
+def get_taxonomy() -> TaxonomyIndex:
+    """
+    Returns the shared index. It is loaded on first use, from the compiled
+    cache when it is up to date, so importing the package doesn't read the JSON files.
+    """
+    global _taxonomy
+    taxonomy = _taxonomy
+    if taxonomy is None:
+        with _taxonomy_lock:
+            if _taxonomy is None:
+                _taxonomy = TaxonomyIndex(load_taxonomy(_options["source_dir"], _options["cache_path"]))
+            taxonomy = _taxonomy
+    return taxonomy
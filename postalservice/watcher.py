@@ -0,0 +1,120 @@
+import json
+from collections import deque
+from .utils.search_utils import SearchResults
+
+
+class SearchWatcher:
+    """
+    Polls searches and returns only the listings that appeared since the
+    previous poll of the same (service, params).
+
+    All services sort by newest first, so pages are fetched only until one
+    contains a listing that was already seen. Detail pages (or Mercari photo
+    lookups) are fetched for the new listings alone.
+
+    The first poll of a search returns its first page and records it as seen.
+    Pages are read whole, an 'item_count' param doesn't cut them short.
+    Set 'enrich_photos' to False in the params to skip the enrichment step.
+
+    Args:
+        max_pages (int): Maximum pages fetched in one poll.
+        remember (int): Newest listing ids remembered per search.
+    """
+
+    def __init__(self, max_pages: int = 5, remember: int = 1000):
+        self.max_pages = max_pages
+        self.remember = remember
+        self._seen = {}
+
+    @staticmethod
+    def make_key(service, params: dict) -> tuple:
+        query = {key: value for key, value in params.items() if key != "page"}
+        return service.__name__, json.dumps(query, sort_keys=True, default=str)
+
+    def reset(self, service=None, params: dict = None) -> None:
+        """
+        Forgets the seen listings of one search, or of all searches if no search is given.
+        """
+        if service is None:
+            self._seen = {}
+        else:
+            self._seen.pop(self.make_key(service, params), None)
+
+    def _page_params(self, service, params: dict, page_index: int) -> dict:
+        # Whole pages, listings cut off a page would never be reported
+        return service.page_params(service.untruncated_params(params), page_index)
+
+    @staticmethod
+    def _parse_base(service, response, params: dict) -> list:
+        if hasattr(service, "parse_base_items"):
+            return service.parse_base_items(response, **params)
+        # Services without a separate details step parse everything in one go
+        return service.parse_items(response, **params)
+
+    def _collect_new(self, key, items: list, new_items: list) -> bool:
+        """
+        Adds the unseen items to new_items and returns True if the next page should be fetched.
+        """
+        seen = self._seen.get(key)
+        new_ids = {item["id"] for item in new_items}
+        fresh = [
+            item
+            for item in items
+            if item["id"] not in new_ids and (seen is None or item["id"] not in seen[1])
+        ]
+        new_items.extend(fresh)
+        return seen is not None and len(items) > 0 and len(fresh) == len(items)
+
+    def _remember(self, key, new_items: list) -> None:
+        order, ids = self._seen.setdefault(key, (deque(), set()))
+        for item in reversed(new_items):
+            order.appendleft(item["id"])
+            ids.add(item["id"])
+        while len(order) > self.remember:
+            ids.discard(order.pop())
+
+    def _finish(self, key, new_items: list) -> list:
+        new_items = SearchResults(new_items).to_list()
+        self._remember(key, new_items)
+        return new_items
+
+    async def poll_async(self, service, params: dict) -> list:
+        """
+        Returns the listings of the search that are new since its last poll, newest first.
+
+        Args:
+            service: The service class, e.g. `FrilService`.
+            params (dict): The search parameters.
+
+        Returns:
+            list: The new listings.
+        """
+        key = self.make_key(service, params)
+        new_items = []
+        for page_index in range(self.max_pages):
+            page_params = self._page_params(service, params, page_index)
+            response = await service.fetch_data_async(page_params)
+            items = self._parse_base(service, response, page_params)
+            if not self._collect_new(key, items, new_items) or not service.PAGINATED:
+                break
+
+        if new_items and hasattr(service, "parse_base_items") and params.get("enrich_photos", True):
+            new_items = await service.add_details_async(new_items)
+        return self._finish(key, new_items)
+
+    def poll(self, service, params: dict) -> list:
+        """
+        Synchronous version of `poll_async`.
+        """
+        key = self.make_key(service, params)
+        new_items = []
+        for page_index in range(self.max_pages):
+            page_params = self._page_params(service, params, page_index)
+            response = service.fetch_data(page_params)
+            items = self._parse_base(service, response, page_params)
+            if not self._collect_new(key, items, new_items) or not service.PAGINATED:
+                break
+
+        if new_items and hasattr(service, "parse_base_items") and params.get("enrich_photos", True):
+            new_items = service.add_details(new_items)
+        return self._finish(key, new_items)
@@ -11,17 +11,20 @@ setup(
     long_description=long_description,
     long_description_content_type="text/markdown",
     packages=find_packages(),
+    # The Fril category tree and size tables read by taxonomy_utils
+    package_data={"postalservice": ["id_jsons/*.json"]},
     install_requires=[
         "cryptography",
         "httpx",
-        "jose",
-        "python_jose",
         "setuptools",
         "bs4",
         "lxml",
         "playwright",
     ],
     extras_require={
+        "http2": [
+            "h2",
+        ],
         "dev": [
             "pytest",
             "pytest_mock",
@@ -0,0 +1,184 @@
+import asyncio
+import pytest
+from postalservice.utils import browser_utils
+from postalservice.utils.browser_utils import AsyncBrowserPool, should_block
+
+
+class FakePage:
+    def __init__(self):
+        self.closed = False
+
+    def is_closed(self):
+        return self.closed
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeContext:
+    def __init__(self):
+        self.pages = []
+        self.routes = []
+
+    async def route(self, pattern, handler):
+        self.routes.append((pattern, handler))
+
+    async def new_page(self):
+        # Opening a page takes a while, other callers run meanwhile
+        await asyncio.sleep(0.01)
+        page = FakePage()
+        self.pages.append(page)
+        return page
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.connected = True
+        self.contexts = []
+
+    def is_connected(self):
+        return self.connected
+
+    async def new_context(self, **kwargs):
+        context = FakeContext()
+        self.contexts.append(context)
+        return context
+
+    async def close(self):
+        self.connected = False
+
+
+class FakePlaywright:
+    def __init__(self):
+        self.browsers = []
+        self.firefox = self
+
+    async def launch(self, **kwargs):
+        browser = FakeBrowser()
+        self.browsers.append(browser)
+        return browser
+
+    async def start(self):
+        return self
+
+    async def stop(self):
+        pass
+
+
+@pytest.fixture
+def fake_playwright(monkeypatch):
+    playwright = FakePlaywright()
+    monkeypatch.setattr(browser_utils, "async_playwright", lambda: playwright)
+    return playwright
+
+
+@pytest.mark.asyncio
+async def test_pool_reuses_browser_and_pages(fake_playwright):
+    pool = AsyncBrowserPool(max_pages=2)
+    async with pool.page() as first:
+        pass
+    async with pool.page() as second:
+        pass
+
+    assert second is first
+    assert len(fake_playwright.browsers) == 1
+    await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_pool_bounds_open_pages(fake_playwright):
+    pool = AsyncBrowserPool(max_pages=2)
+    open_pages = set()
+    peak = []
+
+    async def use():
+        async with pool.page() as page:
+            open_pages.add(page)
+            peak.append(len(open_pages))
+            await asyncio.sleep(0.01)
+            open_pages.discard(page)
+
+    await asyncio.gather(*(use() for _ in range(6)))
+    assert max(peak) == 2
+    assert len(fake_playwright.browsers[0].contexts[0].pages) == 2
+
+
+@pytest.mark.asyncio
+async def test_pool_discards_failed_pages_and_recycles(fake_playwright):
+    pool = AsyncBrowserPool(max_pages=2, recycle_after=3)
+    with pytest.raises(RuntimeError):
+        async with pool.page() as failed:
+            raise RuntimeError("navigation failed")
+    assert failed.closed
+
+    async with pool.page():
+        pass
+    # A crashed browser is relaunched
+    fake_playwright.browsers[0].connected = False
+    async with pool.page():
+        pass
+    assert len(fake_playwright.browsers) == 2
+
+    for _ in range(3):
+        async with pool.page():
+            pass
+    async with pool.page():
+        pass
+    assert len(fake_playwright.browsers) == 3
+
+
+@pytest.mark.asyncio
+async def test_pool_doesnt_recycle_while_a_page_opens(fake_playwright):
+    pool = AsyncBrowserPool(max_pages=3, recycle_after=2)
+    async with pool.page():
+        pass
+
+    async def use():
+        async with pool.page() as page:
+            return page
+
+    async with pool.page():
+        # Opens a new page while the recycle limit is reached
+        opening = asyncio.ensure_future(use())
+        await asyncio.sleep(0)
+    # The browser is idle apart from the page being opened
+    await use()
+    page = await opening
+    assert len(fake_playwright.browsers) == 1
+    assert not page.closed
+    await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_pool_closes_as_context_manager(fake_playwright):
+    async with AsyncBrowserPool() as pool:
+        async with pool.page():
+            pass
+    assert not fake_playwright.browsers[0].connected
+
+
+class FakeRequest:
+    def __init__(self, resource_type, url):
+        self.resource_type = resource_type
+        self.url = url
+
+
+def test_should_block():
+    assert should_block(FakeRequest("image", "https://www.2ndstreet.jp/img/a_tn.jpg"))
+    assert should_block(FakeRequest("font", "https://www.2ndstreet.jp/a.woff2"))
+    assert should_block(FakeRequest("script", "https://www.googletagmanager.com/gtm.js"))
+    assert not should_block(FakeRequest("document", "https://www.2ndstreet.jp/search"))
+    assert not should_block(FakeRequest("script", "https://www.2ndstreet.jp/app.js"))
+
+
+@pytest.mark.asyncio
+async def test_pool_installs_blocking_route(fake_playwright):
+    pool = AsyncBrowserPool(block_resources=True)
+    async with pool.page():
+        pass
+    assert len(fake_playwright.browsers[0].contexts[0].routes) == 1
+
+    pool = AsyncBrowserPool(block_resources=False)
+    async with pool.page():
+        pass
+    assert fake_playwright.browsers[1].contexts[0].routes == []
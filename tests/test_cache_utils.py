@@ -0,0 +1,59 @@
+import pytest
+from postalservice.utils import cache_utils
+from postalservice.utils.cache_utils import MemoryDetailCache, SQLiteDetailCache
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    def make(**options):
+        if request.param == "memory":
+            return MemoryDetailCache(**options)
+        return SQLiteDetailCache(str(tmp_path / "details.db"), **options)
+
+    return make
+
+
+def test_get_and_set(make_cache):
+    cache = make_cache()
+    assert cache.get("FrilService", "abc") is None
+    cache.set("FrilService", "abc", {"size": "M", "img": ["https://img/1.jpg"]})
+    assert cache.get("FrilService", "abc") == {"size": "M", "img": ["https://img/1.jpg"]}
+    assert cache.get("YJPService", "abc") is None
+
+
+def test_cached_details_are_copies(make_cache):
+    cache = make_cache()
+    details = {"size": "M", "img": ["https://img/1.jpg"]}
+    cache.set("FrilService", "abc", details)
+    details["img"].append("https://img/2.jpg")
+    cache.get("FrilService", "abc")["img"].append("https://img/3.jpg")
+    assert cache.get("FrilService", "abc") == {"size": "M", "img": ["https://img/1.jpg"]}
+
+
+def test_ttl_expiry(make_cache, monkeypatch):
+    cache = make_cache(ttl=10)
+    now = [1000.0]
+    monkeypatch.setattr(cache_utils.time, "time", lambda: now[0])
+    cache.set("FrilService", "abc", {"size": "M"})
+    now[0] += 5
+    assert cache.get("FrilService", "abc") == {"size": "M"}
+    now[0] += 11
+    assert cache.get("FrilService", "abc") is None
+    assert len(cache) == 0
+
+
+def test_lru_eviction(make_cache, monkeypatch):
+    cache = make_cache(max_entries=2)
+    now = [1000.0]
+    monkeypatch.setattr(cache_utils.time, "time", lambda: now[0])
+    for item_id in ("a", "b"):
+        now[0] += 1
+        cache.set("FrilService", item_id, {"size": item_id})
+    now[0] += 1
+    cache.get("FrilService", "a")
+    now[0] += 1
+    cache.set("FrilService", "c", {"size": "c"})
+
+    assert cache.get("FrilService", "b") is None
+    assert cache.get("FrilService", "a") == {"size": "a"}
+    assert cache.get("FrilService", "c") == {"size": "c"}
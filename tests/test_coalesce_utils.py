@@ -0,0 +1,214 @@
+import asyncio
+import threading
+import time
+import httpx
+import pytest
+from postalservice import FrilService
+from postalservice.utils import coalesce_utils, network_utils, retry_utils
+from postalservice.utils.coalesce_utils import SingleFlight, normalize_params
+from postalservice.utils.parse_utils import ResponseText
+from .test_watcher import FakeService, make_item
+
+with open("tests/golden/fril-item.txt", encoding="utf-8") as f:
+    ITEM_PAGE = f.read()
+
+
+class SearchService(FakeService):
+    @classmethod
+    async def fetch_data_async(cls, params):
+        await asyncio.sleep(0.01)
+        return cls.fetch_data(params)
+
+    @staticmethod
+    async def parse_items_async(response, **kwargs):
+        return [make_item(item_id) for item_id in response]
+
+
+@pytest.fixture
+def coalescing():
+    SearchService.listings = ["3", "2", "1"]
+    SearchService.fetched_pages = []
+    flight = coalesce_utils.configure_coalescing(ttl=0.05)
+    yield flight
+    coalesce_utils.configure_coalescing(enabled=False)
+
+
+def test_normalize_params():
+    assert normalize_params({"size": "XL", "keyword": " junya  watanabe"}) == normalize_params(
+        {"keyword": "junya watanabe", "size": "XL", "page": None}
+    )
+    assert normalize_params({"keyword": "junya"}) != normalize_params({"keyword": "junya", "page": 2})
+
+
+@pytest.mark.asyncio
+async def test_concurrent_searches_share_one_fetch(coalescing):
+    results = await asyncio.gather(
+        *(SearchService.get_search_results_async({"keyword": "junya"}) for _ in range(10)),
+        SearchService.get_search_results_async({"keyword": " junya "}),
+    )
+    assert SearchService.fetched_pages == [1]
+    assert all(result == results[0] for result in results)
+    # Callers get their own copies
+    results[0][0]["title"] = "changed"
+    assert results[1][0]["title"] == "item 3"
+    assert coalescing.metrics() == {"calls": 1, "shared": 10, "cached": 0}
+
+
+@pytest.mark.asyncio
+async def test_results_are_reused_within_ttl(coalescing):
+    await SearchService.get_search_results_async({"keyword": "junya"})
+    await SearchService.get_search_results_async({"keyword": "junya"})
+    assert SearchService.fetched_pages == [1]
+
+    await asyncio.sleep(0.06)
+    await SearchService.get_search_results_async({"keyword": "junya"})
+    assert SearchService.fetched_pages == [1, 1]
+
+
+@pytest.mark.asyncio
+async def test_errors_are_shared_but_not_cached():
+    flight = SingleFlight(ttl=10)
+    calls = []
+
+    async def fail():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("down")
+
+    results = await asyncio.gather(
+        flight.run_async(("search",), fail), flight.run_async(("search",), fail), return_exceptions=True
+    )
+    assert [type(result) for result in results] == [ValueError, ValueError]
+    with pytest.raises(ValueError):
+        await flight.run_async(("search",), fail)
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_pages_are_shared_but_not_cached(coalescing):
+    statuses = [503, 200]
+
+    def handler(request):
+        return httpx.Response(statuses.pop(0), text=ITEM_PAGE)
+
+    url = "https://item.fril.jp/1"
+    network_utils.configure_pool(transport=httpx.MockTransport(handler))
+    retry_utils.configure_retries(max_attempts=1)
+    try:
+        pages = await asyncio.gather(
+            *(coalesce_utils.coalesce_page_async(url, lambda: network_utils.fetch_async(url)) for _ in range(3))
+        )
+        assert [page.status_code for page in pages] == [503] * 3
+        assert ("page", url) not in coalescing
+        # The marketplace recovered, the next caller sees it
+        page = await coalesce_utils.coalesce_page_async(url, lambda: network_utils.fetch_async(url))
+        assert page.status_code == 200
+        assert ("page", url) in coalescing
+    finally:
+        network_utils.configure_pool()
+        retry_utils.configure_retries()
+
+
+class FlakyService(SearchService):
+    statuses = []
+
+    @classmethod
+    async def fetch_data_async(cls, params):
+        cls.fetched_pages.append(1)
+        return httpx.Response(cls.statuses.pop(0), json=["1"])
+
+    @staticmethod
+    async def parse_items_async(response, **kwargs):
+        return [make_item(item_id) for item_id in response.json()] if response.is_success else []
+
+
+@pytest.mark.asyncio
+async def test_failed_searches_are_not_cached(coalescing):
+    FlakyService.statuses = [500, 200]
+    assert await FlakyService.get_search_results_async({"keyword": "junya"}) == []
+    assert len(await FlakyService.get_search_results_async({"keyword": "junya"})) == 1
+    assert len(await FlakyService.get_search_results_async({"keyword": "junya"})) == 1
+    assert FlakyService.fetched_pages == [1, 1]
+
+
+@pytest.mark.asyncio
+async def test_call_survives_one_cancelled_caller():
+    flight = SingleFlight()
+    started = []
+
+    async def fetch():
+        started.append(1)
+        await asyncio.sleep(0.02)
+        return "page"
+
+    first = asyncio.ensure_future(flight.run_async(("page", "a"), fetch))
+    second = asyncio.ensure_future(flight.run_async(("page", "a"), fetch))
+    await asyncio.sleep(0)
+    first.cancel()
+    assert await second == "page"
+    assert len(started) == 1
+
+    # Cancelled once nobody waits for it any more
+    only = asyncio.ensure_future(flight.run_async(("page", "b"), fetch))
+    await asyncio.sleep(0)
+    only.cancel()
+    await asyncio.sleep(0.03)
+    assert ("page", "b") not in flight
+
+
+def test_threads_share_one_call():
+    flight = SingleFlight(ttl=0)
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.05)
+        return "page"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(flight.run(("page", "a"), fetch)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["page"] * 5
+    assert len(calls) == 1
+    assert len(flight) == 0
+
+
+@pytest.mark.asyncio
+async def test_item_pages_are_fetched_once(coalescing):
+    seen = []
+
+    def handler(request):
+        seen.append(str(request.url))
+        return httpx.Response(200, text=ITEM_PAGE)
+
+    network_utils.configure_pool(transport=httpx.MockTransport(handler))
+    try:
+        items = [{"id": "1", "url": "https://item.fril.jp/1", "size": "SIZE PLACEHOLDER"}]
+        results = await asyncio.gather(
+            *(FrilService.add_details_async([dict(item) for item in items]) for _ in range(5))
+        )
+        assert seen == ["https://item.fril.jp/1"]
+        # Pages are kept as text, not as responses
+        stored_at, page = coalesce_utils.get_single_flight()._results["page"]["page", "https://item.fril.jp/1"]
+        assert isinstance(page, ResponseText)
+        assert all(result[0]["size"] == "~XS" for result in results)
+    finally:
+        network_utils.configure_pool()
+
+
+def test_expired_results_are_dropped_on_store():
+    flight = SingleFlight(ttl=0.02, max_entries=10, max_pages=2)
+    for i in range(3):
+        flight.run(("page", str(i)), lambda: "page")
+    assert len(flight) == 2
+    flight.run(("search", "a"), lambda: [])
+    time.sleep(0.03)
+    flight.run(("search", "b"), lambda: [])
+    assert len(flight) == 1
+    assert ("search", "b") in flight
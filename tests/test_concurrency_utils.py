@@ -0,0 +1,51 @@
+import asyncio
+import pytest
+from postalservice.utils.concurrency_utils import ConcurrencyLimiter, gather_limited
+
+
+@pytest.mark.asyncio
+async def test_gather_limited_caps_per_host_and_global():
+    limiter = ConcurrencyLimiter(max_concurrency=5, max_per_host=2)
+    active = {"a.example": 0, "b.example": 0, "total": 0}
+    peak = {"a.example": 0, "b.example": 0, "total": 0}
+
+    async def fake_fetch(url):
+        host = url.split("/")[2]
+        for key in (host, "total"):
+            active[key] += 1
+            peak[key] = max(peak[key], active[key])
+        await asyncio.sleep(0.01)
+        for key in (host, "total"):
+            active[key] -= 1
+        return url
+
+    urls = [f"https://a.example/{i}" for i in range(10)]
+    urls += [f"https://b.example/{i}" for i in range(10)]
+    results = await gather_limited(urls, fake_fetch, limiter)
+
+    assert results == urls
+    assert peak["a.example"] == 2
+    assert peak["b.example"] == 2
+    assert peak["total"] <= 5
+
+    metrics = limiter.metrics()
+    assert metrics["a.example"]["completed"] == 10
+    assert metrics["a.example"]["waiting"] == 0
+    assert metrics["a.example"]["max_waiting"] == 8
+    assert metrics["a.example"]["max_wait"] > 0
+
+
+@pytest.mark.asyncio
+async def test_limiter_host_override():
+    limiter = ConcurrencyLimiter(max_per_host=4)
+    limiter.set_host_limit("slow.example", 1)
+    running = []
+
+    async def fake_fetch(url):
+        running.append(url)
+        assert len(running) == 1
+        await asyncio.sleep(0)
+        running.remove(url)
+
+    await gather_limited([f"https://slow.example/{i}" for i in range(5)], fake_fetch, limiter)
+    assert limiter.metrics()["slow.example"]["active"] == 0
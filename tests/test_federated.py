@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+from postalservice import federated_search, federated_search_all
+from postalservice.federated import resolve_services
+from postalservice.services.baseservice import BaseService
+
+
+def make_service(name, delay, results=None, error=None):
+    class FakeService(BaseService):
+        calls = []
+
+        @classmethod
+        async def get_search_results_async(cls, params):
+            cls.calls.append(params)
+            await asyncio.sleep(delay)
+            if error is not None:
+                raise error
+            return results
+
+    FakeService.__name__ = name
+    return FakeService
+
+
+@pytest.mark.asyncio
+async def test_results_stream_in_completion_order():
+    fast = make_service("FastService", 0.0, [{"id": "1"}])
+    slow = make_service("SlowService", 0.05, [{"id": "2"}])
+    broken = make_service("BrokenService", 0.01, error=ValueError("bad page"))
+
+    order = []
+    async for result in federated_search({"keyword": "junya"}, [slow, broken, fast]):
+        order.append(result["service"])
+        if result["service"] == "broken":
+            assert isinstance(result["error"], ValueError)
+            assert result["results"] == []
+    assert order == ["fast", "broken", "slow"]
+
+
+@pytest.mark.asyncio
+async def test_per_service_timeout():
+    fast = make_service("FastService", 0.0, [])
+    hanging = make_service("HangingService", 10)
+    collected = await federated_search_all(
+        {"keyword": "junya"}, [fast, hanging], timeout=5, timeouts={"hanging": 0.01}
+    )
+    assert collected["fast"]["error"] is None
+    assert isinstance(collected["hanging"]["error"], asyncio.TimeoutError)
+
+
+@pytest.mark.asyncio
+async def test_stopping_early_cancels_pending_searches():
+    cancelled = []
+
+    class HangingService(BaseService):
+        @classmethod
+        async def get_search_results_async(cls, params):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+    fast = make_service("FastService", 0.0, [])
+    search = federated_search({"keyword": "junya"}, [fast, HangingService])
+    async for result in search:
+        break
+    await search.aclose()
+    await asyncio.sleep(0.01)
+    assert cancelled == [True]
+
+
+def test_resolve_services():
+    assert list(resolve_services(["Mercari", "kindal"])) == ["mercari", "kindal"]
+    assert len(resolve_services()) == 8
+    with pytest.raises(ValueError):
+        resolve_services(["rakuten"])
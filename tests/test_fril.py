@@ -0,0 +1,139 @@
+import asyncio
+import bs4
+import httpx
+import pytest
+from postalservice import FrilService
+from postalservice.utils import network_utils
+from postalservice.utils.cache_utils import MemoryDetailCache
+from postalservice.utils.html_utils import configure_html_parser, parse_document, soup_text
+
+with open("tests/golden/fril-search.txt", encoding="utf-8") as f:
+    SEARCH_PAGE = f.read()
+
+with open("tests/golden/fril-item.txt", encoding="utf-8") as f:
+    ITEM_PAGE = f.read()
+
+
+@pytest.fixture
+def offline_fril(monkeypatch):
+    async def fetch_data_async(params):
+        return httpx.Response(200, text=SEARCH_PAGE)
+
+    async def fetch_item_page_async(url):
+        await asyncio.sleep(0)
+        if url.endswith("7cb351238d96cb76355046eeb99704e7"):
+            raise httpx.ConnectError("connection reset")
+        return httpx.Response(200, text=ITEM_PAGE)
+
+    monkeypatch.setattr(FrilService, "fetch_data_async", fetch_data_async)
+    monkeypatch.setattr(FrilService, "fetch_item_page_async", fetch_item_page_async)
+
+
+def test_parse_golden_pages():
+    items = FrilService.parse_base_items(httpx.Response(200, text=SEARCH_PAGE), item_count=5)
+    assert len(items) == 5
+    assert items[0]["id"] == "7cb351238d96cb76355046eeb99704e7"
+    assert items[0]["price"] == 38000.0
+
+    details = FrilService.parse_item_details(ITEM_PAGE)
+    assert details["size"] == "~XS"
+    assert details["img"] == ["https://img.fril.jp/img/789380945/l/2684285548.jpg?1758294860"]
+
+
+@pytest.mark.asyncio
+async def test_stream_search_results_async(offline_fril):
+    events = []
+    async for event in FrilService.stream_search_results_async({"keyword": "junya", "item_count": 3}):
+        events.append(event)
+
+    assert events[0]["type"] == "base"
+    assert [item["img"] for item in events[0]["items"]] == [["IMG PLACEHOLDER"]] * 3
+
+    updates = events[1:]
+    assert len(updates) == 3
+    assert sorted(event["index"] for event in updates) == [0, 1, 2]
+    errors = [event for event in updates if event["type"] == "error"]
+    assert [event["id"] for event in errors] == ["7cb351238d96cb76355046eeb99704e7"]
+    for event in updates:
+        if event["type"] == "details":
+            assert event["item"]["size"] == "~XS"
+            assert event["item"]["id"] == events[0]["items"][event["index"]]["id"]
+
+
+@pytest.mark.asyncio
+async def test_add_details_async_uses_detail_cache(monkeypatch):
+    fetched = []
+
+    async def fetch_item_page_async(url):
+        fetched.append(url)
+        return httpx.Response(200, text=ITEM_PAGE)
+
+    monkeypatch.setattr(FrilService, "fetch_item_page_async", fetch_item_page_async)
+    FrilService.configure_detail_cache(MemoryDetailCache())
+    try:
+        base = FrilService.parse_base_items(httpx.Response(200, text=SEARCH_PAGE), item_count=3)
+        first = await FrilService.add_details_async([dict(item) for item in base[:2]])
+        assert len(fetched) == 2
+
+        second = await FrilService.add_details_async([dict(item) for item in base])
+        assert len(fetched) == 3
+        assert second[:2] == first
+        assert second[2]["size"] == "~XS"
+    finally:
+        FrilService.configure_detail_cache(None)
+
+
+def test_lxml_fast_path_matches_beautifulsoup(monkeypatch):
+    response = httpx.Response(200, text=SEARCH_PAGE)
+    fast_items = FrilService.parse_base_items(response, item_count=100)
+    fast_details = FrilService.parse_item_details(ITEM_PAGE)
+
+    configure_html_parser(fast_path=False)
+    try:
+        assert FrilService.parse_base_items(response, item_count=100) == fast_items
+        assert FrilService.parse_item_details(ITEM_PAGE) == fast_details
+    finally:
+        configure_html_parser(fast_path=True)
+
+    def unexpected_layout(response_text):
+        raise IndexError("list index out of range")
+
+    monkeypatch.setattr(FrilService, "parse_item_details_lxml", unexpected_layout)
+    assert FrilService.parse_item_details(ITEM_PAGE) == fast_details
+    assert FrilService.parse_base_items(httpx.Response(200, text=""), item_count=5) == []
+
+
+def test_soup_text_collapses_whitespace_like_beautifulsoup():
+    page = "<html><body><td>\n   <a>A\n  B</a>  <pre>  </pre><script>x</script></td></body></html>"
+    cell = parse_document(page).find(".//td")
+    assert soup_text(cell) == bs4.BeautifulSoup(page, "lxml").td.text == "\nA\n  B   "
+
+
+@pytest.mark.asyncio
+async def test_item_page_download_stops_once_details_are_parsed(monkeypatch):
+    body = ITEM_PAGE.encode("utf-8")
+    chunk_size = 16384
+    sent = []
+
+    async def chunks():
+        for start in range(0, len(body), chunk_size):
+            sent.append(start)
+            yield body[start : start + chunk_size]
+
+    def handler(request):
+        return httpx.Response(200, headers={"content-type": "text/html; charset=utf-8"}, content=chunks())
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(network_utils.get_pool(), "get_async_client", lambda url: client)
+
+    response = await FrilService.fetch_item_page_async("https://item.fril.jp/7cb351238d96cb76355046eeb99704e7")
+    assert len(sent) * chunk_size < len(body) / 2
+    assert FrilService.parse_item_details(response.text) == FrilService.parse_item_details(ITEM_PAGE)
+
+    configure_html_parser(partial_pages=False)
+    try:
+        sent.clear()
+        response = await FrilService.fetch_item_page_async("https://item.fril.jp/7cb351238d96cb76355046eeb99704e7")
+        assert response.text == ITEM_PAGE
+    finally:
+        configure_html_parser()
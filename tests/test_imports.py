@@ -0,0 +1,26 @@
+import subprocess
+import sys
+import pytest
+import postalservice
+
+
+def imported_modules(statement: str) -> set:
+    script = f"import sys\n{statement}\nprint(' '.join(sys.modules))"
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+    return set(output.stdout.split())
+
+
+def test_services_import_their_dependencies_lazily():
+    modules = imported_modules("import postalservice")
+    assert "postalservice.services.mercari" not in modules
+    assert "httpx" not in modules
+
+    modules = imported_modules("from postalservice import KindalService")
+    assert not {"playwright", "bs4", "lxml", "cryptography"} & modules
+
+
+def test_lazy_attributes():
+    assert "FrilService" in dir(postalservice)
+    assert postalservice.FrilService.__name__ == "FrilService"
+    with pytest.raises(AttributeError):
+        postalservice.NoSuchService
@@ -0,0 +1,97 @@
+import asyncio
+import base64
+import json
+import httpx
+import pytest
+from postalservice import MercariService
+from postalservice.utils import network_utils, retry_utils
+
+SEARCH_RESPONSE = {
+    "items": [
+        {
+            "id": "m12345678901",
+            "name": "JUNYA WATANABE MAN jacket",
+            "price": "12000",
+            "itemSize": {"name": "L"},
+            "thumbnails": ["https://static.mercdn.net/c!/w=240,f=webp/thumb/photos/m12345678901_1.jpg"],
+            "itemBrand": {"subName": "JUNYA WATANABE MAN"},
+        },
+        {
+            "id": "2a8Bc7kVkYqYzuL6rVjx3x",
+            "name": "Shop listing",
+            "price": "5000",
+            "thumbnails": ["https://static.mercdn.net/c!/w=240,f=webp/thumb/photos/shop_1.jpg"],
+        },
+    ]
+}
+
+
+def search_response():
+    return httpx.Response(200, text=json.dumps(SEARCH_RESPONSE))
+
+
+@pytest.mark.asyncio
+async def test_parse_response_async_skips_enrichment(monkeypatch):
+    async def fail(url):
+        raise AssertionError("photo lookup should be skipped")
+
+    monkeypatch.setattr(MercariService, "fetch_listing_photos_async", fail)
+    items = json.loads(
+        await MercariService.parse_response_async(search_response(), enrich_photos=False)
+    )
+    assert items[0]["img"] == [
+        "https://static.mercdn.net/item/detail/orig/photos/m12345678901_1.jpg"
+    ]
+    assert items[1]["brand"] == "--"
+
+
+@pytest.mark.asyncio
+async def test_parse_response_async_fetches_photos_concurrently(monkeypatch):
+    in_flight = []
+    peak = []
+
+    async def fake_fetch(url):
+        in_flight.append(url)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.remove(url)
+        if "/shops/products/" in url:
+            raise httpx.ConnectError("boom")
+        return httpx.Response(200, json={"data": {"photos": ["https://a/1.jpg", "https://a/2.jpg"]}})
+
+    monkeypatch.setattr(MercariService, "fetch_listing_photos_async", fake_fetch)
+    items = json.loads(await MercariService.parse_response_async(search_response()))
+
+    assert max(peak) == 2
+    assert items[0]["img"] == ["https://a/1.jpg", "https://a/2.jpg"]
+    # A failed lookup keeps the thumbnails
+    assert items[1]["img"] == [
+        "https://static.mercdn.net/item/detail/orig/photos/shop_1.jpg"
+    ]
+
+
+def test_get_listing_photos_url():
+    assert "items/get?id=m12345678901" in MercariService.get_listing_photos_url("m12345678901")
+    assert "/shops/products/2a8Bc7kVkYqYzuL6rVjx3x" in MercariService.get_listing_photos_url(
+        "2a8Bc7kVkYqYzuL6rVjx3x"
+    )
+
+
+def test_retries_sign_a_new_dpop_proof():
+    proofs = []
+
+    def handler(request):
+        proofs.append(request.headers["dpop"])
+        return httpx.Response(503 if len(proofs) == 1 else 200, json=SEARCH_RESPONSE)
+
+    network_utils.configure_pool(transport=httpx.MockTransport(handler))
+    retry_utils.configure_retries(base_delay=0.001)
+    try:
+        assert MercariService.fetch_data({"keyword": "junya"}).status_code == 200
+    finally:
+        network_utils.configure_pool()
+        retry_utils.configure_retries()
+
+    payloads = [proof.split(".")[1] for proof in proofs]
+    jtis = [json.loads(base64.urlsafe_b64decode(p + "=" * (-len(p) % 4)))["jti"] for p in payloads]
+    assert len(jtis) == 2 and jtis[0] != jtis[1]
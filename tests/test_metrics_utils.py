@@ -0,0 +1,96 @@
+import time
+import httpx
+import pytest
+from postalservice import FrilService
+from postalservice.utils import metrics_utils
+from postalservice.utils.metrics_utils import MetricsRegistry, add_hook, remove_hook, span
+from postalservice.utils.network_utils import configure_pool
+
+with open("tests/golden/fril-search.txt", encoding="utf-8") as f:
+    SEARCH_PAGE = f.read()
+
+with open("tests/golden/fril-item.txt", encoding="utf-8") as f:
+    ITEM_PAGE = f.read()
+
+
+@pytest.fixture
+def registry():
+    registry = FrilService.configure_instrumentation(registry=MetricsRegistry())
+    yield registry
+    FrilService.configure_instrumentation(False)
+    configure_pool()
+
+
+def test_registry_counters_and_histograms():
+    registry = MetricsRegistry()
+    registry.inc("requests", host="a")
+    registry.inc("requests", 2, host="a")
+    for value in (0.002, 0.02, 20.0):
+        registry.observe("seconds", value, host="a")
+
+    assert registry.counter("requests", host="a") == 3
+    assert registry.counter("requests", host="b") == 0
+    histogram = registry.histogram("seconds", host="a")
+    assert histogram["count"] == 3
+    assert histogram["min"] == 0.002 and histogram["max"] == 20.0
+    assert histogram["buckets"][0.005] == 1
+    assert histogram["buckets"][float("inf")] == 1
+
+    registry.reset()
+    assert registry.snapshot() == {"counters": [], "histograms": []}
+
+
+def test_disabled_spans_are_shared_no_ops():
+    metrics_utils.configure_instrumentation(False)
+    assert span(FrilService, "fetch") is span(FrilService, "parse")
+    with span(FrilService, "fetch") as timer:
+        assert timer is None
+
+
+@pytest.mark.asyncio
+async def test_search_records_stages_and_requests(registry):
+    def handler(request):
+        page = ITEM_PAGE if request.url.host == "item.fril.jp" else SEARCH_PAGE
+        return httpx.Response(200, headers={"content-type": "text/html; charset=utf-8"}, text=page)
+
+    configure_pool(transport=httpx.MockTransport(handler))
+    events = []
+    add_hook(events.append)
+    try:
+        await FrilService.get_search_results_async({"keyword": "junya", "item_count": 3})
+    finally:
+        remove_hook(events.append)
+
+    stages = {(service, stage): calls for service, stage, _, calls in registry.slowest_stages()}
+    assert stages == {
+        ("FrilService", "fetch"): 1,
+        ("FrilService", "parse"): 1,
+        ("FrilService", "parse_base"): 1,
+        ("FrilService", "details"): 1,
+        ("FrilService", "validate"): 1,
+    }
+    assert [event["stage"] for event in events] == ["fetch", "parse_base", "details", "parse", "validate"]
+    assert registry.counter("http_requests", host="fril.jp", status=200) == 1
+    assert registry.counter("http_requests", host="item.fril.jp", status=200) == 3
+    assert registry.histogram("http_request_seconds", host="item.fril.jp")["count"] == 3
+
+
+def test_failed_stage_is_counted(registry):
+    with pytest.raises(ValueError):
+        with span(FrilService, "parse"):
+            raise ValueError("bad page")
+    assert registry.counter("stage_errors", service="FrilService", stage="parse") == 1
+    assert registry.histogram("stage_seconds", service="FrilService", stage="parse")["count"] == 1
+
+
+def test_nested_stages_are_counted_once(registry):
+    with span(FrilService, "parse"):
+        time.sleep(0.01)
+        with span(FrilService, "details"):
+            time.sleep(0.02)
+
+    parse = registry.histogram("stage_seconds", service="FrilService", stage="parse")["sum"]
+    stages = {stage: seconds for _, stage, seconds, _ in registry.slowest_stages()}
+    assert stages["details"] >= 0.02
+    assert 0.01 <= stages["parse"] < parse
+    assert stages["parse"] + stages["details"] == pytest.approx(parse)
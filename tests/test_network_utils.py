@@ -0,0 +1,91 @@
+import asyncio
+import base64
+import json
+import pytest
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.asymmetric.utils import encode_dss_signature
+from postalservice.utils import network_utils
+from postalservice.utils.network_utils import ClientPool, DPoPSigner
+
+
+def test_client_pool_reuses_client_per_host():
+    pool = ClientPool()
+    client = pool.get_client("https://fril.jp/s?query=junya")
+    assert pool.get_client("https://fril.jp/other") is client
+    assert pool.get_client("https://item.fril.jp/abc") is not client
+    pool.close()
+    assert pool.get_client("https://fril.jp/s") is not client
+
+
+def test_client_pool_host_options():
+    pool = ClientPool(max_connections_per_host=10)
+    client = pool.get_client("https://api.mercari.jp/v2/entities:search")
+    pool.configure_host("api.mercari.jp", max_connections_per_host=2)
+    assert client.is_closed
+    assert pool.get_client("https://api.mercari.jp/") is not client
+    with pytest.raises(ValueError):
+        pool.configure_host("api.mercari.jp", retries=3)
+    pool.close()
+
+
+def test_client_pool_async_clients_per_loop():
+    pool = ClientPool()
+    clients = []
+
+    async def get():
+        client = pool.get_async_client("https://fril.jp/s")
+        assert pool.get_async_client("https://fril.jp/x") is client
+        clients.append(client)
+        await pool.aclose()
+
+    asyncio.run(get())
+    asyncio.run(get())
+    assert clients[0] is not clients[1]
+    assert clients[0].is_closed
+
+
+def test_replaced_async_clients_are_closed():
+    async def replace():
+        pool = ClientPool()
+        client = pool.get_async_client("https://api.mercari.jp/")
+        pool.configure_host("api.mercari.jp", max_connections_per_host=2)
+        assert pool.get_async_client("https://api.mercari.jp/") is not client
+        await pool.aclose()
+        assert client.is_closed
+
+        shared = network_utils.get_pool().get_async_client("https://fril.jp/s")
+        network_utils.configure_pool()
+        assert not shared.is_closed
+        await network_utils.aclose_pool()
+        assert shared.is_closed
+
+    asyncio.run(replace())
+
+
+def decode_segment(segment):
+    return json.loads(base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4)))
+
+
+def test_dpop_signer_reuses_key_and_verifies():
+    signer = DPoPSigner()
+    first = signer.sign("https://api.mercari.jp/v2/entities:search", "POST")
+    second = signer.sign("https://api.mercari.jp/items/get?id=m1", "GET")
+
+    header, payload, signature = first.split(".")
+    assert header == second.split(".")[0]
+    assert decode_segment(payload)["htm"] == "POST"
+    assert decode_segment(second.split(".")[1])["htu"] == "https://api.mercari.jp/items/get?id=m1"
+
+    jwk = decode_segment(header)["jwk"]
+    public_key = ec.EllipticCurvePublicNumbers(
+        int.from_bytes(base64.urlsafe_b64decode(jwk["x"] + "="), "big"),
+        int.from_bytes(base64.urlsafe_b64decode(jwk["y"] + "="), "big"),
+        ec.SECP256R1(),
+    ).public_key()
+    raw = base64.urlsafe_b64decode(signature + "=" * (-len(signature) % 4))
+    der = encode_dss_signature(int.from_bytes(raw[:32], "big"), int.from_bytes(raw[32:], "big"))
+    public_key.verify(der, f"{header}.{payload}".encode(), ec.ECDSA(hashes.SHA256()))
+
+    signer.rotate()
+    assert signer.sign("https://api.mercari.jp/", "GET").split(".")[0] != header
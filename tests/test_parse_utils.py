@@ -0,0 +1,62 @@
+import httpx
+import pytest
+from postalservice import FrilService
+from postalservice.utils import html_utils, parse_utils
+
+with open("tests/golden/fril-search.txt", encoding="utf-8") as f:
+    SEARCH_PAGE = f.read()
+
+with open("tests/golden/fril-item.txt", encoding="utf-8") as f:
+    ITEM_PAGE = f.read()
+
+
+@pytest.fixture
+def offline_fril(monkeypatch):
+    async def fetch_item_page_async(url):
+        return httpx.Response(200, text=ITEM_PAGE)
+
+    monkeypatch.setattr(FrilService, "fetch_item_page_async", fetch_item_page_async)
+    yield
+    parse_utils.configure_parsing(**parse_utils.DEFAULT_OPTIONS)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("executor", ["thread", "process"])
+async def test_parse_items_async_on_executor(offline_fril, executor):
+    response = httpx.Response(200, text=SEARCH_PAGE)
+    expected = await FrilService.parse_items_async(response, item_count=5)
+
+    FrilService.configure_parsing(executor=executor, max_workers=2, batch_size=2)
+    assert parse_utils.get_parse_executor() is not None
+    assert await FrilService.parse_items_async(response, item_count=5) == expected
+    assert expected[0]["size"] == "~XS"
+
+
+def test_parse_many_keeps_order(offline_fril):
+    parse_utils.configure_parsing(executor="thread", batch_size=3)
+    texts = [str(i) for i in range(10)]
+    assert parse_utils.parse_many(int, texts) == list(range(10))
+
+
+def fast_path_in_worker(text):
+    return html_utils.use_fast_path()
+
+
+def test_workers_use_html_parser_options(offline_fril):
+    parse_utils.configure_parsing(executor="process", max_workers=1)
+    try:
+        assert parse_utils.parse_many(fast_path_in_worker, ["a"]) == [True]
+        # The running pool is replaced by one with the new options
+        html_utils.configure_html_parser(fast_path=False)
+        assert parse_utils.parse_many(fast_path_in_worker, ["a"]) == [False]
+    finally:
+        html_utils.configure_html_parser()
+
+
+def test_configure_parsing_validates():
+    with pytest.raises(ValueError):
+        parse_utils.configure_parsing(executor="fibers")
+    with pytest.raises(ValueError):
+        parse_utils.configure_parsing(batch_size=0)
+    with pytest.raises(ValueError):
+        parse_utils.configure_parsing(workers=4)
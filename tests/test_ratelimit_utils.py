@@ -0,0 +1,78 @@
+import multiprocessing
+import httpx
+import pytest
+from postalservice.utils import network_utils, ratelimit_utils, retry_utils
+from postalservice.utils.ratelimit_utils import AdaptiveTokenBucket, RateLimiter
+
+
+def test_bucket_spaces_requests_after_burst():
+    bucket = AdaptiveTokenBucket(rate=100, burst=2)
+    waits = [bucket.reserve() for _ in range(4)]
+    assert waits[:2] == [0.0, 0.0]
+    assert 0.005 < waits[2] < waits[3] <= 0.02
+
+
+def test_bucket_adapts_to_429():
+    bucket = AdaptiveTokenBucket(rate=4, min_rate=1, max_rate=5, increase=0.5)
+    bucket.record(429)
+    assert bucket.rate == 2
+    bucket.record(429)
+    bucket.record(429)
+    assert bucket.rate == 1
+    for status in (403, 500, 503):
+        bucket.record(status)
+    assert bucket.rate == 1
+    for _ in range(20):
+        bucket.record(200)
+    assert bucket.rate == 5
+
+
+def test_retry_after_pauses_bucket():
+    bucket = AdaptiveTokenBucket(rate=100, burst=5)
+    bucket.record(429, retry_after=0.5)
+    assert 0.4 < bucket.reserve() <= 0.5
+
+
+@pytest.mark.skipif(ratelimit_utils.fcntl is None, reason="needs fcntl")
+def test_file_state_is_shared(tmp_path):
+    path = str(tmp_path / "fril.jp.bucket")
+    first = AdaptiveTokenBucket(rate=100, burst=1, state_path=path)
+    second = AdaptiveTokenBucket(rate=100, burst=1, state_path=path)
+    assert first.reserve() == 0.0
+    assert second.reserve() > 0.005
+    first.record(429)
+    assert second.rate == 50
+
+
+def reserve_many(state_dir):
+    limiter = RateLimiter(state_dir=state_dir, rate=1, burst=1)
+    return [limiter.bucket("https://fril.jp/s").reserve() for _ in range(10)]
+
+
+@pytest.mark.skipif(ratelimit_utils.fcntl is None, reason="needs fcntl")
+def test_processes_share_one_rate(tmp_path):
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(2) as pool:
+        waits = sum(pool.map(reserve_many, [str(tmp_path)] * 2), [])
+    # 20 reservations at 1/s from one shared bucket: the last waits about 19 s,
+    # a bucket per process would have made it about 9 s
+    assert max(waits) > 15
+
+
+@pytest.mark.asyncio
+async def test_pool_requests_are_paced():
+    statuses = [429, 200]
+    network_utils.configure_pool(
+        transport=httpx.MockTransport(lambda request: httpx.Response(statuses.pop(0)))
+    )
+    retry_utils.configure_retries(base_delay=0.001)
+    limiter = ratelimit_utils.configure_rate_limiter(rate=10, burst=10, increase=1)
+    try:
+        response = await network_utils.fetch_async("https://api.mercari.jp/x")
+        assert response.status_code == 200
+        # Halved by the 429, then raised by the success
+        assert limiter.rates() == {"api.mercari.jp": 6}
+    finally:
+        ratelimit_utils.configure_rate_limiter(enabled=False)
+        retry_utils.configure_retries()
+        network_utils.configure_pool()
@@ -0,0 +1,143 @@
+import json
+import httpx
+import pytest
+from postalservice import FrilService, KindalService
+from postalservice.utils import browser_utils
+from postalservice.utils.network_utils import configure_pool, fetch, fetch_async, request
+from postalservice.utils.replay_utils import RecordingTransport, ReplayTransport, load_archive
+
+with open("tests/golden/fril-search.txt", encoding="utf-8") as f:
+    SEARCH_PAGE = f.read()
+
+with open("tests/golden/fril-item.txt", encoding="utf-8") as f:
+    ITEM_PAGE = f.read()
+
+
+def golden_fril(request):
+    page = ITEM_PAGE if request.url.host == "item.fril.jp" else SEARCH_PAGE
+    return httpx.Response(200, headers={"content-type": "text/html; charset=utf-8"}, text=page)
+
+
+@pytest.fixture
+def restore_pool():
+    yield
+    configure_pool()
+
+
+@pytest.mark.asyncio
+async def test_record_and_replay(tmp_path, restore_pool):
+    counter = iter(range(100))
+
+    def numbered(request):
+        return httpx.Response(200, text=f"{request.url.path} {next(counter)}")
+
+    archive = str(tmp_path / "traffic.jsonl.gz")
+    recorder = RecordingTransport(archive, transport=httpx.MockTransport(numbered))
+    configure_pool(transport=recorder)
+    assert fetch("https://example.com/a").text == "/a 0"
+    assert (await fetch_async("https://example.com/a")).text == "/a 1"
+    assert (await fetch_async("https://example.com/b")).text == "/b 2"
+    recorder.save()
+    assert len(load_archive(archive)) == 3
+
+    configure_pool(transport=ReplayTransport(archive, latency=0.001))
+    # Responses recorded for the same URL are returned in turn
+    assert [fetch("https://example.com/a").text for _ in range(3)] == ["/a 0", "/a 1", "/a 0"]
+    assert (await fetch_async("https://example.com/b")).text == "/b 2"
+    with pytest.raises(httpx.ConnectError):
+        await fetch_async("https://example.com/missing")
+
+    configure_pool(transport=ReplayTransport(archive, strict=False))
+    assert fetch("https://example.com/missing").status_code == 404
+
+
+def test_requests_are_matched_by_body(restore_pool):
+    def echo(request):
+        return httpx.Response(200, json=json.loads(request.content)["searchCondition"])
+
+    recorder = RecordingTransport("unused", transport=httpx.MockTransport(echo))
+    configure_pool(transport=recorder)
+    url = "https://api.mercari.jp/v2/entities:search"
+    for keyword in ("junya", "kapital"):
+        request("POST", url, json={"searchSessionId": keyword * 2, "searchCondition": {"keyword": keyword}})
+
+    configure_pool(transport=ReplayTransport(recorder.entries))
+    # The session id differs on every search and doesn't take part in matching
+    for keyword in ("kapital", "junya", "kapital"):
+        body = {"searchCondition": {"keyword": keyword}, "searchSessionId": "new"}
+        assert request("POST", url, json=body).json() == {"keyword": keyword}
+    with pytest.raises(httpx.ConnectError):
+        request("POST", url, json={"searchCondition": {"keyword": "sacai"}})
+
+
+def test_kindal_search_is_replayed(restore_pool):
+    def products(request):
+        assert request.url.params["t"] and request.url.params["sid"]
+        product = {"id": 1, "title": request.url.params["q"], "price_min": 5000, "handle": "a", "vendor": "KAPITAL"}
+        return httpx.Response(200, json={"products": [product]})
+
+    recorder = RecordingTransport("unused", transport=httpx.MockTransport(products))
+    configure_pool(transport=recorder)
+    recorded = KindalService.parse_items(KindalService.fetch_data({"keyword": "kapital"}))
+
+    # Every search has a new timestamp, session id and request id
+    configure_pool(transport=ReplayTransport(recorder.entries))
+    assert KindalService.parse_items(KindalService.fetch_data({"keyword": "kapital"})) == recorded
+    with pytest.raises(httpx.ConnectError):
+        KindalService.fetch_data({"keyword": "sacai"})
+
+
+@pytest.mark.asyncio
+async def test_replay_full_search(tmp_path, restore_pool):
+    params = {"keyword": "junya", "item_count": 3}
+    recorder = RecordingTransport(str(tmp_path / "fril.jsonl.gz"), transport=httpx.MockTransport(golden_fril))
+    configure_pool(transport=recorder)
+    recorded = await FrilService.get_search_results_async(params)
+    recorder.save()
+
+    configure_pool(transport=ReplayTransport(recorder.path))
+    assert await FrilService.get_search_results_async(params) == recorded
+    assert FrilService.get_search_results(params) == recorded
+
+
+class FakeRequest:
+    def __init__(self, url, resource_type="document", method="GET"):
+        self.url = url
+        self.resource_type = resource_type
+        self.method = method
+        self.post_data_buffer = None
+
+
+class FakeRoute:
+    def __init__(self, request):
+        self.request = request
+        self.outcome = None
+
+    async def abort(self):
+        self.outcome = "abort"
+
+    async def continue_(self):
+        self.outcome = "continue"
+
+    async def fulfill(self, **kwargs):
+        self.outcome = kwargs
+
+
+@pytest.mark.asyncio
+async def test_replay_route_handler():
+    replay = ReplayTransport(
+        [{"method": "GET", "url": "https://www.2ndstreet.jp/search", "status": 200, "headers": [["content-type", "text/html"]], "body": "PGh0bWw+"}]
+    )
+    route = browser_utils._make_route_async(True, replay)
+
+    page = FakeRoute(FakeRequest("https://www.2ndstreet.jp/search"))
+    await route(page)
+    assert page.outcome == {"status": 200, "headers": {"content-type": "text/html"}, "body": b"<html>"}
+
+    missing = FakeRoute(FakeRequest("https://www.2ndstreet.jp/other"))
+    await route(missing)
+    assert missing.outcome == "abort"
+
+    image = FakeRoute(FakeRequest("https://www.2ndstreet.jp/search", resource_type="image"))
+    await route(image)
+    assert image.outcome == "abort"
@@ -0,0 +1,156 @@
+import time
+import httpx
+import pytest
+from postalservice import FrilService
+from postalservice.utils import network_utils, retry_utils
+from postalservice.utils.retry_utils import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryableStatusError,
+    RetryPolicy,
+    call_with_retries,
+)
+
+with open("tests/golden/fril-item.txt", encoding="utf-8") as f:
+    ITEM_PAGE = f.read()
+
+
+@pytest.fixture
+def responses():
+    """
+    Serves the queued (status, headers) responses in turn through the client pool.
+    """
+    queue = []
+    seen = []
+
+    def handler(request):
+        seen.append(str(request.url))
+        if not queue:
+            return httpx.Response(200, text="ok")
+        status, headers = queue.pop(0)
+        if status is None:
+            raise httpx.ConnectError("connection refused", request=request)
+        return httpx.Response(status, headers=headers, text="body")
+
+    network_utils.configure_pool(transport=httpx.MockTransport(handler))
+    retry_utils.configure_retries(base_delay=0.001, failure_threshold=3, reset_timeout=0.05)
+    yield queue, seen
+    network_utils.configure_pool()
+    retry_utils.configure_retries()
+
+
+def test_retries_server_errors_and_connection_errors(responses):
+    queue, seen = responses
+    queue.extend([(503, {}), (None, {})])
+    response = network_utils.fetch("https://fril.jp/s")
+    assert response.status_code == 200
+    assert len(seen) == 3
+
+
+def test_gives_up_after_max_attempts(responses):
+    queue, seen = responses
+    queue.extend([(500, {})] * 5)
+    assert network_utils.fetch("https://fril.jp/s").status_code == 500
+    assert len(seen) == 3
+
+
+def test_client_errors_are_not_retried(responses):
+    queue, seen = responses
+    queue.append((404, {}))
+    assert network_utils.fetch("https://fril.jp/s").status_code == 404
+    assert len(seen) == 1
+
+
+@pytest.mark.asyncio
+async def test_retry_after_is_honoured(responses):
+    queue, seen = responses
+    queue.append((429, {"Retry-After": "0.05"}))
+    start = time.perf_counter()
+    response = await network_utils.fetch_async("https://fril.jp/s")
+    assert response.status_code == 200
+    assert time.perf_counter() - start >= 0.05
+
+    # Longer than max_retry_after: returned as is
+    retry_utils.configure_retries(max_retry_after=1)
+    queue.append((429, {"Retry-After": "120"}))
+    assert (await network_utils.fetch_async("https://fril.jp/s")).status_code == 429
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_and_recovers(responses):
+    queue, seen = responses
+    queue.extend([(503, {})] * 3)
+    assert (await network_utils.fetch_async("https://fril.jp/s")).status_code == 503
+
+    with pytest.raises(CircuitOpenError):
+        await network_utils.fetch_async("https://fril.jp/s")
+    assert len(seen) == 3
+    # Other hosts aren't affected
+    assert (await network_utils.fetch_async("https://item.fril.jp/1")).status_code == 200
+
+    time.sleep(0.06)
+    assert (await network_utils.fetch_async("https://fril.jp/s")).status_code == 200
+    assert retry_utils.get_retry_policy().breaker("https://fril.jp/").state == "closed"
+
+
+def test_breaker_lets_one_trial_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    assert breaker.allow() > 0
+    time.sleep(0.02)
+    assert breaker.allow() == 0
+    assert breaker.allow() > 0
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def test_rate_limited_trial_reopens_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.record_rate_limited()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.allow() == 0
+    breaker.record_rate_limited()
+    assert breaker.state == "open"
+    time.sleep(0.02)
+    # A fresh timeout, not a trial stuck until the old one runs out again
+    assert breaker.allow() == 0
+
+
+def test_call_with_retries_for_non_http_fetchers():
+    policy = RetryPolicy(base_delay=0.001)
+    calls = []
+
+    def load():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RetryableStatusError(503)
+        return "page"
+
+    assert call_with_retries("https://www.2ndstreet.jp/", load, policy=policy) == "page"
+    with pytest.raises(ValueError):
+        call_with_retries("https://www.2ndstreet.jp/", lambda: int("x"), policy=policy)
+
+
+def test_parse_retry_after():
+    assert RetryPolicy.parse_retry_after("3") == 3.0
+    assert RetryPolicy.parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert RetryPolicy.parse_retry_after("soon") is None
+
+
+@pytest.mark.asyncio
+async def test_failed_item_page_keeps_placeholders(responses):
+    def handler(request):
+        if request.url.path == "/0":
+            raise httpx.ConnectError("connection reset", request=request)
+        return httpx.Response(200, text=ITEM_PAGE)
+
+    network_utils.configure_pool(transport=httpx.MockTransport(handler))
+    items = [
+        {"id": str(i), "url": f"https://item.fril.jp/{i}", "size": "SIZE PLACEHOLDER"}
+        for i in range(2)
+    ]
+    items = await FrilService.add_details_async(items)
+    assert items[0]["size"] == "SIZE PLACEHOLDER"
+    assert items[1]["size"] == "~XS"
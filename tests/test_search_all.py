@@ -0,0 +1,91 @@
+import asyncio
+import pytest
+from .test_watcher import FakeService
+
+
+class SlowService(FakeService):
+    in_flight = 0
+    max_in_flight = 0
+
+    @classmethod
+    async def fetch_data_async(cls, params):
+        cls.in_flight += 1
+        cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        await asyncio.sleep(0.01)
+        cls.in_flight -= 1
+        return cls.fetch_data(params)
+
+
+@pytest.fixture
+def service():
+    SlowService.listings = [str(i) for i in range(20, 0, -1)]
+    SlowService.fetched_pages = []
+    SlowService.enriched = []
+    SlowService.max_in_flight = 0
+    return SlowService
+
+
+async def collect(service, params, **kwargs):
+    return [item async for item in service.search_all(params, **kwargs)]
+
+
+@pytest.mark.asyncio
+async def test_search_all_stops_at_short_page(service):
+    items = await collect(service, {"keyword": "junya"}, max_items=100, prefetch=3)
+    assert [item["id"] for item in items] == service.listings
+    assert all(item["brand"] == "JUNYA" for item in items)
+    # 20 listings in pages of 3, the 7th page is short
+    assert 7 in service.fetched_pages
+    assert service.max_in_flight == 3
+
+
+@pytest.mark.asyncio
+async def test_search_all_limits_items_and_pages(service):
+    items = await collect(service, {"keyword": "junya"}, max_items=5, prefetch=4)
+    assert [item["id"] for item in items] == ["20", "19", "18", "17", "16"]
+    assert sorted(service.fetched_pages) == [1, 2]
+    assert service.enriched == [["20", "19", "18"], ["17", "16"]]
+
+
+@pytest.mark.asyncio
+async def test_search_all_skips_items_repeated_across_pages(service, monkeypatch):
+    async def fetch_data_async(params):
+        page = params.get("page", 1)
+        # A listing posted during the search pushes "18" onto the second page
+        return {1: ["20", "19", "18"], 2: ["18", "17", "16"], 3: ["15"]}[page]
+
+    monkeypatch.setattr(service, "fetch_data_async", fetch_data_async)
+    items = await collect(service, {"keyword": "junya", "enrich_photos": False})
+    assert [item["id"] for item in items] == ["20", "19", "18", "17", "16", "15"]
+    assert service.enriched == []
+
+
+@pytest.mark.asyncio
+async def test_search_all_cancels_prefetched_pages(service):
+    stream = service.search_all({"keyword": "junya"}, prefetch=4)
+    assert (await stream.__anext__())["id"] == "20"
+    await stream.aclose()
+    await asyncio.sleep(0.02)
+    assert service.in_flight == 0
+
+
+class TruncatingService(SlowService):
+    """
+    Cuts parsed pages to 'item_count' like the HTML services do.
+    """
+
+    page_size = 4
+    MAX_PAGE_SIZE = 4
+
+    @staticmethod
+    def parse_base_items(response, **kwargs):
+        return FakeService.parse_base_items(response[: kwargs.get("item_count", 3)])
+
+
+@pytest.mark.asyncio
+async def test_search_all_reads_whole_pages():
+    TruncatingService.listings = [str(i) for i in range(10, 0, -1)]
+    TruncatingService.fetched_pages = []
+    items = await collect(TruncatingService, {"keyword": "junya", "item_count": 3}, prefetch=1)
+    assert [item["id"] for item in items] == TruncatingService.listings
+    assert sorted(TruncatingService.fetched_pages) == [1, 2, 3]
@@ -0,0 +1,140 @@
+import json
+import tracemalloc
+import pytest
+from postalservice.utils import ColumnarSearchResults, Listing, SearchResults
+
+ITEMS = [
+    {
+        "id": "m1",
+        "title": "JUNYA WATANABE MAN jacket",
+        "price": 12000.0,
+        "brand": "JUNYA WATANABE MAN",
+        "size": "L",
+        "url": "https://jp.mercari.com/item/m1",
+        "img": ["https://static.mercdn.net/item/detail/orig/photos/m1_1.jpg"],
+    }
+]
+
+
+def test_accepts_list_and_json_string():
+    from_list = SearchResults(ITEMS)
+    from_json = SearchResults(json.dumps(ITEMS))
+    assert from_list.to_list() == from_json.to_list() == ITEMS
+    assert json.loads(from_list.to_json()) == ITEMS
+    assert from_list.count() == 1
+
+
+def test_validation():
+    with pytest.raises(ValueError):
+        SearchResults("not json")
+    with pytest.raises(ValueError):
+        SearchResults([{**ITEMS[0], "price": "12000"}])
+    with pytest.raises(ValueError):
+        SearchResults([{key: value for key, value in ITEMS[0].items() if key != "url"}])
+
+
+def make_items(count):
+    return [
+        {
+            "id": f"m{i}",
+            "title": f"JUNYA WATANABE MAN jacket {i}",
+            "price": float(i),
+            "brand": "JUNYA WATANABE MAN",
+            "size": "L",
+            "url": f"https://jp.mercari.com/item/m{i}",
+            "img": [f"https://static.mercdn.net/item/detail/orig/photos/m{i}_1.jpg"],
+        }
+        for i in range(count)
+    ]
+
+
+def test_listing_roundtrip_and_validation():
+    item = {**ITEMS[0], "condition": "中古B"}
+    listing = Listing.from_dict(item)
+    assert listing.to_dict() == item
+    assert listing.extra == {"condition": "中古B"}
+    assert not hasattr(listing, "__dict__")
+    assert SearchResults(ITEMS).to_listings() == [Listing.from_dict(ITEMS[0])]
+    with pytest.raises(ValueError):
+        Listing.from_dict({**ITEMS[0], "price": 12000})
+    with pytest.raises(ValueError):
+        Listing.from_dict({**ITEMS[0], "img": None})
+
+
+def test_columnar_results():
+    items = make_items(5) + [{**ITEMS[0], "condition": "中古B"}]
+    columnar = ColumnarSearchResults(SearchResults(items))
+    assert len(columnar) == columnar.count() == 6
+    assert columnar.to_list() == items
+    assert columnar.get(5)["condition"] == "中古B"
+    assert columnar.get(10) == {}
+    assert columnar[-1] == Listing.from_dict(items[-1])
+    assert list(columnar.prices[:3]) == [0.0, 1.0, 2.0]
+    assert "m3" in columnar and "m99" not in columnar
+    columnar.append(Listing.from_dict(make_items(100)[99]))
+    assert columnar.index_of("m99") == 6
+    assert json.loads(columnar.to_json())[6]["id"] == "m99"
+
+
+def test_columnar_results_use_less_memory_than_dicts():
+    items = make_items(2000)
+
+    tracemalloc.start()
+    dicts = json.loads(json.dumps(items))
+    dict_size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    raw = json.dumps(items)
+    tracemalloc.start()
+    columnar = ColumnarSearchResults(json.loads(raw))
+    columnar_size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    assert len(dicts) == len(columnar)
+    assert columnar_size < dict_size * 0.75
+
+
+def query_items():
+    return [
+        {**item, "brand": brand, "size": size, "price": price}
+        for item, brand, size, price in zip(
+            make_items(6),
+            ["Junya", "Comme", "Junya", "Kapital", "Comme", "Junya"],
+            ["L", "M", "M", "", "L", "L"],
+            [3000.0, 1000.0, 2000.0, 5000.0, 1000.0, 4000.0],
+        )
+    ]
+
+
+@pytest.mark.parametrize("container", [SearchResults, ColumnarSearchResults])
+def test_filters_and_sorting(container):
+    results = container(query_items())
+    ids = lambda res: [item["id"] for item in res.to_list()]
+
+    assert ids(results.filter_price(min_price=2000, max_price=4000)) == ["m0", "m2", "m5"]
+    assert ids(results.filter_brands(["junya"])) == ["m0", "m2", "m5"]
+    assert ids(results.filter_sizes(["M"])) == ["m1", "m2"]
+    assert ids(results.filter_title(pattern=r"jacket [13]$")) == ["m1", "m3"]
+    assert ids(results.filter_title("JACKET 2")) == ["m2"]
+    assert ids(results.sort_by_price()) == ["m1", "m4", "m2", "m0", "m5", "m3"]
+    assert ids(results.sort_by_price(descending=True)) == ["m3", "m5", "m0", "m2", "m1", "m4"]
+    assert ids(results.top_k(2)) == ["m1", "m4"]
+    assert ids(results.top_k(2, descending=True)) == ["m3", "m5"]
+    assert ids(results.filter_brands(["Junya"]).filter_price(max_price=3000).sort_by_price()) == ["m2", "m0"]
+
+
+@pytest.mark.parametrize("container", [SearchResults, ColumnarSearchResults])
+def test_price_stats(container):
+    results = container(query_items())
+    overall = results.price_stats()
+    assert overall["count"] == 6
+    assert overall["min"] == 1000.0 and overall["max"] == 5000.0
+    assert overall["median"] == 2500.0
+    assert overall["p25"] == 1250.0
+
+    by_brand = results.price_stats(by="brand", percentiles=(90,))
+    assert by_brand["Junya"]["median"] == 3000.0
+    assert by_brand["Junya"]["p90"] == pytest.approx(3800.0)
+    assert by_brand["Comme"]["mean"] == 1000.0
+    with pytest.raises(ValueError):
+        results.price_stats(by="title")
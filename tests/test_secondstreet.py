@@ -0,0 +1,56 @@
+import json
+from postalservice import SecondStreetService
+
+ITEM_LIST = """
+<ul class="itemCardList -wrap">
+  <li><a class="itemCard_inner" href="/goods/detail/goodsId/2334394216531/shopsId/31047">
+    <div class="itemCard_img"><img src="//cdn.2ndstreet.jp/img/2334394216531_1_tn.jpg"></div>
+    <p class="itemCard_brand">JUNYA WATANABE MAN</p>
+    <p class="itemCard_name">Denim jacket</p>
+    <p class="itemCard_size">サイズM</p>
+    <p class="itemCard_status">中古B</p>
+    <p class="itemCard_price">¥27,390</p>
+  </a></li>
+</ul>
+"""
+
+JSON_LD_PAGE = """
+<html><head><script type="application/ld+json">
+{"@context": "https://schema.org", "@type": "ItemList", "itemListElement": [
+  {"@type": "ListItem", "position": 1, "item": {
+    "@type": "Product", "name": "Denim jacket",
+    "url": "https://www.2ndstreet.jp/goods/detail/goodsId/2334394216531/shopsId/31047",
+    "image": "https://cdn.2ndstreet.jp/img/2334394216531_1.jpg",
+    "brand": {"@type": "Brand", "name": "JUNYA WATANABE MAN"},
+    "offers": {"@type": "Offer", "price": "27390", "priceCurrency": "JPY"}}}
+]}
+</script></head><body></body></html>
+"""
+
+
+def test_parse_item_list_fragment():
+    items = json.loads(SecondStreetService.parse_response(ITEM_LIST))
+    assert items == [
+        {
+            "url": "https://www.2ndstreet.jp/goods/detail/goodsId/2334394216531/shopsId/31047",
+            "id": "2334394216531",
+            "brand": "JUNYA WATANABE MAN",
+            "title": "Denim jacket",
+            "price": 27390.0,
+            "img": [
+                "https://cdn.2ndstreet.jp/img/2334394216531_1.jpg",
+                "https://cdn.2ndstreet.jp/img/2334394216531_2.jpg",
+            ],
+            "condition": "中古B",
+            "size": "M",
+        }
+    ]
+
+
+def test_parse_embedded_json_fallback():
+    items = json.loads(SecondStreetService.parse_response(JSON_LD_PAGE))
+    assert len(items) == 1
+    assert items[0]["id"] == "2334394216531"
+    assert items[0]["brand"] == "JUNYA WATANABE MAN"
+    assert items[0]["price"] == 27390.0
+    assert items[0]["img"] == ["https://cdn.2ndstreet.jp/img/2334394216531_1.jpg"]
@@ -0,0 +1,95 @@
+import os
+import pytest
+from postalservice import FrilService
+from postalservice.utils import taxonomy_utils
+from postalservice.utils.taxonomy_utils import (
+    TaxonomyIndex,
+    compile_taxonomy,
+    load_taxonomy,
+    normalize_name,
+)
+
+
+@pytest.fixture(scope="module")
+def taxonomy():
+    return TaxonomyIndex.from_source()
+
+
+def test_normalize_name():
+    assert normalize_name("Ｔシャツ (半袖)") == normalize_name("tしゃつ・半袖") == "tしゃつ半袖"
+    assert normalize_name("JUNYA WATANABE") == "junyawatanabe"
+
+
+def test_lookup_and_scope(taxonomy):
+    assert sorted(entry["id"] for entry in taxonomy.lookup("トップス")) == [1, 526]
+    assert taxonomy.resolve("トップス") is None
+    assert taxonomy.resolve("とっぷす", under=10005)["id"] == 526
+    assert taxonomy.resolve("tops", kind="category")["id"] == 526
+    assert taxonomy.resolve("tops", kind="mercari_category")["id"] == 30
+    assert taxonomy.resolve("mens", kind="category")["id"] == 10005
+
+
+def test_prefix_and_fuzzy(taxonomy):
+    entries = taxonomy.prefix("ジャケット/ア", kind="category")
+    assert {entry["id"] for entry in entries} == {2, 539}
+    assert taxonomy.fuzzy("ジャケットアウタ", kind="category", under=10005)[0]["id"] == 539
+
+
+def test_tree_traversal(taxonomy):
+    child = taxonomy.children(526)[0]
+    assert taxonomy.parent(child["id"])["id"] == 526
+    assert taxonomy.path(child["id"])[:2] == ["メンズ", "トップス"]
+    assert [entry["id"] for entry in taxonomy.ancestors(child["id"])] == [526, 10005]
+    assert child in taxonomy.descendants(10005)
+    assert taxonomy.is_under(child["id"], 10005)
+    assert not taxonomy.is_under(child["id"], 10001)
+
+
+def test_sizes(taxonomy):
+    assert taxonomy.resolve("m", kind="size", under=3)["id"] == 10004
+    assert all(entry["size_group_id"] == 3 for entry in taxonomy.sizes_in_group(3))
+
+
+def test_load_taxonomy_caches_compiled_form(tmp_path, monkeypatch):
+    cache_path = str(tmp_path / "taxonomy.pickle")
+    compiled = load_taxonomy(cache_path=cache_path)
+    assert os.path.exists(cache_path)
+
+    def fail(source_dir):
+        raise AssertionError("compiled again")
+
+    monkeypatch.setattr(taxonomy_utils, "compile_taxonomy", fail)
+    assert load_taxonomy(cache_path=cache_path) == compiled
+
+
+
+def test_missing_sources_raise_and_are_not_cached(tmp_path):
+    cache_path = str(tmp_path / "taxonomy.pickle")
+    with pytest.raises(FileNotFoundError):
+        load_taxonomy(str(tmp_path / "missing"), cache_path=cache_path)
+    assert not os.path.exists(cache_path)
+
+
+def test_sources_are_packaged():
+    assert os.path.dirname(taxonomy_utils.DEFAULT_SOURCE_DIR) == os.path.dirname(
+        os.path.dirname(taxonomy_utils.__file__)
+    )
+
+def test_fril_search_params_resolve_names(tmp_path):
+    taxonomy_utils.configure_taxonomy(cache_path=str(tmp_path / "taxonomy.pickle"))
+    try:
+        url = FrilService.get_search_params({"keyword": "junya", "size": "xs", "category": ["パンツ"]})
+        assert "size_id=10001" in url
+        assert "category_id=562" in url
+        # Close but different sizes aren't guessed
+        for size in ("3L", "4XL", "XXXL"):
+            with pytest.raises(ValueError, match="did you mean"):
+                FrilService.get_search_params({"keyword": "junya", "size": size})
+        with pytest.raises(ValueError):
+            FrilService.get_search_params({"keyword": "junya", "category": ["zzzzzzzz"]})
+        # Categories outside men's aren't searched, e.g. baby clothes
+        with pytest.raises(ValueError, match="not supported"):
+            FrilService.get_search_params({"keyword": "junya", "category": ["ベビー服"]})
+    finally:
+        taxonomy_utils.configure_taxonomy()
+    assert compile_taxonomy()["categories"][562][1] == "パンツ"
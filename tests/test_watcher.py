@@ -0,0 +1,118 @@
+import pytest
+from postalservice import SearchWatcher
+from postalservice.services.baseservice import BaseService
+
+
+def make_item(item_id):
+    return {
+        "id": item_id,
+        "title": f"item {item_id}",
+        "price": 1000.0,
+        "size": "M",
+        "brand": "BRAND PLACEHOLDER",
+        "url": f"https://example.com/{item_id}",
+        "img": [],
+    }
+
+
+class FakeService(BaseService):
+    FIRST_PAGE = 1
+    listings = []
+    page_size = 3
+    fetched_pages = []
+    enriched = []
+
+    @classmethod
+    def fetch_data(cls, params):
+        page = params.get("page", cls.FIRST_PAGE)
+        cls.fetched_pages.append(page)
+        start = (page - cls.FIRST_PAGE) * cls.page_size
+        return cls.listings[start : start + cls.page_size]
+
+    @classmethod
+    async def fetch_data_async(cls, params):
+        return cls.fetch_data(params)
+
+    @staticmethod
+    def parse_base_items(response, **kwargs):
+        return [make_item(item_id) for item_id in response]
+
+    @classmethod
+    def add_details(cls, items):
+        cls.enriched.append([item["id"] for item in items])
+        return [{**item, "brand": "JUNYA"} for item in items]
+
+    @classmethod
+    async def add_details_async(cls, items):
+        return cls.add_details(items)
+
+
+@pytest.fixture
+def service():
+    FakeService.listings = ["5", "4", "3", "2", "1"]
+    FakeService.fetched_pages = []
+    FakeService.enriched = []
+    return FakeService
+
+
+def test_first_poll_returns_first_page(service):
+    watcher = SearchWatcher()
+    items = watcher.poll(service, {"keyword": "junya"})
+    assert [item["id"] for item in items] == ["5", "4", "3"]
+    assert items[0]["brand"] == "JUNYA"
+    assert service.fetched_pages == [1]
+
+
+@pytest.mark.asyncio
+async def test_poll_returns_only_new_listings(service):
+    watcher = SearchWatcher()
+    await watcher.poll_async(service, {"keyword": "junya"})
+
+    service.fetched_pages = []
+    service.enriched = []
+    assert await watcher.poll_async(service, {"keyword": "junya"}) == []
+    assert service.fetched_pages == [1]
+
+    service.listings = ["7", "6"] + service.listings
+    items = await watcher.poll_async(service, {"keyword": "junya"})
+    assert [item["id"] for item in items] == ["7", "6"]
+    assert service.enriched == [["7", "6"]]
+
+
+def test_poll_follows_pages_until_seen_listing(service):
+    watcher = SearchWatcher(max_pages=5)
+    watcher.poll(service, {"keyword": "junya"})
+
+    service.fetched_pages = []
+    service.listings = ["12", "11", "10", "9", "8", "7", "6"] + service.listings
+    items = watcher.poll(service, {"keyword": "junya"})
+    assert [item["id"] for item in items] == ["12", "11", "10", "9", "8", "7", "6"]
+    assert service.fetched_pages == [1, 2, 3]
+
+
+def test_searches_are_tracked_separately(service):
+    watcher = SearchWatcher(remember=2)
+    watcher.poll(service, {"keyword": "junya"})
+    assert len(watcher.poll(service, {"keyword": "kapital"})) == 3
+    # Only the two newest ids are remembered
+    assert [item["id"] for item in watcher.poll(service, {"keyword": "junya"})] == ["3"]
+
+
+class TruncatingService(FakeService):
+    page_size = 4
+    MAX_PAGE_SIZE = 4
+
+    @staticmethod
+    def parse_base_items(response, **kwargs):
+        return FakeService.parse_base_items(response[: kwargs.get("item_count", 3)])
+
+
+def test_poll_reads_whole_pages(service):
+    TruncatingService.listings = ["5", "4", "3", "2", "1"]
+    watcher = SearchWatcher()
+    watcher.poll(TruncatingService, {"keyword": "junya", "item_count": 3})
+
+    TruncatingService.listings = ["9", "8", "7", "6"] + TruncatingService.listings
+    items = watcher.poll(TruncatingService, {"keyword": "junya", "item_count": 3})
+    # "6" is the last listing of the first page, "5" was seen
+    assert [item["id"] for item in items] == ["9", "8", "7", "6"]